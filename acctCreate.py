@@ -3,7 +3,9 @@
 import json
 import sys
 import logging
-from cybronboard import *
+from cybronboard import (
+    authnCyberarkCached, createAccount, errCheck, getAuthnCreds, getPlatformId, getSafeName,
+    validateRequestWithPlatform)
 
 logfile = "./logs/accountCreate.log"
 loglevel = logging.INFO          # BEWARE: DEBUG loglevel might leak secrets!
@@ -48,7 +50,7 @@ errCheck(resp_dict)
 admin_creds = resp_dict["admin_creds"]
 
 print("Authenticating...")
-resp_dict = authnCyberark(admin_creds)
+resp_dict = authnCyberarkCached(admin_creds)
 errCheck(resp_dict)
 logging.info("Successfully authenticated.")
 prov_req["session_token"] = resp_dict["session_token"]
@@ -0,0 +1,90 @@
+#!/usr/local/bin/python3
+
+'''
+ Offboards many provisioning requests in one process.
+
+ Takes the same request sources as batchOnboard.py - a directory of
+ *.json requests, a JSONL file w/ one request per line, a single JSON
+ file or a glob pattern - and, for the safe of each request, tears down
+ its Secrets Hub sync policies and filter, deletes all its accounts and
+ deletes the safe (see src/offboardRequest.py). Authentication, HTTP
+ connections, naming rules and the Secrets Hub indexes are shared by all
+ requests. Safes are offboarded in parallel, each safe once, however
+ many requests name it (see src/offboardBatch.py).
+
+ One result record per request is appended to the results file (JSONL).
+ Safes that no longer exist count as offboarded, so a batch that stopped
+ part way can simply be run again.
+'''
+
+import os
+import sys
+import json
+import argparse
+import threading
+import logging
+from cybronboard import errCheck, getAuthnCreds, loadProvRequests, OFFBOARD_WORKERS, offboardBatch
+
+logfile = "./logs/batchOffboard.log"
+loglevel = logging.INFO       # BEWARE! DEBUG loglevel can leak secrets!
+logfmode = 'w'                # w = overwrite, a = append
+
+# MAIN =================================================
+os.makedirs(os.path.dirname(logfile), exist_ok=True)
+logging.basicConfig(filename=logfile, encoding='utf-8', level=loglevel, filemode=logfmode)
+
+parser = argparse.ArgumentParser(description="Offboard the safes of a batch of provisioning requests.")
+parser.add_argument("sources", nargs="+", help="request directory, JSONL file, JSON file or glob pattern")
+parser.add_argument("-o", "--results", default="./logs/batchOffboard.results.jsonl",
+                    help="file to append per-request result records to")
+parser.add_argument("-w", "--workers", type=int, default=OFFBOARD_WORKERS,
+                    help=f"number of safes offboarded in parallel (default {OFFBOARD_WORKERS})")
+args = parser.parse_args()
+
+print("Getting admin creds...")
+resp_dict = getAuthnCreds()
+errCheck(resp_dict)
+admin_creds = resp_dict["admin_creds"]
+
+prov_reqs = []
+for source in args.sources:
+    try:
+        prov_reqs += list(loadProvRequests(source))
+    except (IOError, ValueError) as e:
+        err_msg = f"{sys.argv[0]}: Could not read provisioning requests from {source}: {e}"
+        print(err_msg)
+        logging.error(err_msg)
+        sys.exit(-1)
+
+counts = {"ok": 0, "failed": 0}
+results_lock = threading.Lock()
+
+# called by offboardBatch() worker threads as each request completes
+def writeResult(request_id, prov_req, resp_dict):
+    result = {}
+    result["request_id"] = request_id
+    result["status_code"] = resp_dict["status_code"]
+    result["response_body"] = resp_dict["response_body"]
+    if "safe_name" in prov_req:
+        result["safe_name"] = prov_req["safe_name"]
+    for key in ["accounts_deleted", "filter_ids", "policy_ids"]:
+        if key in resp_dict:
+            result[key] = resp_dict[key]
+    result["steps"] = resp_dict["steps"]
+    with results_lock:
+        f_out.write(json.dumps(result) + "\n")
+        f_out.flush()
+        if resp_dict["status_code"] == 200:
+            counts["ok"] += 1
+            logging.info(f"{request_id}: {resp_dict['response_body']}")
+        else:
+            counts["failed"] += 1
+            print(f"{request_id}: {resp_dict['response_body']}")
+            logging.error(f"{request_id}: {resp_dict['response_body']}")
+
+print(f"Offboarding {len(prov_reqs)} request(s)...")
+with open(args.results, "a") as f_out:
+    offboardBatch(prov_reqs, admin_creds, max_workers=args.workers, result_callback=writeResult)
+
+print(f"{counts['ok']} request(s) offboarded, {counts['failed']} failed. Results in {args.results}")
+sys.exit(0 if counts["failed"] == 0 else 1)
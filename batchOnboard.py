@@ -0,0 +1,97 @@
+#!/usr/local/bin/python3
+
+'''
+ Onboards many provisioning requests in one process.
+
+ Takes one or more request sources - a directory of *.json requests,
+ a JSONL file w/ one request per line, a single JSON file or a glob
+ pattern - and runs the safe -> Secrets Hub -> account workflow for
+ each request (see src/onboardRequest.py). Authentication, HTTP
+ connections, platforms and naming rules are shared by all requests.
+ Requests for different safes run in parallel, requests for the same
+ safe run in order (see src/onboardBatch.py).
+
+ One result record per request is appended to the results file (JSONL).
+ With -j/--journal, completed steps are journaled and a rerun of the
+ same batch skips them (see src/onboardJournal.py).
+'''
+
+import os
+import sys
+import json
+import argparse
+import threading
+import logging
+from cybronboard import (
+    BATCH_WORKERS, errCheck, getAuthnCreds, loadProvRequests, onboardBatch, OnboardJournal)
+
+logfile = "./logs/batchOnboard.log"
+loglevel = logging.INFO       # BEWARE! DEBUG loglevel can leak secrets!
+logfmode = 'w'                # w = overwrite, a = append
+
+# MAIN =================================================
+os.makedirs(os.path.dirname(logfile), exist_ok=True)
+logging.basicConfig(filename=logfile, encoding='utf-8', level=loglevel, filemode=logfmode)
+
+parser = argparse.ArgumentParser(description="Onboard a batch of provisioning requests.")
+parser.add_argument("sources", nargs="+", help="request directory, JSONL file, JSON file or glob pattern")
+parser.add_argument("-o", "--results", default="./logs/batchOnboard.results.jsonl",
+                    help="file to append per-request result records to")
+parser.add_argument("-w", "--workers", type=int, default=BATCH_WORKERS,
+                    help=f"number of safes onboarded in parallel (default {BATCH_WORKERS})")
+parser.add_argument("-j", "--journal",
+                    help="journal file of completed steps; a rerun w/ the same journal resumes where it stopped")
+args = parser.parse_args()
+
+print("Getting admin creds...")
+resp_dict = getAuthnCreds()
+errCheck(resp_dict)
+admin_creds = resp_dict["admin_creds"]
+
+prov_reqs = []
+for source in args.sources:
+    try:
+        prov_reqs += list(loadProvRequests(source))
+    except (IOError, ValueError) as e:
+        err_msg = f"{sys.argv[0]}: Could not read provisioning requests from {source}: {e}"
+        print(err_msg)
+        logging.error(err_msg)
+        sys.exit(-1)
+
+counts = {"ok": 0, "failed": 0}
+results_lock = threading.Lock()
+
+# called by onboardBatch() worker threads as each request completes
+def writeResult(request_id, prov_req, resp_dict):
+    result = {}
+    result["request_id"] = request_id
+    result["status_code"] = resp_dict["status_code"]
+    result["response_body"] = resp_dict["response_body"]
+    for key in ["safe_name", "source_store_id", "target_store_id", "filter_id", "policy_id", "platform_id"]:
+        if key in prov_req:
+            result[key] = prov_req[key]
+    result["steps"] = resp_dict["steps"]
+    with results_lock:
+        f_out.write(json.dumps(result) + "\n")
+        f_out.flush()
+        if resp_dict["status_code"] == 200:
+            counts["ok"] += 1
+            logging.info(f"{request_id}: {resp_dict['response_body']}")
+        else:
+            counts["failed"] += 1
+            print(f"{request_id}: {resp_dict['response_body']}")
+            logging.error(f"{request_id}: {resp_dict['response_body']}")
+
+journal = None
+if args.journal is not None:
+    journal = OnboardJournal(args.journal)
+
+print(f"Onboarding {len(prov_reqs)} request(s)...")
+with open(args.results, "a") as f_out:
+    onboardBatch(prov_reqs, admin_creds, max_workers=args.workers, result_callback=writeResult,
+                 journal=journal)
+if journal is not None:
+    journal.close()
+
+print(f"{counts['ok']} request(s) onboarded, {counts['failed']} failed. Results in {args.results}")
+sys.exit(0 if counts["failed"] == 0 else 1)
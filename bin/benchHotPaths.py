@@ -0,0 +1,250 @@
+#!/usr/local/bin/python3
+
+'''
+ Microbenchmarks of the pure-Python hot paths used when naming and
+ matching many records w/o any API calls: getSafeName(), getSafeNames(),
+ getPlatformId() and validateRequestWithPlatform().
+
+ Each function is timed w/ timeit over synthetic platform catalogues and
+ safe naming rule sets of increasing size. The catalogues & rule sets are
+ written to temporary files and swapped in through the library's
+ PLATFORM_FILE and SAFE_NAME_RULES_FILE constants, so file loading and
+ caching behave as in production. Reports best-of-repeat microseconds per
+ call ("warm") and the first call after a file change, which includes
+ parsing & compiling the file ("cold").
+
+   PYTHONPATH=./lib ./bin/benchHotPaths.py
+   PYTHONPATH=./lib ./bin/benchHotPaths.py --platforms 39,5000 --rules 5,50 -o ./logs/hotpaths.json
+
+ With --baseline, warm timings are compared to an earlier -o report and
+ the script exits w/ 1 if any got slower by more than --tolerance.
+'''
+
+import os
+import sys
+import json
+import time
+import random
+import string
+import timeit
+import argparse
+import tempfile
+import logging
+import cybronboard.naming            # PLATFORM_FILE & SAFE_NAME_RULES_FILE are set on their submodules
+import cybronboard.platforms
+
+logfile = "./logs/benchHotPaths.log"
+loglevel = logging.WARNING
+logfmode = 'w'                # w = overwrite, a = append
+
+PLATFORM_SIZES = "39,250,1000,5000"
+RULE_SIZES = "5,10,25,50"
+SEARCH_KEYS = ["platform", "type", "subtype", "engine", "tier"]
+PROPERTY_KEYS = ["USERNAME", "ADDRESS", "PORT", "DATABASE", "HOST", "DSN", "DBNAME",
+                 "ENGINE", "REGION", "DESCRIPTION", "LOGONDOMAIN", "AWSACCOUNTID"]
+
+# ====================================================
+# Returns synthetic platforms dictionary in compileplats.py format. Platforms
+# have 2 to 4 searchpairs, so getPlatformId() sees several key signatures.
+
+def makePlatforms(n, rng):
+    platforms = {}
+    for idx in range(n):
+        pid = f"Bench-{idx:05d}"
+        nkeys = 2 + idx % 3
+        searchpairs = {key: f"{key}{idx}" for key in SEARCH_KEYS[:nkeys]}
+        required = rng.sample(PROPERTY_KEYS[:4], rng.randint(1, 3))
+        optional = [k for k in rng.sample(PROPERTY_KEYS, 8) if k not in required]
+        platforms[pid] = {
+            "id": pid,
+            "systemtype": "Database",
+            "searchpairs": searchpairs,
+            "required": required,
+            "allkeys": ["SECRET"] + required + optional,
+        }
+    return platforms
+
+
+# ====================================================
+# Returns count provisioning requests, each matching a random platform.
+
+def makePlatformRequests(platforms, count, rng):
+    prov_reqs = []
+    for pid in rng.choices(list(platforms), k=count):
+        plat = platforms[pid]
+        prov_req = {"cybr_subdomain": "bench", "session_token": "bench", "safe_name": "BENCH", "platform_id": pid}
+        prov_req.update({k: v.lower() for k, v in plat["searchpairs"].items()})
+        account_values = {k.lower(): "value" for k in plat["required"]}
+        account_values["secret"] = "secret"
+        prov_req["accountValues"] = account_values
+        prov_reqs.append(prov_req)
+    return prov_reqs
+
+
+# ====================================================
+# Returns synthetic safe naming rules in safenamerules.json format, cycling
+# through valuemap, substring & literal rules.
+
+def makeRules(n):
+    rules = []
+    for idx in range(n):
+        keyname = f"key{idx}"
+        match idx % 3:
+            case 0:
+                valuemap = [{"inputs": [f"V{idx}_{v}", f"VALUE {idx} {v}"], "output": f"O{v}"} for v in range(8)]
+                rules.append({"keyname": keyname, "maptype": "valuemap", "valuemap": valuemap})
+            case 1:
+                rules.append({"keyname": keyname, "maptype": "substring", "substring": {"start": 0, "end": 4}})
+            case _:
+                rules.append({"keyname": keyname, "maptype": "literal"})
+    return rules
+
+
+# ====================================================
+# Returns count provisioning requests w/ values for all rules.
+
+def makeRuleRequests(rules, count, rng):
+    prov_reqs = []
+    for _ in range(count):
+        prov_req = {}
+        for rule in rules:
+            if rule["maptype"] == "valuemap":
+                prov_req[rule["keyname"]] = rng.choice(rng.choice(rule["valuemap"])["inputs"]).lower()
+            else:
+                prov_req[rule["keyname"]] = "".join(rng.choices(string.ascii_lowercase, k=8))
+        prov_reqs.append(prov_req)
+    return prov_reqs
+
+
+# ====================================================
+# Writes data to a new JSON file in tmp_dir, returns its path
+
+def writeJson(tmp_dir, name, data):
+    path = os.path.join(tmp_dir, name)
+    with open(path, "w") as f_out:
+        json.dump(data, f_out)
+    return path
+
+
+# ====================================================
+# Returns (warm, cold) microseconds per call of func over prov_reqs.
+# cold is the first call after the data file was (re)written.
+
+def timeCalls(func, prov_reqs, repeat, touch_file):
+    os.utime(touch_file, ns=(time.time_ns(), time.time_ns() + 1))
+    start = time.perf_counter()
+    func(prov_reqs[0])
+    cold = (time.perf_counter() - start) * 1e6
+    timer = timeit.Timer(lambda: [func(prov_req) for prov_req in prov_reqs])
+    warm = min(timer.repeat(repeat=repeat, number=1)) * 1e6 / len(prov_reqs)
+    return round(warm, 2), round(cold, 1)
+
+
+# ====================================================
+# Returns (warm, cold) microseconds per request of batch_func(prov_reqs).
+
+def timeBatch(batch_func, prov_reqs, repeat, touch_file):
+    os.utime(touch_file, ns=(time.time_ns(), time.time_ns() + 1))
+    start = time.perf_counter()
+    batch_func(prov_reqs)
+    cold = (time.perf_counter() - start) * 1e6 / len(prov_reqs)
+    timer = timeit.Timer(lambda: batch_func(prov_reqs))
+    warm = min(timer.repeat(repeat=repeat, number=1)) * 1e6 / len(prov_reqs)
+    return round(warm, 2), round(cold, 1)
+
+
+# ====================================================
+# Exits if func does not succeed for prov_req, so broken data isn't timed
+
+def checkCall(func, prov_req):
+    resp_dict = func(prov_req)
+    if resp_dict["status_code"] != 200:
+        print(f"{func.__name__} failed on synthetic data: {resp_dict['response_body']}", file=sys.stderr)
+        sys.exit(-1)
+
+
+# ====================================================
+# Returns list of regression messages of results compared to baseline results
+
+def compareToBaseline(results, baseline, tolerance):
+    regressions = []
+    previous = {(r["function"], r["size"]): r for r in baseline.get("results", [])}
+    for result in results:
+        prev = previous.get((result["function"], result["size"]), None)
+        if prev is None or prev["warm_us"] == 0:
+            continue
+        change = (result["warm_us"] - prev["warm_us"]) / prev["warm_us"]
+        if change > tolerance:
+            regressions.append(f"{result['function']} @ {result['size']}: {prev['warm_us']} -> "
+                               f"{result['warm_us']} us/call ({100 * change:+.1f}%)")
+    return regressions
+
+
+# MAIN ====================================================
+parser = argparse.ArgumentParser(description="Microbenchmark safe naming & platform matching.")
+parser.add_argument("--platforms", default=PLATFORM_SIZES, help=f"platform catalogue sizes (default {PLATFORM_SIZES})")
+parser.add_argument("--rules", default=RULE_SIZES, help=f"naming rule set sizes (default {RULE_SIZES})")
+parser.add_argument("-n", "--calls", type=int, default=2000, help="calls per timing run")
+parser.add_argument("-r", "--repeat", type=int, default=5, help="timing runs, best is reported")
+parser.add_argument("--seed", type=int, default=1)
+parser.add_argument("-o", "--report", help="file to write JSON results to")
+parser.add_argument("--baseline", help="earlier -o report to check for regressions")
+parser.add_argument("--tolerance", type=float, default=0.5,
+                    help="allowed fractional slowdown, default 0.5 (us timings vary w/ machine load)")
+args = parser.parse_args()
+
+os.makedirs(os.path.dirname(logfile), exist_ok=True)
+logging.basicConfig(filename=logfile, encoding='utf-8', level=loglevel, filemode=logfmode)
+
+rng = random.Random(args.seed)
+results = []
+saved_files = (cybronboard.platforms.PLATFORM_FILE, cybronboard.naming.SAFE_NAME_RULES_FILE)
+print(f"{'function':<30} {'size':>6} {'warm us/call':>13} {'cold us':>10}")
+with tempfile.TemporaryDirectory() as tmp_dir:
+    try:
+        for size in [int(s) for s in args.rules.split(",")]:
+            rules = makeRules(size)
+            cybronboard.naming.SAFE_NAME_RULES_FILE = writeJson(tmp_dir, f"rules{size}.json", rules)
+            prov_reqs = makeRuleRequests(rules, args.calls, rng)
+            checkCall(cybronboard.getSafeName, prov_reqs[0])
+            timings = [
+                ("getSafeName", timeCalls(cybronboard.getSafeName, prov_reqs, args.repeat,
+                                          cybronboard.naming.SAFE_NAME_RULES_FILE)),
+                ("getSafeNames (per request)", timeBatch(cybronboard.getSafeNames, prov_reqs, args.repeat,
+                                                         cybronboard.naming.SAFE_NAME_RULES_FILE)),
+            ]
+            for name, (warm, cold) in timings:
+                results.append({"function": name, "size": size, "warm_us": warm, "cold_us": cold})
+                print(f"{name:<30} {size:>6} {warm:>13} {cold:>10}")
+
+        for size in [int(s) for s in args.platforms.split(",")]:
+            platforms = makePlatforms(size, rng)
+            cybronboard.platforms.PLATFORM_FILE = writeJson(tmp_dir, f"platforms{size}.json", platforms)
+            prov_reqs = makePlatformRequests(platforms, args.calls, rng)
+            checkCall(cybronboard.getPlatformId, prov_reqs[0])
+            checkCall(cybronboard.validateRequestWithPlatform, prov_reqs[0])
+            for name, func in [("getPlatformId", cybronboard.getPlatformId),
+                               ("validateRequestWithPlatform", cybronboard.validateRequestWithPlatform)]:
+                warm, cold = timeCalls(func, prov_reqs, args.repeat, cybronboard.platforms.PLATFORM_FILE)
+                results.append({"function": name, "size": size, "warm_us": warm, "cold_us": cold})
+                print(f"{name:<30} {size:>6} {warm:>13} {cold:>10}")
+    finally:
+        cybronboard.platforms.PLATFORM_FILE, cybronboard.naming.SAFE_NAME_RULES_FILE = saved_files
+
+report = {"python": sys.version.split()[0], "calls": args.calls, "seed": args.seed, "results": results}
+if args.report is not None:
+    with open(args.report, "w") as f_out:
+        json.dump(report, f_out, indent=4)
+
+status = 0
+if args.baseline is not None:
+    with open(args.baseline) as f_in:
+        baseline = json.load(f_in)
+    regressions = compareToBaseline(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    if regressions:
+        status = 1
+    else:
+        print(f"No regressions beyond {100 * args.tolerance:.0f}% of {args.baseline}", file=sys.stderr)
+sys.exit(status)
@@ -0,0 +1,144 @@
+#!/usr/local/bin/python3
+
+'''
+ Measures what importing the library costs each script. For every script,
+ its "from cybronboard import ..." statement is run in a new interpreter
+ w/ python -X importtime, and "from cybronboard import *" (all features,
+ the cost of every script before the library was split into lazily loaded
+ submodules) is run for comparison.
+
+ Reports best-of-repeat microseconds spent importing cybronboard and the
+ modules it pulls in, microseconds of all imports incl. interpreter
+ startup, modules imported, and wall time of the interpreter process.
+
+   PYTHONPATH=./lib ./bin/benchImports.py
+   PYTHONPATH=./lib ./bin/benchImports.py -r 10 -o ./logs/imports.json
+
+ With --baseline, cybronboard import times are compared to an earlier -o
+ report and the script exits w/ 1 if any got slower by more than --tolerance.
+'''
+
+import sys
+import ast
+import json
+import time
+import argparse
+import subprocess
+
+SCRIPTS = ["acctCreate.py", "safeCreate.py", "safeDelete.py", "shInfraCreate.py",
+           "batchOnboard.py", "batchOffboard.py", "onboardService.py",
+           "bin/benchOnboard.py", "bin/compileplats.py", "bin/compilenamerules.py"]
+ALL_FEATURES = "import *"
+
+# ====================================================
+# Returns names script imports from cybronboard, None for "import *"
+
+def importedNames(script):
+    with open(script) as f_in:
+        tree = ast.parse(f_in.read(), script)
+    names = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.module == "cybronboard":
+            names.extend(alias.name for alias in node.names)
+    if "*" in names:
+        return None
+    return names
+
+
+# ====================================================
+# Runs import statement in new interpreter, returns dict w/ cybronboard_us,
+# total_us, modules & wall_ms. Top-level entries of the -X importtime output
+# hold the cumulative time of everything they imported.
+
+def timeImport(statement):
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                          capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - start) * 1e3
+    if proc.returncode != 0:
+        print(f"'{statement}' failed:\n{proc.stderr}", file=sys.stderr)
+        sys.exit(-1)
+
+    cybronboard_us = total_us = modules = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        modules += 1
+        if not module.startswith("  "):     # top-level entry
+            total_us += int(cumulative_us)
+            if module.strip().split(".")[0] == "cybronboard":
+                cybronboard_us += int(cumulative_us)
+    return {"cybronboard_us": cybronboard_us, "total_us": total_us, "modules": modules,
+            "wall_ms": round(wall_ms, 1)}
+
+
+# ====================================================
+# Returns best of repeat timeImport() runs, per metric
+
+def bestOf(statement, repeat):
+    runs = [timeImport(statement) for _ in range(repeat)]
+    return {key: min(run[key] for run in runs) for key in runs[0]}
+
+
+# ====================================================
+# Returns list of regression messages of results compared to baseline results
+
+def compareToBaseline(results, baseline, tolerance):
+    regressions = []
+    previous = {r["script"]: r for r in baseline.get("results", [])}
+    for result in results:
+        prev = previous.get(result["script"], None)
+        if prev is None or prev["cybronboard_us"] == 0:
+            continue
+        change = (result["cybronboard_us"] - prev["cybronboard_us"]) / prev["cybronboard_us"]
+        if change > tolerance:
+            regressions.append(f"{result['script']}: {prev['cybronboard_us']} -> "
+                               f"{result['cybronboard_us']} us ({100 * change:+.1f}%)")
+    return regressions
+
+
+# MAIN ====================================================
+parser = argparse.ArgumentParser(description="Benchmark library import time per script.")
+parser.add_argument("scripts", nargs="*", default=SCRIPTS, help="scripts to measure (default: all)")
+parser.add_argument("-r", "--repeat", type=int, default=5, help="runs per script, best is reported")
+parser.add_argument("-o", "--report", help="file to write JSON results to")
+parser.add_argument("--baseline", help="earlier -o report to check for regressions")
+parser.add_argument("--tolerance", type=float, default=0.5,
+                    help="allowed fractional slowdown, default 0.5 (import times vary w/ disk cache & load)")
+args = parser.parse_args()
+
+statements = [(ALL_FEATURES, "from cybronboard import *")]
+for script in args.scripts:
+    names = importedNames(script)
+    if names is None:
+        statements.append((script, "from cybronboard import *"))
+    elif names:
+        statements.append((script, f"from cybronboard import {', '.join(names)}"))
+
+results = []
+print(f"{'script':<26} {'cybronboard us':>15} {'all imports us':>15} {'modules':>8} {'wall ms':>8}")
+for script, statement in statements:
+    result = {"script": script}
+    result.update(bestOf(statement, args.repeat))
+    results.append(result)
+    print(f"{script:<26} {result['cybronboard_us']:>15} {result['total_us']:>15} "
+          f"{result['modules']:>8} {result['wall_ms']:>8}")
+
+report = {"python": sys.version.split()[0], "repeat": args.repeat, "results": results}
+if args.report is not None:
+    with open(args.report, "w") as f_out:
+        json.dump(report, f_out, indent=4)
+
+status = 0
+if args.baseline is not None:
+    with open(args.baseline) as f_in:
+        baseline = json.load(f_in)
+    regressions = compareToBaseline(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    if regressions:
+        status = 1
+    else:
+        print(f"No regressions beyond {100 * args.tolerance:.0f}% of {args.baseline}", file=sys.stderr)
+sys.exit(status)
@@ -0,0 +1,245 @@
+#!/usr/local/bin/python3
+
+'''
+ End-to-end onboarding benchmark.
+
+ Generates N synthetic provisioning requests from requests/all-in-one.json
+ (random project, billcode, env and safe member lists) and onboards them
+ w/ onboardBatch() - safe, members, Secrets Hub and account steps - against
+ an in-process mock tenant (see bin/mockCybrServer.py), or against the
+ server at --base-url.
+
+ Reports requests/sec, p50/p95/p99 seconds per workflow step, HTTP calls
+ per request and peak RSS. With --baseline, the report is compared to an
+ earlier report and the script exits w/ 1 if throughput, step latencies,
+ HTTP calls or memory regressed by more than --tolerance. Use --save to
+ write the report as the next baseline.
+
+   PYTHONPATH=./lib ./bin/benchOnboard.py -n 500 --latency 0.02 --save ./logs/bench.baseline.json
+   PYTHONPATH=./lib ./bin/benchOnboard.py -n 500 --latency 0.02 --baseline ./logs/bench.baseline.json
+
+ The client rate limit is off unless CYBR_HTTP_RATE_LIMIT is set, so the
+ numbers measure the library rather than the throttle.
+'''
+
+import os
+import sys
+import json
+import copy
+import time
+import random
+import string
+import argparse
+import tempfile
+import resource
+import threading
+import statistics
+import logging
+
+logfile = "./logs/benchOnboard.log"
+loglevel = logging.WARNING
+logfmode = 'w'                # w = overwrite, a = append
+
+TEMPLATE_FILE = "./requests/all-in-one.json"
+ENVS = ["dev", "test", "acceptance", "production"]
+SYNC_MEMBERS = ["SecretsHub", "Conjur Sync"]
+
+# ====================================================
+# Returns n synthetic (request_id, prov_req) tuples based on template.
+# About one in ten requests is another account for an earlier request's safe.
+
+def makeRequests(template, n, rng):
+    def user():
+        return "".join(rng.choices(string.ascii_lowercase, k=8)) + "@bench.cloud.0001"
+
+    prov_reqs = []
+    for idx in range(n):
+        if prov_reqs and rng.random() < 0.1:
+            # another account for an existing safe
+            prov_req = copy.deepcopy(rng.choice(prov_reqs)[1])
+        else:
+            prov_req = copy.deepcopy(template)
+            prov_req["project"] = "".join(rng.choices(string.ascii_lowercase, k=8))
+            prov_req["billcode"] = rng.randint(1000, 999999)
+            prov_req["env"] = rng.choice(ENVS)
+            prov_req["safeAdmins"] = [user() for _ in range(rng.randint(1, 2))]
+            prov_req["safeFullUsers"] = [user() for _ in range(rng.randint(0, 5))]
+            prov_req["syncMembers"] = list(SYNC_MEMBERS)
+        prov_req["accountValues"]["address"] = f"db{idx}.bench.local"
+        prov_req["accountValues"]["username"] = f"user{idx}"
+        prov_reqs.append((f"bench-{idx:06d}", prov_req))
+    return prov_reqs
+
+
+# ====================================================
+# Returns {p50, p95, p99, max, count} of list of seconds
+
+def percentiles(samples):
+    if len(samples) == 0:
+        return {"count": 0}
+    if len(samples) == 1:
+        cuts = samples * 99
+    else:
+        cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {
+        "count": len(samples),
+        "p50": round(cuts[49], 6),
+        "p95": round(cuts[94], 6),
+        "p99": round(cuts[98], 6),
+        "max": round(max(samples), 6),
+    }
+
+
+# ====================================================
+# Returns peak resident set size of this process in MB
+
+def peakRssMb():
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":      # bytes on macOS, KB elsewhere
+        return round(max_rss / (1024 * 1024), 1)
+    return round(max_rss / 1024, 1)
+
+
+# ====================================================
+# Returns list of regression messages of report compared to baseline.
+# Lower is better for everything but requests_per_sec. Step latencies must
+# also have grown by at least min_delta seconds, so scheduling noise in
+# steps that take a few milliseconds is not flagged.
+
+def compareToBaseline(report, baseline, tolerance, min_delta):
+    regressions = []
+
+    def check(name, current, previous, higher_is_better=False, min_delta=0.0):
+        if current is None or previous is None or previous == 0:
+            return
+        if abs(current - previous) < min_delta:
+            return
+        change = (current - previous) / previous
+        if higher_is_better:
+            change = -change
+        if change > tolerance:
+            regressions.append(f"{name}: {previous} -> {current} ({100 * change:+.1f}% worse)")
+
+    check("requests_per_sec", report["requests_per_sec"], baseline.get("requests_per_sec", None), True)
+    check("http_calls_per_request", report["http_calls_per_request"], baseline.get("http_calls_per_request", None))
+    check("peak_rss_mb", report["peak_rss_mb"], baseline.get("peak_rss_mb", None))
+    for step, stats in report["steps"].items():
+        previous = baseline.get("steps", {}).get(step, {})
+        for p in ["p50", "p95"]:      # p99 of a few hundred samples is too noisy to gate on
+            check(f"{step} {p}", stats.get(p, None), previous.get(p, None), min_delta=min_delta)
+    return regressions
+
+
+# MAIN ====================================================
+parser = argparse.ArgumentParser(description="Benchmark onboarding throughput against a mock tenant.")
+parser.add_argument("-n", "--requests", type=int, default=200, help="number of synthetic requests")
+parser.add_argument("-w", "--workers", type=int, default=None, help="onboardBatch() workers (default CYBR_BATCH_WORKERS)")
+parser.add_argument("--seed", type=int, default=1, help="random seed of synthetic requests")
+parser.add_argument("--latency", type=float, default=0.0, help="mock server seconds per API request")
+parser.add_argument("--jitter", type=float, default=0.0, help="mock server +/- seconds of random latency")
+parser.add_argument("--error-rate", type=float, default=0.0, help="mock server fraction of 500s")
+parser.add_argument("--throttle-rate", type=float, default=0.0, help="mock server fraction of 429s")
+parser.add_argument("--base-url", help="benchmark against this running server instead of an in-process mock")
+parser.add_argument("-o", "--report", help="file to write JSON report to (default stdout)")
+parser.add_argument("--baseline", help="earlier report to check for regressions")
+parser.add_argument("--tolerance", type=float, default=0.2, help="allowed fractional regression, default 0.2")
+parser.add_argument("--min-delta", type=float, default=0.005,
+                    help="seconds a step latency must grow by to regress, default 0.005")
+parser.add_argument("--save", help="file to write report to as the next baseline")
+args = parser.parse_args()
+
+os.makedirs(os.path.dirname(logfile), exist_ok=True)
+logging.basicConfig(filename=logfile, encoding='utf-8', level=loglevel, filemode=logfmode)
+
+# library constants are read from the environment at import
+server = None
+if args.base_url is None:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from mockCybrServer import makeMockServer
+    server = makeMockServer(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                            throttle_rate=args.throttle_rate)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    args.base_url = f"http://{server.server_address[0]}:{server.server_address[1]}"
+token_cache_dir = tempfile.TemporaryDirectory()
+os.environ["CYBR_BASE_URL"] = args.base_url
+os.environ["CYBR_TOKEN_CACHE"] = os.path.join(token_cache_dir.name, "tokencache.json")
+os.environ["CYBR_SH_STORE_CACHE_TTL"] = "0"
+os.environ.setdefault("CYBR_HTTP_RATE_LIMIT", "0")
+from cybronboard import BATCH_WORKERS, CybrHttpClient, HTTP_RATE_LIMIT, onboardBatch
+
+with open(TEMPLATE_FILE) as f_in:
+    template = json.load(f_in)
+prov_reqs = makeRequests(template, args.requests, random.Random(args.seed))
+admin_creds = {"cybr_subdomain": "bench", "cybr_username": "bench", "cybr_password": "bench"}
+http_client = CybrHttpClient()
+
+step_seconds = {}
+counts = {"ok": 0, "failed": 0}
+results_lock = threading.Lock()
+
+# called by onboardBatch() worker threads as each request completes
+def recordResult(request_id, prov_req, resp_dict):
+    with results_lock:
+        counts["ok" if resp_dict["status_code"] == 200 else "failed"] += 1
+        for step in resp_dict["steps"]:
+            if not step["skipped"]:
+                step_seconds.setdefault(step["step"], []).append(step["seconds"])
+
+print(f"Onboarding {len(prov_reqs)} synthetic request(s) against {args.base_url}...", file=sys.stderr)
+start = time.perf_counter()
+onboardBatch(prov_reqs, admin_creds, max_workers=args.workers, http_client=http_client,
+             result_callback=recordResult)
+elapsed = time.perf_counter() - start
+
+http_stats = http_client.stats()
+http_calls = sum(s["calls"] for s in http_stats.values())
+report = {
+    "requests": len(prov_reqs),
+    "ok": counts["ok"],
+    "failed": counts["failed"],
+    "seconds": round(elapsed, 3),
+    "requests_per_sec": round(len(prov_reqs) / elapsed, 2),
+    "http_calls": http_calls,
+    "http_calls_per_request": round(http_calls / max(1, len(prov_reqs)), 2),
+    "http_retries": sum(s["retries"] for s in http_stats.values()),
+    "peak_rss_mb": peakRssMb(),
+    "steps": {step: percentiles(samples) for step, samples in sorted(step_seconds.items())},
+    "settings": {
+        "workers": args.workers or BATCH_WORKERS,
+        "seed": args.seed,
+        "latency": args.latency,
+        "error_rate": args.error_rate,
+        "throttle_rate": args.throttle_rate,
+        "http_rate_limit": HTTP_RATE_LIMIT,
+        "python": sys.version.split()[0],
+    },
+}
+http_client.close()
+if server is not None:
+    server.shutdown()
+token_cache_dir.cleanup()
+
+report_json = json.dumps(report, indent=4)
+if args.report is None:
+    print(report_json)
+else:
+    with open(args.report, "w") as f_out:
+        f_out.write(report_json + "\n")
+if args.save is not None:
+    with open(args.save, "w") as f_out:
+        f_out.write(report_json + "\n")
+
+status = 0
+if args.baseline is not None:
+    with open(args.baseline) as f_in:
+        baseline = json.load(f_in)
+    if baseline.get("settings", {}) != report["settings"]:
+        print(f"WARNING settings differ from {args.baseline}: {baseline.get('settings', {})}", file=sys.stderr)
+    regressions = compareToBaseline(report, baseline, args.tolerance, args.min_delta)
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    if regressions:
+        status = 1
+    else:
+        print(f"No regressions beyond {100 * args.tolerance:.0f}% of {args.baseline}", file=sys.stderr)
+sys.exit(status)
@@ -0,0 +1,46 @@
+#!/usr/local/bin/python3
+
+'''
+ Precompiles safe naming rules for fast startup.
+
+ Compiles a safe naming rules file (default ./json/safenamerules.json)
+ into the lookup tables getSafeName() uses and writes them as a
+ precompiled artifact next to it (e.g. ./json/safenamerules.marshal, see
+ src/compiledArtifact.py). The library loads the artifact instead of
+ parsing & compiling the JSON while the rules file is unchanged, and
+ falls back to the JSON once it changes. Rerun after editing the rules.
+
+   PYTHONPATH=./lib ./bin/compilenamerules.py
+   PYTHONPATH=./lib ./bin/compilenamerules.py --check
+'''
+
+import sys
+import argparse
+import logging
+from cybronboard import artifactPath, compileSafeNameArtifact, loadArtifact, SAFE_NAME_RULES_FILE
+
+# MAIN ====================================================
+parser = argparse.ArgumentParser(description="Precompile safe naming rules into an artifact.")
+parser.add_argument("rules_file", nargs="?", default=SAFE_NAME_RULES_FILE,
+                    help=f"safe naming rules file (default {SAFE_NAME_RULES_FILE})")
+parser.add_argument("--check", action="store_true",
+                    help="only check that the artifact is current, exit w/ 1 if not")
+args = parser.parse_args()
+
+logging.basicConfig(level=logging.WARNING)
+
+if args.check:
+    if loadArtifact(args.rules_file, "safenamerules") is None:
+        print(f"{artifactPath(args.rules_file)} is missing or stale.", file=sys.stderr)
+        sys.exit(1)
+    print(f"{artifactPath(args.rules_file)} is current.")
+    sys.exit(0)
+
+try:
+    path = compileSafeNameArtifact(args.rules_file)
+except (IOError, ValueError, KeyError) as e:
+    err_msg = f"{sys.argv[0]}: Could not compile naming rules {args.rules_file}: {e}"
+    print(err_msg, file=sys.stderr)
+    sys.exit(-1)
+print(f"Wrote {path}")
+sys.exit(0)
@@ -2,77 +2,236 @@
 
 '''
  This is a utility that pulls info about active CyberArk platforms
- and renders it into a json format for onboarding support. 
+ and renders it into a json format for onboarding support.
 
  It takes an optional argument that names on older platform json file
- from which to copy searchpair values, thereby relieving the user of 
+ from which to copy searchpair values, thereby relieving the user of
  manually re-entering them when recompiling the platforms.
 
  Raw json output is sent to stdout for further redirection to jq or file.
  Therefore DO NOT ADD PRINT STATEMENTS if you're piping this output to jq!!
  Use logging.info(msgs) instead.
+
+ With -o/--output, the platform file is written atomically instead, and
+ its current contents are the older platform file unless one is named.
+ A precompiled artifact of it (e.g. ./json/platforms.marshal, see
+ src/compiledArtifact.py) is written too, which the library loads instead
+ of parsing and indexing the JSON.
+
+ Compiling is incremental. The ETag and a hash of the last platforms
+ payload, and a hash of each platform definition, are kept in a cache file
+ (CYBR_PLATFORM_CACHE, default ~/.cybronboard/platcache.json):
+  - the fetch sends If-None-Match w/ the cached ETag; if the server answers
+    304, or the payload hash is unchanged, the older file is output as is
+  - else only platforms whose definition hash changed are re-derived, the
+    others are copied from the older file
+ Curated searchpairs of the older file are always kept. The cache is only
+ used if the older file is the one last written w/ it, so a hand-edited
+ file or a file from elsewhere gets a full compile. --full ignores the cache.
+
+   ./bin/compileplats.py -o ./json/platforms.json
+   ./bin/compileplats.py ./json/platforms.json > newplatforms.json
 '''
 
-import requests
-import json
+import os
 import sys
+import json
+import copy
+import hashlib
+import argparse
 import logging
-from cybronboard import *
+from cybronboard import (
+    authnCyberarkCached, compilePlatformArtifact, compilePlatformIndex, errCheck, getAuthnCreds,
+    getHttpClient, loadArtifact, pcloudUrl)
 
 logfile = "./logs/compileplats.log"
 loglevel = logging.INFO
 logfmode = 'w'  			# w = overwrite, a = append
 
+PLATFORM_CACHE_FILE = os.environ.get("CYBR_PLATFORM_CACHE",
+                        os.path.expanduser("~/.cybronboard/platcache.json"))
+
+# ====================================================
+# Returns hex sha256 of bytes, or of data in canonical JSON form
+
+def hashBytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+def hashJson(data):
+    return hashBytes(json.dumps(data, sort_keys=True, separators=(",", ":")).encode())
+
+
+# ====================================================
+# Returns onboarding platform entry derived from platform definition p,
+# w/ empty searchpairs
+
+def compilePlatform(p):
+    plat_id = p['general']['id']
+    plat = {}
+    plat['id'] = plat_id
+    plat['systemtype'] = p['general']['systemType'].replace(" ","+")
+    plat['searchpairs'] = {}
+    plat['required'] = []
+    plat['allkeys'] = ['SECRET']
+    for reqd in p['properties']['required']:
+        prop_name = reqd['name'].upper()
+        plat['required'].append(prop_name)
+        plat['allkeys'].append(prop_name)
+    for optl in p['properties']['optional']:
+        prop_name = optl['name'].upper()
+        plat['allkeys'].append(prop_name)
+    return plat
+
+
+# ====================================================
+# Returns (platforms dictionary, raw bytes) of json file, or ({}, None) if none
+
+def readPlatformFile(platfile):
+    if platfile is None or not os.path.exists(platfile):
+        return {}, None
+    with open(platfile, "rb") as f_in:
+        raw = f_in.read()
+    return json.loads(raw), raw
+
+
+# ====================================================
+# Writes data to file atomically w/ mode, so readers never see a partial file
+
+def writeAtomic(path, data, mode=0o644):
+    tmp_file = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+    with os.fdopen(fd, "wb") as f_out:
+        f_out.write(data)
+        f_out.flush()
+        os.fsync(f_out.fileno())
+    os.replace(tmp_file, path)
+
+
+# ====================================================
+# Platform cache: {url: {"etag", "payload_hash", "output_hash", "platform_hashes"}}
+
+def readCache():
+    try:
+        with open(PLATFORM_CACHE_FILE) as f_in:
+            return json.load(f_in)
+    except (IOError, ValueError):
+        return {}
+
+def writeCache(cache):
+    try:
+        cache_dir = os.path.dirname(PLATFORM_CACHE_FILE)
+        if cache_dir:             # "" for a file in the current directory
+            os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        writeAtomic(PLATFORM_CACHE_FILE, json.dumps(cache).encode(), 0o600)
+    except OSError as e:
+        logging.error(f"Could not write platform cache {PLATFORM_CACHE_FILE}: {e}")
+
+
 # MAIN ====================================================
+parser = argparse.ArgumentParser(description="Compile active CyberArk platforms for onboarding.")
+parser.add_argument("old_platfile", nargs="?", help="older platform json file to copy searchpairs from")
+parser.add_argument("-o", "--output", help="platform json file to write atomically, instead of stdout")
+parser.add_argument("--full", action="store_true", help="fetch & compile all platforms, ignoring the cache")
+args = parser.parse_args()
+
+os.makedirs(os.path.dirname(logfile), exist_ok=True)
 logging.basicConfig(filename=logfile, encoding='utf-8', level=loglevel, filemode=logfmode)
 
+old_platfile = args.old_platfile if args.old_platfile is not None else args.output
+try:
+    old_plats, old_raw = readPlatformFile(old_platfile)
+except (IOError, ValueError) as e:
+    err_msg = f"{sys.argv[0]}: Could not read older platform file {old_platfile}: {e}"
+    print(err_msg, file=sys.stderr)
+    logging.error(err_msg)
+    sys.exit(-1)
+
 # authenticate to CyberArk & add session token & subdomain to request
 logging.info("Authenticating...")
-admin_creds = getAuthnCreds()
-resp_dict = authnCyberark(admin_creds)
+resp_dict = getAuthnCreds()
+errCheck(resp_dict)
+admin_creds = resp_dict["admin_creds"]
+resp_dict = authnCyberarkCached(admin_creds)
 errCheck(resp_dict)
 logging.info("Successfully authenticated.")
 session_token = resp_dict["session_token"]
 cybr_subdomain = admin_creds["cybr_subdomain"]
 
-url = f"https://{cybr_subdomain}.privilegecloud.cyberark.cloud/passwordvault/api/platforms?active=true"
+url = f"{pcloudUrl(cybr_subdomain)}/passwordvault/api/platforms?active=true"
+cache = readCache()
+# cached hashes describe the file last written, only trust them for that file
+cached = cache.get(url, {})
+if args.full or old_raw is None or cached.get("output_hash", None) != hashBytes(old_raw):
+    cached = {}
+
 headers = {
     "Content-Type": "application/json",
     "Authorization": f"Bearer {session_token}",
 }
-response = requests.request("GET", url, headers=headers)
+if cached.get("etag", None):
+    headers["If-None-Match"] = cached["etag"]
+response = getHttpClient().request("GET", url, headers=headers)
+
+unchanged = response.status_code == 304
 if response.status_code == 200:
-    # Parse the JSON response into a dictionary
-    plat_data = response.json()
+    payload_hash = hashBytes(response.content)
+    unchanged = payload_hash == cached.get("payload_hash", None)
+elif not unchanged:
+    err_msg = f"{sys.argv[0]}: Could not retrieve platforms: {response.status_code} {response.text}"
+    print(err_msg, file=sys.stderr)
+    logging.error(err_msg)
+    sys.exit(-1)
 
-plats = plat_data["Platforms"]
+if unchanged:
+    logging.info(f"Platforms unchanged since last compile ({response.status_code}), keeping {old_platfile}")
+    if args.output is None:
+        sys.stdout.write(old_raw.decode())
+    else:
+        if os.path.abspath(args.output) != os.path.abspath(old_platfile):
+            writeAtomic(args.output, old_raw)
+        if loadArtifact(args.output, "platforms") is None:
+            logging.info(f"Wrote {compilePlatformArtifact(args.output)}")
+    sys.exit(0)
+
+# re-derive only platforms whose definition changed, keep curated searchpairs
+plats = response.json()["Platforms"]
+platform_hashes = {}
 platsout = {}
+derived = 0
 for p in plats:
-  plat_id = p['general']['id']
-  platsout[plat_id] = {}          # create dictionary entry named for platform ID
-  platsout[plat_id]['id'] = plat_id
-  platsout[plat_id]['systemtype'] = p['general']['systemType'].replace(" ","+")
-  platsout[plat_id]['searchpairs'] = {}
-  platsout[plat_id]['required'] = []
-  platsout[plat_id]['allkeys'] = ['SECRET']
-  for reqd in p['properties']['required']:
-    prop_name = reqd['name'].upper()
-    platsout[plat_id]['required'].append(prop_name)
-    platsout[plat_id]['allkeys'].append(prop_name)
-  for optl in p['properties']['optional']:
-    prop_name = optl['name'].upper()
-    platsout[plat_id]['allkeys'].append(prop_name)
-
-# if filename of old platform listing provided, copy search_pairs into new
-if len(sys.argv) > 1:
-  old_platfile = sys.argv[1]
-  with open(old_platfile) as f_in:
-    old_plats = json.load(f_in)
-  newplatsout = platsout.copy() # avoids changing dictionary while iterating
-  for plat_id in platsout:
-    old_plat = old_plats.get(plat_id,None)
+    plat_id = p['general']['id']
+    platform_hashes[plat_id] = hashJson(p)
+    old_plat = old_plats.get(plat_id, None)
+    if old_plat is not None and cached.get("platform_hashes", {}).get(plat_id, None) == platform_hashes[plat_id]:
+        platsout[plat_id] = old_plat
+        continue
+    platsout[plat_id] = compilePlatform(p)
+    derived += 1
     if old_plat is not None:
-      newplatsout[plat_id]['searchpairs'] = old_plat['searchpairs']
-  platsout = newplatsout
+        platsout[plat_id]['searchpairs'] = copy.deepcopy(old_plat.get('searchpairs', {}))
+removed = [plat_id for plat_id in old_plats if plat_id not in platsout]
+logging.info(f"{len(platsout)} platform(s): {derived} compiled, {len(platsout) - derived} unchanged, "
+             f"{len(removed)} removed {removed}")
+
+# warn about platforms that getPlatformId() cannot tell apart
+for keys, values_index in compilePlatformIndex(platsout):
+    for values, pids in values_index.items():
+        if len(pids) > 1:
+            logging.warning(f"Platforms {pids} have identical searchpairs: {dict(zip(keys, values))}")
 
-print(json.dumps(platsout))
+output = json.dumps(platsout)
+if args.output is None:
+    print(output)
+else:
+    writeAtomic(args.output, output.encode())
+    logging.info(f"Wrote {args.output}")
+    logging.info(f"Wrote {compilePlatformArtifact(args.output)}")
+
+# output_hash is of the file as written, incl. print()'s newline when stdout is redirected
+cache[url] = {
+    "etag": response.headers.get("ETag", None),
+    "payload_hash": payload_hash,
+    "output_hash": hashBytes((output + ("\n" if args.output is None else "")).encode()),
+    "platform_hashes": platform_hashes,
+}
+writeCache(cache)
@@ -0,0 +1,470 @@
+#!/usr/local/bin/python3
+
+'''
+ Offline stand-in for the CyberArk Identity, Privilege Cloud and
+ Secrets Hub APIs called by the onboarding library, for performance
+ and regression testing without a live tenant.
+
+ Serves all three services on one port. Point the library at it w/
+ CYBR_BASE_URL (see src/cybrUrl.py):
+
+   ./bin/mockCybrServer.py --port 8080 --latency 0.05 --throttle-rate 0.02 &
+   export CYBR_BASE_URL=http://127.0.0.1:8080
+
+ State (safes, members, accounts, secret stores, filters, policies) is
+ kept in memory and lost when the server stops. Any credentials are
+ accepted. Every API request is delayed by --latency seconds (+/- --jitter)
+ and fails w/ 500 (--error-rate) or 429 w/ Retry-After (--throttle-rate)
+ at the given rates.
+
+ Besides the API, GET /mock/stats returns request counts per endpoint and
+ POST /mock/reset clears all state & counts.
+'''
+
+import os
+import sys
+import json
+import time
+import uuid
+import base64
+import hashlib
+import random
+import argparse
+import threading
+import logging
+from urllib.parse import urlsplit, parse_qs, unquote
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logfile = "./logs/mockCybrServer.log"
+loglevel = logging.INFO
+logfmode = 'w'                # w = overwrite, a = append
+
+PLATFORM_FILE = "./json/platforms.json"   # platforms served by GET /passwordvault/api/platforms
+TOKEN_TTL = 3600                          # seconds, lifetime of issued JWTs
+SH_SOURCE_STORE_ID = "store-pcloud-source"
+
+# ====================================================
+# In-memory tenant. All methods return (status_code, body dict or None).
+
+class MockTenant:
+
+    def __init__(self, target_stores, platforms):
+        self.target_stores = target_stores    # list of (accountId, regionId)
+        self.platforms = platforms
+        self.lock = threading.Lock()
+        self.reset()
+
+    # -------------------------------------------
+    def reset(self):
+        with self.lock:
+            self.safes = {}          # safe name (lowercase) -> {"safeName", "members": {name.lower(): member}}
+            self.accounts = {}       # account id -> account
+            self.account_names = {}  # (safe name (lowercase), account name) -> account id
+            self.filters = {}        # store id -> {filter id -> filter}
+            self.policies = {}       # policy id -> policy
+            self.counts = {}         # "METHOD endpoint" -> count
+            self.stores = [{
+                "id": SH_SOURCE_STORE_ID,
+                "type": "PAM_PCLOUD",
+                "name": "Privilege Cloud",
+                "behaviors": ["SECRETS_SOURCE"],
+                "data": {},
+            }]
+            for account_id, region_id in self.target_stores:
+                self.stores.append({
+                    "id": f"store-{account_id}-{region_id}",
+                    "type": "AWS_ASM",
+                    "name": f"ASM {account_id} {region_id}",
+                    "behaviors": ["SECRETS_TARGET"],
+                    "data": {"accountId": account_id, "regionId": region_id},
+                })
+            self.filters[SH_SOURCE_STORE_ID] = {}
+
+    # -------------------------------------------
+    def count(self, key):
+        with self.lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    # -------------------------------------------
+    def token(self):
+        claims = {"sub": "mock", "exp": int(time.time()) + TOKEN_TTL}
+        payload = base64.urlsafe_b64encode(json.dumps(claims).encode()).decode().rstrip("=")
+        header = base64.urlsafe_b64encode(b'{"alg":"none","typ":"JWT"}').decode().rstrip("=")
+        return 200, {"access_token": f"{header}.{payload}.mock", "token_type": "Bearer", "expires_in": TOKEN_TTL}
+
+    # -------------------------------------------
+    def createSafe(self, body):
+        safe_name = body.get("safeName", "")
+        with self.lock:
+            if safe_name.lower() in self.safes:
+                return 409, {"ErrorCode": "SFWS0002", "ErrorMessage": f"Safe {safe_name} already exists."}
+            self.safes[safe_name.lower()] = {"safeName": safe_name, "members": {}}
+        return 201, {"safeName": safe_name, "safeUrlId": safe_name}
+
+    # -------------------------------------------
+    def deleteSafe(self, safe_name):
+        with self.lock:
+            if self.safes.pop(safe_name.lower(), None) is None:
+                return 404, {"ErrorCode": "SFWS0007", "ErrorMessage": f"Safe {safe_name} not found."}
+        return 204, None
+
+    # -------------------------------------------
+    def listMembers(self, safe_name, query):
+        offset = int(query.get("offset", ["0"])[0])
+        limit = int(query.get("limit", ["25"])[0])
+        with self.lock:
+            safe = self.safes.get(safe_name.lower(), None)
+            if safe is None:
+                return 404, {"ErrorCode": "SFWS0007", "ErrorMessage": f"Safe {safe_name} not found."}
+            members = list(safe["members"].values())
+        return 200, {"value": members[offset:offset + limit], "count": len(members)}
+
+    # -------------------------------------------
+    def addMember(self, safe_name, body):
+        member_name = body.get("memberName", "")
+        with self.lock:
+            safe = self.safes.get(safe_name.lower(), None)
+            if safe is None:
+                return 404, {"ErrorCode": "SFWS0007", "ErrorMessage": f"Safe {safe_name} not found."}
+            if member_name.lower() in safe["members"]:
+                return 409, {"ErrorCode": "SFWS0012", "ErrorMessage": f"{member_name} is already a member."}
+            member = {"safeName": safe["safeName"], "memberName": member_name,
+                      "memberType": body.get("memberType", "User"),
+                      "permissions": body.get("permissions", {})}
+            safe["members"][member_name.lower()] = member
+        return 201, member
+
+    # -------------------------------------------
+    def updateMember(self, safe_name, member_name, body):
+        with self.lock:
+            safe = self.safes.get(safe_name.lower(), None)
+            member = None if safe is None else safe["members"].get(member_name.lower(), None)
+            if member is None:
+                return 404, {"ErrorCode": "SFWS0015", "ErrorMessage": f"{member_name} is not a member of {safe_name}."}
+            member["permissions"] = body.get("permissions", {})
+        return 200, member
+
+    # -------------------------------------------
+    def createAccount(self, body):
+        safe_name = body.get("safeName", "")
+        with self.lock:
+            if safe_name.lower() not in self.safes:
+                return 404, {"ErrorCode": "PASWS027E", "ErrorMessage": f"Safe {safe_name} not found."}
+            name_key = (safe_name.lower(), body.get("name", None))
+            if name_key in self.account_names:
+                return 409, {"ErrorCode": "PASWS027E", "ErrorMessage": "Account already exists."}
+            account = {k: v for k, v in body.items() if k != "secret"}
+            account["id"] = f"{len(self.accounts) + 1}_{uuid.uuid4().hex[:8]}"
+            account["createdTime"] = int(time.time())
+            self.accounts[account["id"]] = account
+            self.account_names[name_key] = account["id"]
+        return 201, account
+
+    # -------------------------------------------
+    def listAccounts(self, query):
+        offset = int(query.get("offset", ["0"])[0])
+        limit = int(query.get("limit", ["50"])[0])
+        safe_name = None
+        filter_expr = query.get("filter", [""])[0]
+        if filter_expr.startswith("safeName eq "):
+            safe_name = filter_expr[len("safeName eq "):].strip().lower()
+        with self.lock:
+            accounts = [a for a in self.accounts.values()
+                        if safe_name is None or a["safeName"].lower() == safe_name]
+        page = accounts[offset:offset + limit]
+        body = {"value": page, "count": len(accounts)}
+        if offset + limit < len(accounts):
+            body["nextLink"] = f"api/accounts?offset={offset + limit}&limit={limit}&filter={filter_expr}"
+        return 200, body
+
+    # -------------------------------------------
+    def deleteAccount(self, account_id):
+        with self.lock:
+            account = self.accounts.pop(account_id, None)
+            if account is None:
+                return 404, {"ErrorCode": "PASWS029E", "ErrorMessage": f"Account {account_id} not found."}
+            self.account_names.pop((account["safeName"].lower(), account.get("name", None)), None)
+        return 204, None
+
+    # -------------------------------------------
+    def listPlatforms(self):
+        platforms = []
+        for platform_id, platform in self.platforms.items():
+            required = [{"name": k.title()} for k in platform["required"]]
+            optional = [{"name": k.title()} for k in platform["allkeys"]
+                        if k != "SECRET" and k not in platform["required"]]
+            platforms.append({
+                "general": {"id": platform_id, "name": platform_id, "active": True,
+                            "systemType": platform["systemtype"].replace("+", " ")},
+                "properties": {"required": required, "optional": optional},
+            })
+        return 200, {"Platforms": platforms, "Total": len(platforms)}
+
+    # -------------------------------------------
+    def listStores(self):
+        with self.lock:
+            return 200, {"secretStores": list(self.stores)}
+
+    # -------------------------------------------
+    def listFilters(self, store_id):
+        with self.lock:
+            filters = self.filters.get(store_id, None)
+            if filters is None:
+                return 404, {"code": "NOT_FOUND", "message": f"Secret store {store_id} not found."}
+            return 200, {"filters": list(filters.values())}
+
+    # -------------------------------------------
+    def createFilter(self, store_id, body):
+        with self.lock:
+            filters = self.filters.get(store_id, None)
+            if filters is None:
+                return 404, {"code": "NOT_FOUND", "message": f"Secret store {store_id} not found."}
+            sh_filter = {"id": f"filter-{uuid.uuid4()}", "type": body.get("type", "PAM_SAFE"),
+                          "data": body.get("data", {})}
+            filters[sh_filter["id"]] = sh_filter
+        return 201, sh_filter
+
+    # -------------------------------------------
+    def deleteFilter(self, store_id, filter_id):
+        with self.lock:
+            if self.filters.get(store_id, {}).pop(filter_id, None) is None:
+                return 404, {"code": "NOT_FOUND", "message": f"Filter {filter_id} not found."}
+        return 204, None
+
+    # -------------------------------------------
+    def listPolicies(self):
+        with self.lock:
+            return 200, {"policies": list(self.policies.values())}
+
+    # -------------------------------------------
+    def createPolicy(self, body):
+        policy = {"id": f"policy-{uuid.uuid4()}", "name": body.get("name", ""),
+                  "description": body.get("description", ""),
+                  "source": body.get("source", {}), "target": body.get("target", {}),
+                  "filter": body.get("filter", {}),
+                  "state": {"current": "ENABLED"}}
+        with self.lock:
+            self.policies[policy["id"]] = policy
+        return 201, policy
+
+    # -------------------------------------------
+    def setPolicyState(self, policy_id, body):
+        action = body.get("action", "")
+        if action not in ["enable", "disable"]:
+            return 400, {"code": "BAD_REQUEST", "message": f"Unknown action {action}."}
+        with self.lock:
+            policy = self.policies.get(policy_id, None)
+            if policy is None:
+                return 404, {"code": "NOT_FOUND", "message": f"Policy {policy_id} not found."}
+            policy["state"] = {"current": "ENABLED" if action == "enable" else "DISABLED"}
+        return 200, None
+
+    # -------------------------------------------
+    def deletePolicy(self, policy_id):
+        with self.lock:
+            policy = self.policies.get(policy_id, None)
+            if policy is None:
+                return 404, {"code": "NOT_FOUND", "message": f"Policy {policy_id} not found."}
+            if policy["state"]["current"] == "ENABLED":
+                return 409, {"code": "CONFLICT", "message": f"Policy {policy_id} must be disabled first."}
+            self.policies.pop(policy_id)
+        return 204, None
+
+
+# ====================================================
+# Routes (method, path segments) to MockTenant methods. Returns
+# (endpoint name for stats, status_code, body) or None if no route matches.
+
+def route(tenant, method, parts, query, body):
+    match (method, parts):
+        case ("POST", ["api", "idadmin", "oauth2", "platformtoken"]):
+            return ("platformtoken", *tenant.token())
+        case ("GET", ["passwordvault", "api", "platforms"]):
+            return ("platforms", *tenant.listPlatforms())
+        case ("POST", ["passwordvault", "api", "safes"]):
+            return ("safes", *tenant.createSafe(body))
+        case ("DELETE", ["passwordvault", "api", "safes", safe_name]):
+            return ("safes/{name}", *tenant.deleteSafe(safe_name))
+        case ("GET", ["passwordvault", "api", "safes", safe_name, "members"]):
+            return ("safes/{name}/members", *tenant.listMembers(safe_name, query))
+        case ("POST", ["passwordvault", "api", "safes", safe_name, "members"]):
+            return ("safes/{name}/members", *tenant.addMember(safe_name, body))
+        case ("PUT", ["passwordvault", "api", "safes", safe_name, "members", member_name]):
+            return ("safes/{name}/members/{member}", *tenant.updateMember(safe_name, member_name, body))
+        case ("GET", ["passwordvault", "api", "accounts"]):
+            return ("accounts", *tenant.listAccounts(query))
+        case ("POST", ["passwordvault", "api", "accounts"]):
+            return ("accounts", *tenant.createAccount(body))
+        case ("DELETE", ["passwordvault", "api", "accounts", account_id]):
+            return ("accounts/{id}", *tenant.deleteAccount(account_id))
+        case ("GET", ["api", "secret-stores"]):
+            return ("secret-stores", *tenant.listStores())
+        case ("GET", ["api", "secret-stores", store_id, "filters"]):
+            return ("secret-stores/{id}/filters", *tenant.listFilters(store_id))
+        case ("POST", ["api", "secret-stores", store_id, "filters"]):
+            return ("secret-stores/{id}/filters", *tenant.createFilter(store_id, body))
+        case ("DELETE", ["api", "secret-stores", store_id, "filters", filter_id]):
+            return ("secret-stores/{id}/filters/{id}", *tenant.deleteFilter(store_id, filter_id))
+        case ("GET", ["api", "policies"]):
+            return ("policies", *tenant.listPolicies())
+        case ("POST", ["api", "policies"]):
+            return ("policies", *tenant.createPolicy(body))
+        case ("PUT", ["api", "policies", policy_id, "state"]):
+            return ("policies/{id}/state", *tenant.setPolicyState(policy_id, body))
+        case ("DELETE", ["api", "policies", policy_id]):
+            return ("policies/{id}", *tenant.deletePolicy(policy_id))
+    return None
+
+
+# ====================================================
+# HTTP handler. Keeps connections alive (HTTP/1.1) like the real services,
+# so client connection pooling is exercised.
+
+class MockCybrHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True    # headers & body are written separately
+
+    # set by makeMockServer()
+    tenant = None
+    latency = 0.0
+    jitter = 0.0
+    error_rate = 0.0
+    throttle_rate = 0.0
+    retry_after = 0
+
+    def do_GET(self):
+        self.handle_api("GET")
+
+    def do_POST(self):
+        self.handle_api("POST")
+
+    def do_PUT(self):
+        self.handle_api("PUT")
+
+    def do_DELETE(self):
+        self.handle_api("DELETE")
+
+    # -------------------------------------------
+    def handle_api(self, method):
+        url = urlsplit(self.path)
+        parts = [unquote(p) for p in url.path.strip("/").split("/")]
+        query = parse_qs(url.query)
+        length = int(self.headers.get("Content-Length", "0"))
+        raw_body = self.rfile.read(length) if length > 0 else b""
+
+        if parts == ["mock", "stats"] and method == "GET":
+            with self.tenant.lock:
+                counts = dict(self.tenant.counts)
+            return self.reply(200, {"counts": counts, "total": sum(counts.values())})
+        if parts == ["mock", "reset"] and method == "POST":
+            self.tenant.reset()
+            return self.reply(204, None)
+
+        if self.latency > 0 or self.jitter > 0:
+            time.sleep(max(0.0, random.uniform(self.latency - self.jitter, self.latency + self.jitter)))
+
+        body = {}
+        if raw_body and self.headers.get("Content-Type", "").startswith("application/json"):
+            try:
+                body = json.loads(raw_body)
+            except ValueError:
+                return self.reply(400, {"ErrorCode": "BAD_JSON", "ErrorMessage": "Request body is not JSON."})
+        if parts[:4] != ["api", "idadmin", "oauth2", "platformtoken"] \
+                and not self.headers.get("Authorization", "").startswith("Bearer "):
+            return self.reply(401, {"ErrorCode": "UNAUTHORIZED", "ErrorMessage": "Missing bearer token."})
+
+        if self.throttle_rate > 0 and random.random() < self.throttle_rate:
+            self.tenant.count(f"{method} throttled")
+            return self.reply(429, {"ErrorCode": "TOO_MANY_REQUESTS", "ErrorMessage": "Slow down."},
+                              {"Retry-After": str(self.retry_after)})
+        if self.error_rate > 0 and random.random() < self.error_rate:
+            self.tenant.count(f"{method} failed")
+            return self.reply(500, {"ErrorCode": "INTERNAL", "ErrorMessage": "Injected error."})
+
+        routed = route(self.tenant, method, parts, query, body)
+        if routed is None:
+            return self.reply(404, {"ErrorCode": "NO_ROUTE", "ErrorMessage": f"No route for {method} {url.path}"})
+        endpoint, status_code, response_body = routed
+        self.tenant.count(f"{method} {endpoint}")
+        if method == "GET" and status_code == 200:
+            # conditional GET: ETag is a hash of the response body
+            etag = '"' + hashlib.sha1(json.dumps(response_body).encode()).hexdigest() + '"'
+            if self.headers.get("If-None-Match", None) == etag:
+                return self.reply(304, None, {"ETag": etag})
+            return self.reply(status_code, response_body, {"ETag": etag})
+        self.reply(status_code, response_body)
+
+    # -------------------------------------------
+    def reply(self, status_code, body, headers=None):
+        data = b"" if body is None else json.dumps(body).encode()
+        self.send_response(status_code)
+        if body is not None:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    # -------------------------------------------
+    def log_message(self, format, *args):
+        logging.debug(format % args)
+
+
+# ====================================================
+# Returns a mock server listening on host:port (port 0 = any free port),
+# not yet serving. Run it w/ serve_forever(), e.g. in a thread; its URL is
+# f"http://{server.server_address[0]}:{server.server_address[1]}".
+
+def makeMockServer(host="127.0.0.1", port=0, latency=0.0, jitter=0.0, error_rate=0.0,
+                   throttle_rate=0.0, retry_after=0, target_stores=None, platform_file=PLATFORM_FILE):
+    if target_stores is None:
+        target_stores = [("475601244925", "us-east-1")]
+    try:
+        with open(platform_file) as f_in:
+            platforms = json.load(f_in)
+    except (IOError, ValueError):
+        logging.error(f"Could not read platforms from {platform_file}, serving none.")
+        platforms = {}
+    handler = type("MockCybrHandler", (MockCybrHandler,), {
+        "tenant": MockTenant(target_stores, platforms),
+        "latency": latency,
+        "jitter": jitter,
+        "error_rate": error_rate,
+        "throttle_rate": throttle_rate,
+        "retry_after": retry_after,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+# MAIN ====================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a mock CyberArk tenant for offline testing.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("-p", "--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every API request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- seconds of random latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of API requests failed w/ 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of API requests failed w/ 429")
+    parser.add_argument("--retry-after", type=int, default=0, help="Retry-After seconds sent w/ 429s")
+    parser.add_argument("--target", action="append", metavar="ACCOUNT:REGION",
+                        help="AWS_ASM target store to serve (repeatable, default 475601244925:us-east-1)")
+    parser.add_argument("--platforms", default=PLATFORM_FILE, help="platform file to serve platforms from")
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(logfile), exist_ok=True)
+    logging.basicConfig(filename=logfile, encoding='utf-8', level=loglevel, filemode=logfmode)
+
+    target_stores = None
+    if args.target is not None:
+        target_stores = [tuple(t.split(":", 1)) for t in args.target]
+    server = makeMockServer(args.host, args.port, args.latency, args.jitter, args.error_rate,
+                            args.throttle_rate, args.retry_after, target_stores, args.platforms)
+    print(f"Mock CyberArk tenant at http://{args.host}:{server.server_address[1]}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
@@ -1,6 +1,61 @@
 #!/bin/bash
 
+# Builds package ../lib/cybronboard from ../src (see ../src/__init__.py).
+# The src files of each feature are concatenated into one submodule, in the
+# order listed. Src files import names of other features explicitly
+# (from .<feature> import <name>), names of their own feature need no import.
+
 modsrc="../src"
-modpath="../lib/cybronboard.py"
+pkgpath="../lib/cybronboard"
+
+# feature submodule:src files
+features=(
+  "urls:cybrUrl"
+  "tracing:traceSpans"
+  "workflow:runWorkflow"
+  "httpclient:httpClient"
+  "auth:getAuthnCreds authnCyberark authnCyberarkCached"
+  "artifacts:compiledArtifact"
+  "naming:getSafeName"
+  "platforms:getPlatformId platformRegistry validateRequestWithPlatform"
+  "safes:createSafe addSafeMembers deleteSafe"
+  "accounts:createAccount deleteAccount"
+  "secretshub:getSHStoreCatalog getSHSourceStoreId getSHTargetStoreId getSHFilterIndex getSHFilterForSafe getSHPolicyIndex getSHSyncPolicy deleteSHFilterForSafe"
+  "provrequests:loadProvRequests"
+  "cli:errCheck"
+  "onboarding:onboardJournal onboardRequest onboardBatch"
+  "offboarding:offboardRequest offboardBatch"
+  "jobs:onboardWorkQueue onboardJobs"
+  "aio:asyncOnboard"
+)
+
+# every src file must belong to a feature
+for srcfile in $modsrc/*.py; do
+  name=$(basename $srcfile .py)
+  if [ "$name" != "__init__" ] && ! printf '%s\n' "${features[@]}" | grep -qw "$name"; then
+    echo "$0: $srcfile is not in any feature" >&2
+    exit 1
+  fi
+done
+
+rm -f ../lib/cybronboard.py            # single-module library of earlier versions
+rm -rf $pkgpath
+mkdir -p $pkgpath
+cp $modsrc/__init__.py $pkgpath/__init__.py
 
-cat $modsrc/*.py > $modpath
+exports=$pkgpath/_exports.py
+echo "# Generated by bin/package.sh: public name -> feature submodule" > $exports
+echo "EXPORTS = {" >> $exports
+for feature in "${features[@]}"; do
+  submodule=${feature%%:*}
+  srcfiles=""
+  for name in ${feature#*:}; do
+    srcfiles="$srcfiles $modsrc/$name.py"
+  done
+  cat $srcfiles > $pkgpath/$submodule.py
+  # top-level functions, classes & constants not starting w/ an underscore
+  grep -hoE '^(async def|def|class) [A-Za-z][A-Za-z0-9_]*|^[A-Za-z][A-Za-z0-9_]* =' $srcfiles \
+    | sed -E 's/^(async def|def|class) //; s/ =$//' | sort -u \
+    | while read symbol; do echo "    \"$symbol\": \"$submodule\","; done >> $exports
+done
+echo "}" >> $exports
@@ -0,0 +1,46 @@
+#############################################################################
+#############################################################################
+# __init__.py
+
+'''
+ CyberArk onboarding library.
+
+ Built from ../src by bin/package.sh: the src files of each feature are
+ concatenated into one submodule (auth, safes, accounts, secretshub,
+ onboarding, ...) and the public names of all submodules are listed in
+ _exports.py. A submodule is imported the first time one of its names is
+ used, so a script only pays for the features it needs:
+
+   from cybronboard import getSafeName, deleteSafe    # loads naming, safes & their deps
+
+ Module constants that scripts may change at runtime, e.g. PLATFORM_FILE,
+ must be set on their submodule (cybronboard.platforms.PLATFORM_FILE), the
+ package only returns their values. "from cybronboard import *" still
+ imports everything.
+'''
+
+import importlib
+from ._exports import EXPORTS
+
+FEATURES = sorted(set(EXPORTS.values()))
+__all__ = sorted(EXPORTS)
+
+
+# ====================================================
+# Imports submodule of name on first use (PEP 562). Functions & classes are
+# kept as package attributes, so later lookups skip this function.
+
+def __getattr__(name):
+    feature = EXPORTS.get(name, None)
+    if feature is not None:
+        value = getattr(importlib.import_module(f".{feature}", __name__), name)
+        if callable(value):
+            globals()[name] = value
+        return value
+    if name in FEATURES:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__) | set(FEATURES))
@@ -0,0 +1,144 @@
+# Generated by bin/package.sh: public name -> feature submodule
+EXPORTS = {
+    "CYBR_BASE_URL": "urls",
+    "identityUrl": "urls",
+    "pcloudUrl": "urls",
+    "secretsHubUrl": "urls",
+    "JsonlSpanExporter": "tracing",
+    "NoopSpan": "tracing",
+    "OtelJsonExporter": "tracing",
+    "PrometheusExporter": "tracing",
+    "Span": "tracing",
+    "TRACE_BUCKETS": "tracing",
+    "TRACE_FILE": "tracing",
+    "TRACE_METRICS_FILE": "tracing",
+    "TRACE_METRICS_INTERVAL": "tracing",
+    "TRACE_OTEL_BATCH": "tracing",
+    "TRACE_OTEL_FILE": "tracing",
+    "TRACE_PATH_IDS": "tracing",
+    "TRACE_SERVICE_NAME": "tracing",
+    "Tracer": "tracing",
+    "getTracer": "tracing",
+    "pathTemplate": "tracing",
+    "traceSpan": "tracing",
+    "runWorkflow": "workflow",
+    "AimdLimiter": "httpclient",
+    "CybrHttpClient": "httpclient",
+    "HTTP_BACKOFF_BASE": "httpclient",
+    "HTTP_BACKOFF_MAX": "httpclient",
+    "HTTP_IDEMPOTENT_METHODS": "httpclient",
+    "HTTP_MAX_RETRIES": "httpclient",
+    "HTTP_POOL_SIZE": "httpclient",
+    "HTTP_RATE_LIMIT": "httpclient",
+    "HTTP_RETRY_STATUS": "httpclient",
+    "HTTP_THROTTLE_STATUS": "httpclient",
+    "HTTP_TIMEOUT": "httpclient",
+    "TokenBucket": "httpclient",
+    "addUnauthorizedHandler": "httpclient",
+    "getHttpClient": "httpclient",
+    "logHttpStats": "httpclient",
+    "notifyUnauthorized": "httpclient",
+    "retryDelay": "httpclient",
+    "TOKEN_CACHE_FILE": "auth",
+    "TOKEN_REFRESH_MARGIN": "auth",
+    "authnCyberark": "auth",
+    "authnCyberarkCached": "auth",
+    "getAuthnCreds": "auth",
+    "invalidateSessionToken": "auth",
+    "ARTIFACT_MAGIC": "artifacts",
+    "ARTIFACT_VERSION": "artifacts",
+    "USE_ARTIFACTS": "artifacts",
+    "artifactPath": "artifacts",
+    "loadArtifact": "artifacts",
+    "writeArtifact": "artifacts",
+    "SAFE_NAME_RULES_FILE": "naming",
+    "applySafeNameRules": "naming",
+    "buildSafeNameProgram": "naming",
+    "compileSafeNameArtifact": "naming",
+    "compileSafeNameRules": "naming",
+    "compileSafeNameTables": "naming",
+    "getSafeName": "naming",
+    "getSafeNames": "naming",
+    "loadSafeNameProgram": "naming",
+    "PLATFORM_FILE": "platforms",
+    "PlatformRegistry": "platforms",
+    "compilePlatformArtifact": "platforms",
+    "compilePlatformIndex": "platforms",
+    "compilePlatforms": "platforms",
+    "getPlatformId": "platforms",
+    "getPlatformRegistry": "platforms",
+    "validateRequestWithPlatform": "platforms",
+    "MEMBER_OK_STATUS": "safes",
+    "MEMBER_PAGE_SIZE": "safes",
+    "SAFE_MEMBER_CONCURRENCY": "safes",
+    "addSafeMembers": "safes",
+    "createSafe": "safes",
+    "deleteSafe": "safes",
+    "ACCOUNT_DELETE_CONCURRENCY": "accounts",
+    "ACCOUNT_DELETE_OK_STATUS": "accounts",
+    "ACCOUNT_PAGE_SIZE": "accounts",
+    "createAccount": "accounts",
+    "deleteAccount": "accounts",
+    "deleteAccountById": "accounts",
+    "deleteAccountsInSafes": "accounts",
+    "deleteSafeAccounts": "accounts",
+    "getSafeAccountPages": "accounts",
+    "SHFilterIndex": "secretshub",
+    "SHPolicyIndex": "secretshub",
+    "SHStoreCatalog": "secretshub",
+    "SH_CACHE_TTL": "secretshub",
+    "SH_STORE_CACHE_FILE": "secretshub",
+    "SH_STORE_CACHE_TTL": "secretshub",
+    "deleteSHFilterForSafe": "secretshub",
+    "getSHFilterForSafe": "secretshub",
+    "getSHFilterIndex": "secretshub",
+    "getSHPolicyIndex": "secretshub",
+    "getSHSourceStoreId": "secretshub",
+    "getSHStoreCatalog": "secretshub",
+    "getSHSyncPolicy": "secretshub",
+    "getSHTargetStoreId": "secretshub",
+    "shCacheStale": "secretshub",
+    "loadProvRequests": "provrequests",
+    "errCheck": "cli",
+    "BATCH_WORKERS": "onboarding",
+    "MEMBER_KEYS": "onboarding",
+    "OnboardJournal": "onboarding",
+    "SAFE_STEPS": "onboarding",
+    "SH_STEPS": "onboarding",
+    "journalKey": "onboarding",
+    "onboardBatch": "onboarding",
+    "onboardRequest": "onboarding",
+    "onboardWorkflow": "onboarding",
+    "OFFBOARD_WORKERS": "offboarding",
+    "offboardBatch": "offboarding",
+    "offboardRequest": "offboarding",
+    "offboardWorkflow": "offboarding",
+    "JOB_HISTORY": "jobs",
+    "JOB_RESULT_KEYS": "jobs",
+    "JOB_SAFE_LOCKS": "jobs",
+    "JOB_WORKERS": "jobs",
+    "OnboardJobManager": "jobs",
+    "OnboardWorkQueue": "jobs",
+    "QueueFull": "jobs",
+    "WORK_QUEUE_DB": "jobs",
+    "WORK_QUEUE_LANES": "jobs",
+    "WORK_QUEUE_SIZE": "jobs",
+    "ASYNC_CONCURRENCY": "aio",
+    "addSafeMembersAsync": "aio",
+    "authnCyberarkAsync": "aio",
+    "authnCyberarkCachedAsync": "aio",
+    "createAccountAsync": "aio",
+    "createSafeAsync": "aio",
+    "deleteAccountAsync": "aio",
+    "deleteSafeAccountsAsync": "aio",
+    "deleteSafeAsync": "aio",
+    "getAsyncExecutor": "aio",
+    "getSHFilterForSafeAsync": "aio",
+    "getSHSourceStoreIdAsync": "aio",
+    "getSHSyncPolicyAsync": "aio",
+    "getSHTargetStoreIdAsync": "aio",
+    "offboardRequestAsync": "aio",
+    "onboardRequestAsync": "aio",
+    "runAsync": "aio",
+    "runWorkflowAsync": "aio",
+}
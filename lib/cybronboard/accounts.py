@@ -0,0 +1,366 @@
+
+#############################################################################
+#############################################################################
+# createAccount.py
+
+import json
+import logging
+from .httpclient import getHttpClient
+from .platforms import getPlatformRegistry
+from .urls import pcloudUrl
+
+def createAccount(prov_req, http_client=None):
+    logging.debug("================ createAccount() ================")
+    if http_client is None:
+        http_client = getHttpClient()
+
+    # ensure provisioning request has accountValues, if not exit w/ error
+    if prov_req.get("accountValues",None) is None:
+        err_msg = "Provisioning request does not contain account values. Unable to create account."
+        logging.error(err_msg)
+        return_dict = {}
+        return_dict["status_code"] = 400
+        return_dict["response_body"] = err_msg
+        return return_dict
+
+    # get platform dictionary from registry of platforms compiled with compileplats.py
+    try:
+        platforms = getPlatformRegistry().platforms()
+    except (IOError, ValueError):
+        err_msg = f"Could not read file: {getPlatformRegistry().platform_file}"
+        logging.error(err_msg)
+        return_dict = {}
+        return_dict["status_code"] = 500
+        return_dict["response_body"] = err_msg
+        return return_dict
+
+    # Extract provisioning request values
+    cybr_subdomain = prov_req["cybr_subdomain"]
+    session_token = prov_req["session_token"]
+    platform_id = prov_req["platform_id"]
+    safe_name = prov_req["safe_name"]
+
+    status_code = 201
+    response_body = f"Account created successfully."
+
+    # Construct account request from values in provisioning request
+    acct_props = prov_req["accountValues"]
+    logging.debug("accountValues:",acct_props)
+
+    # Construct account name per vault naming algorithm
+    acct_name = platforms[platform_id]["systemtype"]
+    acct_name += "-" + platform_id
+    acct_name += "-" + acct_props["address"]
+    acct_name += "-" + acct_props["username"]
+
+    account_req = {
+        "safeName": safe_name,
+        "platformID": platform_id,
+        "name": acct_name
+    }
+    # add required properties to account_request
+    reqs_plat_props = platforms[platform_id]["required"]
+    for key, val in acct_props.items():
+        if key.upper() in reqs_plat_props:
+            account_req[key] = acct_props[key]
+
+    # secret and username are optional, but are not platformAccountProperties
+    secret = acct_props.get("secret",None)
+    if secret is not None:
+        # hardcode password type for now - need to revisit for key type
+        account_req["secretType"] = "password"  
+        account_req["secret"] = secret
+        acct_props.pop("secret")
+    username = acct_props.get("username",None)
+    if username is not None:
+        account_req["username"] = username 
+        acct_props.pop("username")
+
+    account_req["secretManagement"] = {
+        "automaticManagementEnabled": True
+    }
+    # add optional values to account properties
+    account_req["platformAccountProperties"] = {}
+    for key, val in acct_props.items():
+        if key.upper() not in reqs_plat_props:
+            account_req["platformAccountProperties"][key] = acct_props[key]
+
+    logging.debug(f"account_req: {account_req}")
+
+    url = f"{pcloudUrl(cybr_subdomain)}/passwordvault/api/accounts"
+    payload = json.dumps(account_req)
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {session_token}",
+    }
+    response = http_client.request("POST", url, headers=headers, data=payload)
+    status_code = response.status_code
+    logging.debug(response.text)
+    if status_code != 201:
+        if response.status_code == 409:
+            status_code = 409
+            response_body = f"Account with the name {acct_name} already exists."
+        else:
+            response_body = "Invalid request format."
+            logging.debug(response_body)
+            logging.debug(response.text)
+
+    logging.debug(f"\turl: {url}\n\tpayload: {payload}")
+    logging.debug(f"\tstatus_code: {status_code}\n\tresponse: {response_body}")
+
+    return_dict = {}
+    return_dict["status_code"] = status_code
+    return_dict["response_body"] = response_body
+    return return_dict
+#############################################################################
+#############################################################################
+# deleteAccount.py
+
+import os
+import json
+import logging
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from .httpclient import getHttpClient
+from .tracing import getTracer
+from .urls import pcloudUrl
+
+# ====================================================
+# Constants
+ACCOUNT_DELETE_CONCURRENCY = int(os.environ.get("CYBR_DELETE_CONCURRENCY", "8"))  # max parallel account deletes
+ACCOUNT_PAGE_SIZE = 1000            # accounts per page when listing the accounts of a safe
+ACCOUNT_DELETE_OK_STATUS = [204, 404]  # deleted, already gone
+
+# ====================================================
+# Yields pages (lists of account dictionaries) of the accounts in safe
+# prov_req["safe_name"], ACCOUNT_PAGE_SIZE at a time, so a large safe is
+# never held as one response. Raises requests.RequestException if a page
+# cannot be retrieved.
+# Accounts must not be deleted while paging, deletes shift later pages.
+
+def getSafeAccountPages(prov_req, http_client=None):
+    if http_client is None:
+        http_client = getHttpClient()
+    cybr_subdomain = prov_req["cybr_subdomain"]
+    session_token = prov_req["session_token"]
+    safe_name = prov_req["safe_name"]
+
+    url = f"{pcloudUrl(cybr_subdomain)}/passwordvault/api/accounts"
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {session_token}",
+    }
+    offset = 0
+    while True:
+        response = http_client.request("GET", url, headers=headers,
+                        params={"filter": f"safeName eq {safe_name}", "offset": offset, "limit": ACCOUNT_PAGE_SIZE})
+        if response.status_code != 200:
+            logging.error(f"Could not list accounts of safe {safe_name}: {response.status_code}")
+            logging.debug(response.text)
+            raise requests.HTTPError(f"{response.status_code} listing accounts of safe {safe_name}", response=response)
+        accounts_dict = json.loads(response.text)
+        page = accounts_dict.get("value", [])
+        if len(page) > 0:
+            yield page
+        offset += len(page)
+        if len(page) == 0 or offset >= accounts_dict.get("count", 0):
+            return
+
+
+# ====================================================
+# Deletes one account (dictionary as listed by the vault) and returns its
+# account result dictionary: account_id, name, status_code & response_body.
+
+def deleteAccountById(prov_req, account, http_client=None):
+    if http_client is None:
+        http_client = getHttpClient()
+    cybr_subdomain = prov_req["cybr_subdomain"]
+    session_token = prov_req["session_token"]
+    account_id = account["id"]
+    account_name = account.get("name", account_id)
+    safe_name = account.get("safeName", prov_req.get("safe_name", None))
+
+    url = f"{pcloudUrl(cybr_subdomain)}/passwordvault/api/accounts/{account_id}"
+    headers = {
+        "Authorization": f"Bearer {session_token}",
+    }
+    try:
+        response = http_client.request("DELETE", url, headers=headers)
+        status_code = response.status_code
+        response_text = response.text
+    except requests.RequestException as e:
+        status_code = 500
+        response_text = str(e)
+    if status_code == 204:
+        response_body = f"Account {account_name} in safe {safe_name} deleted successfully."
+        logging.info(response_body)
+    elif status_code == 404:
+        response_body = f"Account {account_name} in safe {safe_name} not found."
+        logging.info(response_body)
+    else:
+        response_body = f"Error deleting account {account_name} in safe {safe_name}."
+        logging.error(response_body)
+        logging.error(f"\t{response_text}")
+
+    account_result = {}
+    account_result["account_id"] = account_id
+    account_result["name"] = account_name
+    account_result["status_code"] = status_code
+    account_result["response_body"] = response_body
+    return account_result
+
+
+# ====================================================
+# Deletes the account of the provisioning request. The account is the one w/
+# prov_req["account_id"], else the one in safe_name w/ the address & username
+# in accountValues (and platform_id, if given). The safe's accounts are read
+# page by page and matched in memory, so any number of accounts can be searched.
+# Returns status_code == 204 if the account was deleted, 404 if not found,
+# 409 if more than one account matches.
+
+def deleteAccount(prov_req, http_client=None):
+    logging.debug("================ deleteAccount() ================")
+    if http_client is None:
+        http_client = getHttpClient()
+
+    # first ensure we have required request values
+    required_keys = ["cybr_subdomain", "session_token"]
+    if prov_req.get("account_id", None) is None:
+        required_keys += ["safe_name", "accountValues"]
+    for rkey in required_keys:
+        input_val = prov_req.get(rkey, None)
+        if input_val is None:
+            err_msg = f"Request is missing key required for account deletion: {rkey}"
+            logging.error(err_msg)
+            return_dict = {}
+            return_dict["status_code"] = 400
+            return_dict["response_body"] = err_msg
+            return return_dict
+
+    if prov_req.get("account_id", None) is not None:
+        account_result = deleteAccountById(prov_req, {"id": prov_req["account_id"]}, http_client)
+        return_dict = {}
+        return_dict["status_code"] = account_result["status_code"]
+        return_dict["response_body"] = account_result["response_body"]
+        return return_dict
+
+    safe_name = prov_req["safe_name"]
+    acct_props = {k.lower(): str(v).lower() for k, v in prov_req["accountValues"].items()}
+    address = acct_props.get("address", None)
+    username = acct_props.get("username", None)
+    platform_id = prov_req.get("platform_id", None)
+    if address is None or username is None:
+        err_msg = "Request accountValues must have address and username for account deletion."
+        logging.error(err_msg)
+        return_dict = {}
+        return_dict["status_code"] = 400
+        return_dict["response_body"] = err_msg
+        return return_dict
+
+    # Returns True if account listed by the vault is the one in the request
+    def isMatch(account):
+        acct_username = account.get("userName", account.get("username", ""))
+        return (str(account.get("address", "")).lower() == address
+                and str(acct_username).lower() == username
+                and (platform_id is None or account.get("platformId", account.get("platformID", None)) == platform_id))
+
+    try:
+        matches = [a for page in getSafeAccountPages(prov_req, http_client) for a in page if isMatch(a)]
+    except requests.RequestException as e:
+        status_code = 500
+        response_body = f"Error searching accounts of safe {safe_name}: {e}"
+        logging.error(response_body)
+        return_dict = {}
+        return_dict["status_code"] = status_code
+        return_dict["response_body"] = response_body
+        return return_dict
+
+    match len(matches):
+        case 1:
+            account_result = deleteAccountById(prov_req, matches[0], http_client)
+            status_code = account_result["status_code"]
+            response_body = account_result["response_body"]
+        case 0:
+            status_code = 404
+            response_body = f"No account for {username}@{address} found in safe {safe_name}."
+        case _:
+            status_code = 409  # 409 == 'conflict'
+            response_body = f"More than one account for {username}@{address} found in safe {safe_name}."
+
+    logging.debug("================ deleteAccount() ================")
+    logging.debug(f"\tstatus_code: {status_code}\n\tresponse: {response_body}")
+
+    return_dict = {}
+    return_dict["status_code"] = status_code
+    return_dict["response_body"] = response_body
+    return return_dict
+
+
+# ====================================================
+# Deletes all accounts in the safes of a list of provisioning requests
+# (w/ cybr_subdomain, session_token & safe_name), e.g. before the safes are
+# deleted. Each safe's accounts are listed page by page, then deleted on a
+# pool of at most max_workers (default ACCOUNT_DELETE_CONCURRENCY) threads
+# shared by all safes, while the accounts of the next safe are listed.
+# Returns a list w/ one dictionary per request, in order: status_code == 200
+# if the safe has no accounts left, response_body, deleted (number of
+# accounts deleted) and account_results w/ account_id, name, status_code &
+# response_body of each account.
+
+def deleteAccountsInSafes(prov_reqs, http_client=None, max_workers=None):
+    logging.debug("================ deleteAccountsInSafes() ================")
+    if http_client is None:
+        http_client = getHttpClient()
+    if max_workers is None:
+        max_workers = ACCOUNT_DELETE_CONCURRENCY
+
+    # HTTP spans of pool threads belong to the caller's span
+    parent_span = getTracer().current()
+    def deleteInSpan(prov_req, account):
+        with getTracer().attach(parent_span):
+            return deleteAccountById(prov_req, account, http_client)
+
+    results = [None] * len(prov_reqs)
+    futures = {}                      # request index -> futures of account deletes
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        for idx, prov_req in enumerate(prov_reqs):
+            missing = [k for k in ["cybr_subdomain", "session_token", "safe_name"] if prov_req.get(k, None) is None]
+            if missing:
+                results[idx] = {"status_code": 400, "deleted": 0, "account_results": [],
+                                "response_body": f"Request is missing key required for account deletion: {missing[0]}"}
+                continue
+            try:
+                accounts = [a for page in getSafeAccountPages(prov_req, http_client) for a in page]
+            except requests.RequestException as e:
+                results[idx] = {"status_code": 500, "deleted": 0, "account_results": [],
+                                "response_body": f"Error listing accounts of safe {prov_req['safe_name']}: {e}"}
+                continue
+            logging.info(f"Deleting {len(accounts)} account(s) in safe {prov_req['safe_name']}.")
+            futures[idx] = [pool.submit(deleteInSpan, prov_req, account) for account in accounts]
+
+        for idx, safe_futures in futures.items():
+            safe_name = prov_reqs[idx]["safe_name"]
+            account_results = [f.result() for f in safe_futures]
+            failed = [r for r in account_results if r["status_code"] not in ACCOUNT_DELETE_OK_STATUS]
+            return_dict = {}
+            if failed:
+                return_dict["status_code"] = failed[0]["status_code"]
+                return_dict["response_body"] = (f"Error deleting {len(failed)} of {len(account_results)} "
+                                                f"account(s) in safe {safe_name}.")
+            else:
+                return_dict["status_code"] = 200
+                return_dict["response_body"] = f"All {len(account_results)} account(s) in safe {safe_name} deleted."
+            return_dict["deleted"] = sum(1 for r in account_results if r["status_code"] == 204)
+            return_dict["account_results"] = account_results
+            results[idx] = return_dict
+
+    for return_dict in results:
+        logging.debug(f"\tstatus_code: {return_dict['status_code']}\n\tresponse: {return_dict['response_body']}")
+    return results
+
+
+# ====================================================
+# Deletes all accounts in safe prov_req["safe_name"], see deleteAccountsInSafes().
+
+def deleteSafeAccounts(prov_req, http_client=None, max_workers=None):
+    return deleteAccountsInSafes([prov_req], http_client, max_workers)[0]
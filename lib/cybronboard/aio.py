@@ -0,0 +1,126 @@
+#############################################################################
+#############################################################################
+# asyncOnboard.py
+
+import os
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .accounts import createAccount, deleteAccount, deleteSafeAccounts
+from .auth import authnCyberark, authnCyberarkCached
+from .offboarding import offboardWorkflow
+from .onboarding import onboardWorkflow
+from .safes import addSafeMembers, createSafe, deleteSafe
+from .secretshub import getSHFilterForSafe, getSHSourceStoreId, getSHSyncPolicy, getSHTargetStoreId
+from .tracing import traceSpan
+
+# ====================================================
+# Constants
+ASYNC_CONCURRENCY = int(os.environ.get("CYBR_ASYNC_CONCURRENCY", "10"))  # max library calls in flight
+# keep ASYNC_CONCURRENCY <= CYBR_HTTP_POOL_SIZE so every call gets a pooled connection
+
+_async_executor = None
+_async_executor_lock = threading.Lock()
+
+# ====================================================
+# asyncio versions of the library functions.
+# Each coroutine takes the same arguments and returns the same dictionary as
+# the function it is named after, so prov_req-in/return_dict-out is unchanged.
+# HTTP I/O is not asynchronous: the library's blocking calls are offloaded to
+# one process-wide pool of ASYNC_CONCURRENCY threads that share the pooled HTTP
+# client (see httpClient.py), so the event loop itself never blocks.
+# onboardRequestAsync() & offboardRequestAsync() offload each step of their
+# workflow separately, so a workflow only holds a thread while one of its steps
+# runs and waits for its next step w/o one. At most ASYNC_CONCURRENCY steps or
+# other library calls run at once, however many coroutines are awaited; a step
+# usually makes one or two HTTP calls, except addSafeMembers() &
+# deleteSafeAccounts(), which fan out on their own threads.
+# Scripts keep calling the synchronous functions.
+
+def getAsyncExecutor():
+    global _async_executor
+    with _async_executor_lock:
+        if _async_executor is None:
+            _async_executor = ThreadPoolExecutor(max_workers=ASYNC_CONCURRENCY,
+                                                 thread_name_prefix="cybronboard")
+        return _async_executor
+
+
+# -------------------------------------------
+# Runs blocking library function func(*args) on the shared executor
+async def runAsync(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(getAsyncExecutor(), functools.partial(func, *args))
+
+
+# -------------------------------------------
+# Runs workflow generator function (see runWorkflow.py) for one request, each
+# step on the shared executor, traced as span_name like its synchronous version
+async def runWorkflowAsync(span_name, workflow_func, *args):
+    request_span = traceSpan(span_name).start()
+    try:
+        workflow = workflow_func(request_span, *args)
+        result = None
+        error = None
+        while True:
+            try:
+                if error is None:
+                    call = workflow.send(result)
+                else:
+                    call = workflow.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                result = await runAsync(call)
+                error = None
+            except Exception as e:
+                result = None
+                error = e
+    finally:
+        request_span.finish()
+
+
+# -------------------------------------------
+async def authnCyberarkAsync(admin_creds, http_client=None):
+    return await runAsync(authnCyberark, admin_creds, http_client)
+
+async def authnCyberarkCachedAsync(admin_creds, http_client=None):
+    return await runAsync(authnCyberarkCached, admin_creds, http_client)
+
+async def createSafeAsync(prov_req, http_client=None):
+    return await runAsync(createSafe, prov_req, http_client)
+
+async def addSafeMembersAsync(prov_req, http_client=None):
+    return await runAsync(addSafeMembers, prov_req, http_client)
+
+async def createAccountAsync(prov_req, http_client=None):
+    return await runAsync(createAccount, prov_req, http_client)
+
+async def getSHSourceStoreIdAsync(prov_req, http_client=None):
+    return await runAsync(getSHSourceStoreId, prov_req, http_client)
+
+async def getSHTargetStoreIdAsync(prov_req, http_client=None):
+    return await runAsync(getSHTargetStoreId, prov_req, http_client)
+
+async def getSHFilterForSafeAsync(prov_req, http_client=None):
+    return await runAsync(getSHFilterForSafe, prov_req, http_client)
+
+async def getSHSyncPolicyAsync(prov_req, http_client=None):
+    return await runAsync(getSHSyncPolicy, prov_req, http_client)
+
+async def deleteAccountAsync(prov_req, http_client=None):
+    return await runAsync(deleteAccount, prov_req, http_client)
+
+async def deleteSafeAccountsAsync(prov_req, http_client=None, max_workers=None):
+    return await runAsync(deleteSafeAccounts, prov_req, http_client, max_workers)
+
+async def deleteSafeAsync(prov_req, http_client=None):
+    return await runAsync(deleteSafe, prov_req, http_client)
+
+async def offboardRequestAsync(prov_req, admin_creds=None, http_client=None):
+    return await runWorkflowAsync("offboardRequest", offboardWorkflow, prov_req, admin_creds, http_client)
+
+async def onboardRequestAsync(prov_req, admin_creds=None, http_client=None, completed=None, on_step=None):
+    return await runWorkflowAsync("onboardRequest", onboardWorkflow, prov_req, admin_creds, http_client,
+                                  completed, on_step)
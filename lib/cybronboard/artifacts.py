@@ -0,0 +1,98 @@
+#############################################################################
+#############################################################################
+# compiledArtifact.py
+
+import os
+import hashlib
+import marshal
+import logging
+
+# ====================================================
+# Constants
+ARTIFACT_VERSION = 2              # bump when the layout of any artifact's data changes
+ARTIFACT_MAGIC = "cybronboard-artifact"
+USE_ARTIFACTS = os.environ.get("CYBR_ARTIFACTS", "1") != "0"   # 0 = always parse JSON sources
+
+# ====================================================
+# Precompiled artifacts of JSON source files (platforms, safe naming rules).
+# An artifact is a marshal file next to its source (platforms.json ->
+# platforms.marshal) holding the source's compiled form, so a process loads it
+# in one read instead of parsing and compiling the JSON. It records the version,
+# kind and size, mtime & sha256 of the source it was compiled from. It is used
+# only if the version & kind match and the source's size & mtime match, or, if
+# only the mtime differs (e.g. after a checkout), its sha256 does. Otherwise
+# callers fall back to the JSON source.
+# Artifacts hold plain data only (dicts, lists, tuples, strings, numbers,
+# frozensets); unlike pickle, marshal runs no code on load. It is not hardened
+# against malicious files either, so an artifact is only loaded if it is owned
+# by the current user and not writable by group or others.
+# Artifacts are written by bin/compileplats.py and bin/compilenamerules.py.
+
+def artifactPath(source_file):
+    return os.path.splitext(source_file)[0] + ".marshal"
+
+
+# ====================================================
+# Returns data of valid artifact of kind for source_file, or None if there is
+# none, it is stale or it cannot be read.
+
+def loadArtifact(source_file, kind):
+    if not USE_ARTIFACTS:
+        return None
+    path = artifactPath(source_file)
+    try:
+        with open(path, "rb") as f_in:
+            path_stat = os.fstat(f_in.fileno())
+            if path_stat.st_uid != os.getuid() or path_stat.st_mode & 0o022:
+                logging.warning(f"Ignoring artifact {path}: not owned by current user or writable by others")
+                return None
+            artifact = marshal.load(f_in)
+        source_stat = os.stat(source_file)
+    except FileNotFoundError:
+        return None
+    except (OSError, EOFError, ValueError, TypeError) as e:
+        logging.warning(f"Ignoring unreadable artifact {path}: {e}")
+        return None
+    if not isinstance(artifact, dict) or artifact.get("magic", None) != ARTIFACT_MAGIC \
+            or artifact.get("version", None) != ARTIFACT_VERSION or artifact.get("kind", None) != kind:
+        logging.info(f"Ignoring artifact {path}: not a version {ARTIFACT_VERSION} {kind} artifact")
+        return None
+    if artifact["source_size"] != source_stat.st_size:
+        logging.info(f"Ignoring stale artifact {path}: {source_file} changed")
+        return None
+    if artifact["source_mtime_ns"] != source_stat.st_mtime_ns:
+        # same size, other mtime: only a checksum tells if the content changed
+        with open(source_file, "rb") as f_in:
+            if hashlib.sha256(f_in.read()).hexdigest() != artifact["source_sha256"]:
+                logging.info(f"Ignoring stale artifact {path}: {source_file} changed")
+                return None
+    logging.debug(f"Loaded {kind} artifact {path}")
+    return artifact["data"]
+
+
+# ====================================================
+# Writes artifact of kind w/ compiled data for source_file atomically, mode 0644.
+# source_bytes must be the source's content that data was compiled from.
+# Returns path of artifact.
+
+def writeArtifact(source_file, kind, data, source_bytes):
+    path = artifactPath(source_file)
+    source_stat = os.stat(source_file)
+    artifact = {
+        "magic": ARTIFACT_MAGIC,
+        "version": ARTIFACT_VERSION,
+        "kind": kind,
+        "source_size": len(source_bytes),
+        # an mtime of another content never matches, so the checksum is used
+        "source_mtime_ns": source_stat.st_mtime_ns if source_stat.st_size == len(source_bytes) else -1,
+        "source_sha256": hashlib.sha256(source_bytes).hexdigest(),
+        "data": data,
+    }
+    tmp_file = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    with os.fdopen(fd, "wb") as f_out:
+        marshal.dump(artifact, f_out)
+        f_out.flush()
+        os.fsync(f_out.fileno())
+    os.replace(tmp_file, path)
+    return path
@@ -0,0 +1,276 @@
+
+#############################################################################
+#############################################################################
+# getAuthnCreds.py
+
+import os
+import sys
+import logging
+
+# Pulls Pcloud admin cred values from environment variables.
+# Returns creds in dictionary.
+
+# This function encapsulates admin cred are retrieval,
+#   to keep that separate from and to simplify authentication.
+
+def getAuthnCreds():
+    logging.debug("================ getAuthnCreds() ================")
+    status_code = 200
+    response_body = "Authentication credentials retrieved."
+    admin_creds = {
+        "cybr_subdomain": os.environ.get("CYBR_SUBDOMAIN",None),
+        "cybr_username": os.environ.get("CYBR_USERNAME",None),
+        "cybr_password": os.environ.get("CYBR_PASSWORD",None),
+    }
+    # Validate all creds have a value, if not exit with error code
+    none_keys = [key for key, value in admin_creds.items() if value is None]
+    if none_keys:
+        status_code = 400
+        response_body = "Missing one of CYBR_SUBDOMAIN, CYBR_USERNAME, CYBR_PASSWORD in environment variables."
+
+    logging.info(response_body)
+
+    return_dict = {}
+    return_dict["status_code"] = status_code
+    return_dict["response_body"] = response_body
+    return_dict["admin_creds"] = admin_creds
+    return return_dict
+
+#############################################################################
+#############################################################################
+# authnCyberark.py
+
+import os
+import sys
+import urllib.parse
+import logging
+from .httpclient import getHttpClient
+from .urls import identityUrl
+
+# Authenticates with creds in dictionary argument.
+# Returns session_token in response dictionary.
+
+def authnCyberark(admin_creds, http_client=None):
+    logging.debug("================ authnCyberark() ================")
+    if http_client is None:
+        http_client = getHttpClient()
+
+    # -------------------------------------------
+    def urlify(s):
+        # URL encodes a given string
+        return urllib.parse.quote(s)
+    # -------------------------------------------
+
+    # first ensure we have required request values
+    required_keys = ["cybr_subdomain","cybr_username","cybr_password"]
+    for rkey in required_keys:
+        input_val = admin_creds.get(rkey, None)
+        if input_val is None:
+            err_msg = f"Admin creds is missing key required for authentication: {rkey}"
+            logging.error(err_msg)
+            return_dict = {}
+            return_dict["status_code"] = 400
+            return_dict["response_body"] = err_msg
+  
+    cybr_subdomain = admin_creds["cybr_subdomain"]
+    cybr_username = admin_creds["cybr_username"]
+    cybr_password = admin_creds["cybr_password"]
+
+    # uses Pcloud creds to authenticate to CyberArk Identity
+    # returns dictionary w/ session_token (CyberArk Identity JWT) to use in further CyberArk API calls
+
+    session_token = ""
+    status_code = 200
+    response_body = "Successfully authenticated to CyberArk Privilege Cloud."
+
+    # Authenticate to CyberArk Identity
+    url = f"{identityUrl(cybr_subdomain)}/api/idadmin/oauth2/platformtoken"
+    payload = f"grant_type=client_credentials&client_id={urlify(cybr_username)}&client_secret={urlify(cybr_password)}"
+    headers = {"Content-Type": "application/x-www-form-urlencoded"}
+    response = http_client.request("POST", url, headers=headers, data=payload)
+    status_code = response.status_code
+    if status_code == 200:
+        # Parse the JSON response into a dictionary
+        data = response.json()
+        # Extract session token from the response dict
+        session_token = data.get("access_token", None)
+        if session_token is None:
+            session_token = ""
+            status_code = 401
+            response_body = f"There was a problem authenticating to: {url}"
+            logging.debug(response.text)
+    else:
+        status_code = 500
+        response_body = f"There was a problem authenticating to: {url}"
+        logging.debug(response_body)
+        logging.debug(response.text)
+
+    logging.debug(f"\turl: {url}\n\tstatus_code: {status_code}\n\tresponse: {response_body}")
+
+    return_dict = {}
+    return_dict["status_code"] = status_code
+    return_dict["response_body"] = response_body
+    return_dict["session_token"] = session_token
+    return return_dict
+
+#############################################################################
+#############################################################################
+# authnCyberarkCached.py
+
+import os
+import json
+import time
+import base64
+import fcntl
+import logging
+from .httpclient import addUnauthorizedHandler
+
+# ====================================================
+# Constants
+TOKEN_CACHE_FILE = os.environ.get("CYBR_TOKEN_CACHE",
+                        os.path.expanduser("~/.cybronboard/tokencache.json"))
+TOKEN_REFRESH_MARGIN = 300    # seconds before token expiry that a new token is fetched
+
+# In-process copy of cached tokens, avoids re-reading the cache file
+# when one process authenticates more than once.
+_token_memo = {}
+
+# ====================================================
+# Cache layer in front of authnCyberark().
+# Session tokens (JWTs) are stored in TOKEN_CACHE_FILE keyed by subdomain & client id.
+# A cached token is reused until TOKEN_REFRESH_MARGIN seconds before its 'exp' claim,
+# so all scripts in an onboarding run share a single identity round-trip. A token
+# that an API call is refused w/ 401 is dropped from the cache right away
+# (see invalidateSessionToken()), so a revoked token is not reused until it expires.
+# The cache file is only readable by its owner and is locked while being checked/updated,
+# so concurrently running scripts do not each authenticate.
+# Returns same dictionary as authnCyberark().
+
+def authnCyberarkCached(admin_creds, http_client=None):
+    logging.debug("================ authnCyberarkCached() ================")
+
+    # -------------------------------------------
+    def tokenExpiry(token):
+        # returns 'exp' claim of JWT, or None if token cannot be decoded
+        try:
+            payload = token.split(".")[1]
+            payload += "=" * (-len(payload) % 4)
+            claims = json.loads(base64.urlsafe_b64decode(payload))
+            return int(claims["exp"])
+        except (IndexError, ValueError, KeyError, TypeError):
+            return None
+
+    # -------------------------------------------
+    def isFresh(entry):
+        return (entry is not None) and (entry["expires"] - TOKEN_REFRESH_MARGIN > time.time())
+
+    # -------------------------------------------
+    # first ensure we have required request values
+    required_keys = ["cybr_subdomain", "cybr_username", "cybr_password"]
+    for rkey in required_keys:
+        input_val = admin_creds.get(rkey, None)
+        if input_val is None:
+            err_msg = f"Admin creds is missing key required for authentication: {rkey}"
+            logging.error(err_msg)
+            return_dict = {}
+            return_dict["status_code"] = 400
+            return_dict["response_body"] = err_msg
+            return_dict["session_token"] = ""
+            return return_dict
+
+    cache_key = f"{admin_creds['cybr_subdomain']}/{admin_creds['cybr_username']}"
+
+    entry = _token_memo.get(cache_key, None)
+    if isFresh(entry):
+        logging.debug(f"\tusing in-process session token for {cache_key}")
+        return_dict = {}
+        return_dict["status_code"] = 200
+        return_dict["response_body"] = "Using cached session token."
+        return_dict["session_token"] = entry["session_token"]
+        return return_dict
+
+    with _lockTokenCache():
+        tokens = _readTokenCache()
+        entry = tokens.get(cache_key, None)
+        if isFresh(entry):
+            logging.debug(f"\tusing cached session token for {cache_key}")
+            _token_memo[cache_key] = entry
+            return_dict = {}
+            return_dict["status_code"] = 200
+            return_dict["response_body"] = "Using cached session token."
+            return_dict["session_token"] = entry["session_token"]
+            return return_dict
+
+        return_dict = authnCyberark(admin_creds, http_client)
+        if return_dict["status_code"] == 200:
+            expires = tokenExpiry(return_dict["session_token"])
+            if expires is None:
+                logging.debug("\tsession token has no readable expiry, not caching it")
+            else:
+                entry = {"session_token": return_dict["session_token"], "expires": expires}
+                _token_memo[cache_key] = entry
+                tokens[cache_key] = entry
+                try:
+                    _writeTokenCache(tokens)
+                except OSError as e:
+                    logging.error(f"Could not write token cache {TOKEN_CACHE_FILE}: {e}")
+
+    return return_dict
+
+
+# ====================================================
+# Drops session_token from the in-process copy and from TOKEN_CACHE_FILE, so the
+# next authnCyberarkCached() call authenticates again. Called by the shared HTTP
+# client for each request answered 401 (see httpClient.py).
+
+def invalidateSessionToken(session_token):
+    for cache_key, entry in list(_token_memo.items()):
+        if entry["session_token"] == session_token:
+            _token_memo.pop(cache_key, None)
+    try:
+        with _lockTokenCache():
+            tokens = _readTokenCache()
+            stale = [k for k, v in tokens.items() if v.get("session_token", None) == session_token]
+            if stale:
+                logging.info(f"Session token for {', '.join(stale)} was refused, removed from {TOKEN_CACHE_FILE}")
+                for cache_key in stale:
+                    del tokens[cache_key]
+                _writeTokenCache(tokens)
+    except OSError as e:
+        logging.error(f"Could not update token cache {TOKEN_CACHE_FILE}: {e}")
+
+
+# -------------------------------------------
+def _lockTokenCache():
+    # returns open lock file, locked exclusively until closed; creates cache directory
+    cache_dir = os.path.dirname(TOKEN_CACHE_FILE)
+    if cache_dir:             # "" for a file in the current directory
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+    lock_file = open(f"{TOKEN_CACHE_FILE}.lock", "a")
+    fcntl.flock(lock_file, fcntl.LOCK_EX)
+    return lock_file
+
+
+# -------------------------------------------
+def _readTokenCache():
+    try:
+        with open(TOKEN_CACHE_FILE) as f_in:
+            return json.load(f_in)
+    except (IOError, ValueError):
+        return {}
+
+
+# -------------------------------------------
+def _writeTokenCache(tokens):
+    # drop expired tokens, then atomically replace cache file w/ owner-only permissions
+    tokens = {k: v for k, v in tokens.items() if v["expires"] > time.time()}
+    tmp_file = f"{TOKEN_CACHE_FILE}.{os.getpid()}.tmp"
+    fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f_out:
+        json.dump(tokens, f_out)
+        f_out.flush()
+        os.fsync(f_out.fileno())
+    os.replace(tmp_file, TOKEN_CACHE_FILE)
+
+
+addUnauthorizedHandler(invalidateSessionToken)
@@ -0,0 +1,302 @@
+
+#############################################################################
+#############################################################################
+# httpClient.py
+
+import os
+import time
+import random
+import atexit
+import threading
+import logging
+import email.utils
+import requests
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from .tracing import getTracer, pathTemplate, _noop_span
+
+# ====================================================
+# Constants
+HTTP_POOL_SIZE = int(os.environ.get("CYBR_HTTP_POOL_SIZE", "10"))   # max keep-alive connections per host
+HTTP_TIMEOUT = float(os.environ.get("CYBR_HTTP_TIMEOUT", "30"))      # seconds, connect & read
+HTTP_RATE_LIMIT = float(os.environ.get("CYBR_HTTP_RATE_LIMIT", "20"))  # requests/sec per host, 0 = unlimited
+HTTP_MAX_RETRIES = int(os.environ.get("CYBR_HTTP_MAX_RETRIES", "5"))
+HTTP_BACKOFF_BASE = 0.5       # seconds, first retry delay before jitter
+HTTP_BACKOFF_MAX = 30.0       # seconds, cap on any single retry delay (incl. Retry-After)
+HTTP_THROTTLE_STATUS = [429, 503]            # server asks client to slow down
+HTTP_RETRY_STATUS = [429, 502, 503, 504]     # retried for idempotent methods
+HTTP_IDEMPOTENT_METHODS = ["GET", "HEAD", "OPTIONS", "PUT", "DELETE"]
+
+# ====================================================
+# Token bucket rate limiter: allows rate requests/sec w/ bursts of up to burst requests.
+
+class TokenBucket:
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    # -------------------------------------------
+    def acquire(self):
+        # blocks until a token is available, returns seconds waited
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+# ====================================================
+# AIMD concurrency limiter: caps requests in flight to a host. The cap grows by
+# about one request per round of successful requests (additive increase) and is
+# halved when the host throttles (multiplicative decrease), within 1..max_limit.
+
+class AimdLimiter:
+
+    def __init__(self, max_limit):
+        self.max_limit = max_limit
+        self.limit = float(max_limit)
+        self._in_flight = 0
+        self._cond = threading.Condition()
+
+    # -------------------------------------------
+    def acquire(self):
+        with self._cond:
+            while self._in_flight >= int(self.limit):
+                self._cond.wait()
+            self._in_flight += 1
+
+    # -------------------------------------------
+    def release(self, throttled):
+        with self._cond:
+            self._in_flight -= 1
+            if throttled:
+                self.limit = max(1.0, self.limit / 2)
+            else:
+                self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+# ====================================================
+# Shared HTTP client for all CyberArk API calls.
+# Keeps one keep-alive session (and connection pool) per API host, e.g.
+# <subdomain>.cyberark.cloud, <subdomain>.privilegecloud.cyberark.cloud
+# and <subdomain>.secretshub.cyberark.cloud, so consecutive calls reuse
+# TCP/TLS connections instead of paying a handshake each. If CYBR_BASE_URL
+# is set (see cybrUrl.py) all calls go to that one host.
+# Requests to each host are rate limited (TokenBucket) and their concurrency
+# is adapted to throttling (AimdLimiter). Throttled (429/503) requests, and for
+# idempotent methods also gateway errors and connection errors, are retried w/
+# exponential backoff & jitter, honoring Retry-After. POSTs are only retried
+# when the server did not accept them (429/503, connect timeout).
+# Call, retry & throttle counts and elapsed time per host are kept as metrics.
+
+class CybrHttpClient:
+
+    def __init__(self, pool_size=HTTP_POOL_SIZE, timeout=HTTP_TIMEOUT,
+                 rate_limit=HTTP_RATE_LIMIT, max_retries=HTTP_MAX_RETRIES):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.rate_limit = rate_limit
+        self.max_retries = max_retries
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    # -------------------------------------------
+    def host(self, host):
+        # returns session, limiters & stats for host, creating them on first use
+        with self._lock:
+            host_state = self._hosts.get(host, None)
+            if host_state is None:
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                host_state = {}
+                host_state["session"] = session
+                host_state["bucket"] = None
+                if self.rate_limit > 0:
+                    host_state["bucket"] = TokenBucket(self.rate_limit, max(1.0, self.rate_limit))
+                host_state["limiter"] = AimdLimiter(self.pool_size)
+                host_state["stats"] = {"calls": 0, "seconds": 0.0, "retries": 0,
+                                       "throttled": 0, "errors": 0, "rate_wait_seconds": 0.0}
+                self._hosts[host] = host_state
+            return host_state
+
+    # -------------------------------------------
+    def session(self, host):
+        return self.host(host)["session"]
+
+    # -------------------------------------------
+    def request(self, method, url, **kwargs):
+        # same signature as requests.request(), w/ default timeout, rate limiting & retries
+        # traced as one span per call, incl. retries (see traceSpans.py)
+        # 401 responses are passed on to the unauthorized handlers (see addUnauthorizedHandler())
+        tracer = getTracer()
+        if not tracer.enabled():
+            response = self.send(method, url, _noop_span, **kwargs)
+        else:
+            split_url = urlsplit(url)
+            with tracer.span(f"{method.upper()} {pathTemplate(split_url.path)}", "client",
+                             **{"http.request.method": method.upper(), "server.address": split_url.netloc,
+                                "url.template": pathTemplate(split_url.path)}) as span:
+                data = kwargs.get("data", None)
+                if isinstance(data, (str, bytes)):
+                    span.set("http.request.body.size", len(data))
+                response = self.send(method, url, span, **kwargs)
+                span.set("http.response.status_code", response.status_code)
+                span.set("http.response.body.size", len(response.content))
+                if response.status_code >= 400:
+                    span.fail()
+        if response.status_code == 401:
+            notifyUnauthorized(kwargs.get("headers", None))
+        return response
+
+    # -------------------------------------------
+    def send(self, method, url, span, **kwargs):
+        # sends request, retrying as needed, counts retries in span
+        kwargs.setdefault("timeout", self.timeout)
+        host_state = self.host(urlsplit(url).netloc)
+        stats = host_state["stats"]
+        idempotent = method.upper() in HTTP_IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            waited = 0.0
+            if host_state["bucket"] is not None:
+                waited = host_state["bucket"].acquire()
+            host_state["limiter"].acquire()
+            response = None
+            error = None
+            start = time.perf_counter()
+            try:
+                response = host_state["session"].request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            finally:
+                elapsed = time.perf_counter() - start
+                throttled = response is not None and response.status_code in HTTP_THROTTLE_STATUS
+                host_state["limiter"].release(throttled)
+                with self._lock:
+                    stats["calls"] += 1
+                    stats["seconds"] += elapsed
+                    stats["rate_wait_seconds"] += waited
+                    stats["throttled"] += int(throttled)
+                    stats["errors"] += int(error is not None)
+
+            if error is not None:
+                retryable = idempotent or isinstance(error, requests.ConnectTimeout)
+            elif idempotent:
+                retryable = response.status_code in HTTP_RETRY_STATUS
+            else:
+                retryable = throttled
+            if not retryable or attempt >= self.max_retries:
+                if error is not None:
+                    raise error
+                return response
+
+            delay = retryDelay(attempt, response)
+            attempt += 1
+            span.set("http.retries", attempt)
+            with self._lock:
+                stats["retries"] += 1
+            reason = error if error is not None else response.status_code
+            logging.info(f"Retrying {method} {urlsplit(url).path} in {delay:.2f}s ({reason}), attempt {attempt}")
+            time.sleep(delay)
+
+    # -------------------------------------------
+    def stats(self):
+        # returns copy of per-host metrics, incl. current concurrency limit
+        with self._lock:
+            stats = {}
+            for host, host_state in self._hosts.items():
+                stats[host] = dict(host_state["stats"])
+                stats[host]["concurrency_limit"] = int(host_state["limiter"].limit)
+            return stats
+
+    # -------------------------------------------
+    def close(self):
+        with self._lock:
+            for host_state in self._hosts.values():
+                host_state["session"].close()
+            self._hosts = {}
+
+
+# ====================================================
+# Returns seconds to wait before retry number attempt+1: Retry-After header of
+# response if present, else exponential backoff w/ full jitter.
+
+def retryDelay(attempt, response=None):
+    retry_after = None
+    if response is not None:
+        retry_after = response.headers.get("Retry-After", None)
+    if retry_after is not None:
+        try:
+            delay = float(retry_after)
+        except ValueError:
+            try:
+                delay = email.utils.parsedate_to_datetime(retry_after).timestamp() - time.time()
+            except (TypeError, ValueError):
+                delay = None
+        if delay is not None:
+            return min(HTTP_BACKOFF_MAX, max(0.0, delay))
+    return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * 2 ** attempt))
+
+
+_unauthorized_handlers = []
+
+# ====================================================
+# Registers handler(session_token), called w/ the bearer token of every request
+# answered 401, e.g. to drop a revoked token from a cache (see authnCyberarkCached.py).
+
+def addUnauthorizedHandler(handler):
+    if handler not in _unauthorized_handlers:
+        _unauthorized_handlers.append(handler)
+
+
+# ====================================================
+# Passes bearer token in request headers, if any, to all unauthorized handlers.
+
+def notifyUnauthorized(headers):
+    for name, value in (headers or {}).items():
+        if name.lower() == "authorization" and str(value).startswith("Bearer "):
+            session_token = str(value)[len("Bearer "):]
+            for handler in list(_unauthorized_handlers):
+                handler(session_token)
+
+
+_http_client = None
+_http_client_lock = threading.Lock()
+
+# ====================================================
+# Returns process-wide CybrHttpClient, used by all functions not given one explicitly.
+
+def getHttpClient():
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            _http_client = CybrHttpClient()
+            atexit.register(logHttpStats)
+        return _http_client
+
+
+# ====================================================
+# Logs per-host metrics of the process-wide client.
+
+def logHttpStats():
+    if _http_client is None:
+        return
+    for host, s in _http_client.stats().items():
+        avg_ms = 1000 * s["seconds"] / s["calls"] if s["calls"] else 0.0
+        logging.info(f"http {host}: {s['calls']} calls, {s['seconds']:.3f}s total, {avg_ms:.1f}ms avg, "
+                     f"{s['retries']} retries, {s['throttled']} throttled, {s['errors']} errors, "
+                     f"{s['rate_wait_seconds']:.3f}s rate limited, concurrency limit {s['concurrency_limit']}")
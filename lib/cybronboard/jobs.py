@@ -0,0 +1,378 @@
+#############################################################################
+#############################################################################
+# onboardWorkQueue.py
+
+import os
+import json
+import heapq
+import sqlite3
+import threading
+import logging
+
+# ====================================================
+# Constants
+WORK_QUEUE_SIZE = int(os.environ.get("CYBR_QUEUE_SIZE", "1000"))   # max queued items
+WORK_QUEUE_DB = os.environ.get("CYBR_QUEUE_DB", "")                 # SQLite file, "" = in memory only
+# priority lanes by request env value, highest priority first; ";" separates lanes,
+# "," values of one lane. Requests w/ other env values go in a last lane.
+WORK_QUEUE_LANES = os.environ.get("CYBR_QUEUE_LANES", "PRD,PROD,PRODUCTION")
+
+
+class QueueFull(Exception):
+    pass
+
+
+# ====================================================
+# Bounded priority queue of onboarding work items (JSON-serializable dicts
+# w/ a provisioning request under "prov_req"), taken by worker threads.
+# Items are taken lowest lane first, in submission order within a lane; the
+# lane of an item is that of its request's env value (see WORK_QUEUE_LANES).
+# Producers are pushed back when maxsize items are queued: put() raises
+# QueueFull, or w/ block=True waits for room.
+# If db_file is given, queued items are also kept in SQLite until done(), so
+# items queued or running when the process stopped are queued again by the
+# next process that opens the same db_file (see recovered()).
+# db_file holds provisioning requests, so it is created owner-only in an
+# owner-only directory, and deleted items are overwritten. Account secrets
+# (accountValues.secret) are only kept in memory: items recovered from db_file
+# lack them and are marked w/ "secret_withheld".
+
+class OnboardWorkQueue:
+
+    def __init__(self, maxsize=None, db_file=None, lanes=None):
+        self.maxsize = WORK_QUEUE_SIZE if maxsize is None else maxsize
+        self.db_file = WORK_QUEUE_DB if db_file is None else db_file
+        if lanes is None:
+            lanes = WORK_QUEUE_LANES
+        self.lanes = {}               # uppercase env value -> lane number
+        for lane, values in enumerate(lanes.split(";")):
+            for value in values.split(","):
+                if value.strip():
+                    self.lanes[value.strip().upper()] = lane
+        self.default_lane = len(lanes.split(";"))
+        self._heap = []               # (lane, seq, key, item)
+        self._seq = 0
+        self._closed = False
+        self._drain = True
+        self._recovered = []
+        self._cond = threading.Condition()
+        self._db = None
+        if self.db_file:
+            self.openDb()
+
+    # -------------------------------------------
+    def openDb(self):
+        # opens SQLite backing, re-queues items left by an earlier process
+        db_dir = os.path.dirname(self.db_file)
+        if db_dir:
+            os.makedirs(db_dir, mode=0o700, exist_ok=True)
+        # create file owner-only before SQLite does; its -wal & -shm files get the same mode
+        os.close(os.open(self.db_file, os.O_RDWR | os.O_CREAT, 0o600))
+        os.chmod(self.db_file, 0o600)
+        self._db = sqlite3.connect(self.db_file, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA secure_delete=ON")    # finished items are overwritten, not just unlinked
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS work_items "
+                         "(key TEXT PRIMARY KEY, seq INTEGER, lane INTEGER, item TEXT)")
+        rows = self._db.execute("SELECT key, seq, lane, item FROM work_items ORDER BY seq").fetchall()
+        for key, seq, lane, item in rows:
+            item = json.loads(item)
+            self._heap.append((lane, seq, key, item))
+            self._recovered.append((key, item))
+            self._seq = max(self._seq, seq + 1)
+        heapq.heapify(self._heap)
+        if rows:
+            logging.info(f"Recovered {len(rows)} queued work item(s) from {self.db_file}")
+
+    # -------------------------------------------
+    def storedItem(self, item):
+        # returns JSON of item for db_file, w/o account secret
+        prov_req = item.get("prov_req", {})
+        account_values = prov_req.get("accountValues", None)
+        if not isinstance(account_values, dict) or not any(k.lower() == "secret" for k in account_values):
+            return json.dumps(item)
+        stored = dict(item)
+        stored["prov_req"] = dict(prov_req)
+        stored["prov_req"]["accountValues"] = {k: v for k, v in account_values.items() if k.lower() != "secret"}
+        stored["secret_withheld"] = True
+        return json.dumps(stored)
+
+    # -------------------------------------------
+    def laneOf(self, item):
+        env = str(item.get("prov_req", {}).get("env", "")).upper()
+        return self.lanes.get(env, self.default_lane)
+
+    # -------------------------------------------
+    def put(self, key, item, block=False, timeout=None):
+        self.putMany([(key, item)], block, timeout)
+
+    # -------------------------------------------
+    def putMany(self, keyed_items, block=False, timeout=None):
+        # queues all (key, item) tuples or none of them, raises QueueFull if no room
+        keyed_items = list(keyed_items)
+        if len(keyed_items) > self.maxsize:
+            raise QueueFull(f"{len(keyed_items)} items exceed queue size {self.maxsize}")
+        with self._cond:
+            room = lambda: self._closed or len(self._heap) + len(keyed_items) <= self.maxsize
+            if not room():
+                if not block or not self._cond.wait_for(room, timeout):
+                    raise QueueFull(f"Queue is full ({len(self._heap)} of {self.maxsize} queued)")
+            if self._closed:
+                raise QueueFull("Queue is closed")
+            entries = []
+            for key, item in keyed_items:
+                entries.append((self.laneOf(item), self._seq, key, item))
+                self._seq += 1
+            if self._db is not None:
+                with self._db:
+                    self._db.executemany("INSERT OR REPLACE INTO work_items (key, seq, lane, item) VALUES (?, ?, ?, ?)",
+                                         [(key, seq, lane, self.storedItem(item)) for lane, seq, key, item in entries])
+            for entry in entries:
+                heapq.heappush(self._heap, entry)
+            self._cond.notify_all()
+
+    # -------------------------------------------
+    def get(self, timeout=None):
+        # returns (key, item) of next item, or None once closed (and drained) or on timeout
+        with self._cond:
+            ready = lambda: self._heap or self._closed
+            if not self._cond.wait_for(ready, timeout):
+                return None
+            if not self._heap or (self._closed and not self._drain):
+                return None
+            lane, seq, key, item = heapq.heappop(self._heap)
+            self._cond.notify_all()
+            return key, item
+
+    # -------------------------------------------
+    def done(self, key):
+        # forgets item taken w/ get() once its work is finished
+        if self._db is not None:
+            with self._cond:
+                with self._db:
+                    self._db.execute("DELETE FROM work_items WHERE key = ?", (key,))
+
+    # -------------------------------------------
+    def recovered(self):
+        # returns (key, item) tuples re-queued from db_file when the queue was opened
+        return list(self._recovered)
+
+    # -------------------------------------------
+    def sizes(self):
+        # returns number of queued items per lane
+        with self._cond:
+            sizes = {}
+            for lane, seq, key, item in self._heap:
+                sizes[lane] = sizes.get(lane, 0) + 1
+            return sizes
+
+    # -------------------------------------------
+    def qsize(self):
+        with self._cond:
+            return len(self._heap)
+
+    # -------------------------------------------
+    def close(self, drain=True):
+        # wakes all getters; w/ drain, get() still returns the items queued so far.
+        # Items not taken stay in db_file for the next process.
+        with self._cond:
+            self._closed = True
+            self._drain = drain
+            self._cond.notify_all()
+
+    # -------------------------------------------
+    def closeDb(self):
+        # closes SQLite backing, once no worker calls done() anymore
+        if self._db is not None:
+            with self._cond:
+                self._db.close()
+                self._db = None
+#############################################################################
+#############################################################################
+# onboardJobs.py
+
+import os
+import uuid
+import time
+import collections
+import threading
+import logging
+from .httpclient import getHttpClient
+from .naming import getSafeName
+from .onboarding import onboardRequest
+from .tracing import traceSpan
+
+# ====================================================
+# Constants
+JOB_WORKERS = int(os.environ.get("CYBR_JOB_WORKERS", "4"))         # requests onboarded in parallel
+JOB_HISTORY = int(os.environ.get("CYBR_JOB_HISTORY", "10000"))     # finished jobs kept for status queries
+JOB_SAFE_LOCKS = 64               # lock stripes serializing jobs for the same safe
+JOB_RESULT_KEYS = ["safe_name", "source_store_id", "target_store_id", "filter_id", "policy_id", "platform_id"]
+
+# ====================================================
+# Onboarding jobs of a long-running process (see onboardService.py).
+# Each submitted provisioning request becomes a job that worker threads run
+# w/ onboardRequest(), sharing authentication, HTTP connections, platforms
+# and naming rules. Jobs wait in a bounded priority queue (see
+# onboardWorkQueue.py); submit() raises QueueFull when it is full. If the
+# queue is durable, jobs left queued or running by an earlier process are
+# queued again (re-running a step that already completed is harmless: safes,
+# members, accounts, filters & policies that exist are reused). Account secrets
+# are not kept in the queue database, so recovered jobs that had one fail and
+# must be submitted again.
+# Jobs for the same safe run one at a time, so a safe is created and
+# populated before its accounts are added. Finished jobs are kept for status
+# queries, up to JOB_HISTORY, oldest dropped first.
+# Job status: queued -> running -> succeeded | failed
+
+class OnboardJobManager:
+
+    def __init__(self, admin_creds=None, workers=None, http_client=None, work_queue=None):
+        self.admin_creds = admin_creds
+        self.workers = JOB_WORKERS if workers is None else workers
+        self.http_client = getHttpClient() if http_client is None else http_client
+        self.work_queue = OnboardWorkQueue() if work_queue is None else work_queue
+        self._jobs = {}               # job_id -> job dictionary, in submission order
+        self._finished = collections.deque()   # job_ids of finished jobs, oldest first
+        for job_id, item in self.work_queue.recovered():
+            self._jobs[job_id] = self.newJob(job_id, item)
+        self._safe_locks = [threading.Lock() for _ in range(JOB_SAFE_LOCKS)]
+        self._lock = threading.Lock()
+        self._threads = []
+
+    # -------------------------------------------
+    def start(self):
+        for idx in range(max(1, self.workers)):
+            thread = threading.Thread(target=self.work, name=f"onboard-job-{idx}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    # -------------------------------------------
+    def stop(self, drain=True):
+        # w/ drain, runs jobs already queued before workers stop; else
+        # running jobs finish and queued jobs stay in a durable queue
+        self.work_queue.close(drain)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self.work_queue.closeDb()
+
+    # -------------------------------------------
+    def newJob(self, job_id, item):
+        job = {}
+        job["job_id"] = job_id
+        job["request_id"] = item.get("request_id", None)
+        job["status"] = "queued"
+        job["submitted"] = item.get("submitted", time.time())
+        job["started"] = None
+        job["finished"] = None
+        job["result"] = None
+        return job
+
+    # -------------------------------------------
+    def submit(self, prov_req, request_id=None, block=False, timeout=None):
+        # queues provisioning request, returns copy of its job dictionary
+        return self.submitMany([(request_id, prov_req)], block, timeout)[0]
+
+    # -------------------------------------------
+    def submitMany(self, prov_reqs, block=False, timeout=None):
+        # queues (request_id, prov_req) tuples, all or none, returns copies of their job dictionaries.
+        # Raises QueueFull if the queue has no room (w/ block, after waiting up to timeout seconds).
+        keyed_items = []
+        for request_id, prov_req in prov_reqs:
+            item = {"request_id": request_id, "submitted": time.time(), "prov_req": prov_req}
+            keyed_items.append((uuid.uuid4().hex, item))
+        jobs = [self.newJob(job_id, item) for job_id, item in keyed_items]
+        with self._lock:
+            for job in jobs:
+                self._jobs[job["job_id"]] = job
+        try:
+            self.work_queue.putMany(keyed_items, block, timeout)
+        except QueueFull:
+            with self._lock:
+                for job in jobs:
+                    self._jobs.pop(job["job_id"], None)
+            raise
+        return [dict(job) for job in jobs]
+
+    # -------------------------------------------
+    def get(self, job_id):
+        # returns copy of job dictionary, or None if unknown
+        with self._lock:
+            job = self._jobs.get(job_id, None)
+            return None if job is None else dict(job)
+
+    # -------------------------------------------
+    def jobs(self, status=None):
+        # returns copies of job dictionaries w/o results, optionally only those w/ status
+        with self._lock:
+            return [{k: v for k, v in job.items() if k != "result"}
+                    for job in self._jobs.values() if status is None or job["status"] == status]
+
+    # -------------------------------------------
+    def counts(self):
+        # returns number of jobs per status, and of queued jobs per priority lane
+        counts = {"queued": 0, "running": 0, "succeeded": 0, "failed": 0}
+        with self._lock:
+            for job in self._jobs.values():
+                counts[job["status"]] += 1
+        counts["lanes"] = self.work_queue.sizes()
+        counts["capacity"] = self.work_queue.maxsize
+        return counts
+
+    # -------------------------------------------
+    def work(self):
+        while True:
+            taken = self.work_queue.get()
+            if taken is None:
+                return
+            job_id, item = taken
+            with self._lock:
+                job = self._jobs.get(job_id, None)
+                if job is None:        # dropped from history while queued, should not happen
+                    job = self._jobs[job_id] = self.newJob(job_id, item)
+            try:
+                if item.get("secret_withheld", False):
+                    self.finish(job, {"status_code": 400, "steps": [],
+                                      "response_body": "Account secret is not kept across restarts, submit request again."})
+                else:
+                    self.run(job, item["prov_req"])
+            except Exception as e:    # never lose a worker
+                logging.exception(f"Job {job_id} failed")
+                self.finish(job, {"status_code": 500, "response_body": f"{type(e).__name__}: {e}", "steps": []})
+            self.work_queue.done(job_id)
+
+    # -------------------------------------------
+    def run(self, job, prov_req):
+        with self._lock:
+            job["status"] = "running"
+            job["started"] = time.time()
+        name_dict = getSafeName(prov_req)
+        if name_dict["status_code"] != 200:
+            resp_dict = {}
+            resp_dict["status_code"] = name_dict["status_code"]
+            resp_dict["response_body"] = f"Step safe_name failed: {name_dict['response_body']}"
+            resp_dict["steps"] = []
+            self.finish(job, resp_dict)
+            return
+        with self._safe_locks[hash(name_dict["safe_name"]) % JOB_SAFE_LOCKS]:
+            with traceSpan("onboardJob", job_id=job["job_id"], request_id=job["request_id"] or ""):
+                resp_dict = onboardRequest(prov_req, self.admin_creds, self.http_client)
+        for key in JOB_RESULT_KEYS:
+            if key in prov_req:
+                resp_dict[key] = prov_req[key]
+        self.finish(job, resp_dict)
+
+    # -------------------------------------------
+    def finish(self, job, resp_dict):
+        result = {k: v for k, v in resp_dict.items() if k != "outputs"}
+        with self._lock:
+            job["status"] = "succeeded" if resp_dict["status_code"] == 200 else "failed"
+            job["finished"] = time.time()
+            job["result"] = result
+            self._finished.append(job["job_id"])
+            while len(self._finished) > JOB_HISTORY:
+                self._jobs.pop(self._finished.popleft(), None)
+        log = logging.info if job["status"] == "succeeded" else logging.error
+        log(f"Job {job['job_id']} ({job['request_id']}): {resp_dict['response_body']}")
@@ -0,0 +1,197 @@
+
+#############################################################################
+#############################################################################
+# getSafeName.py
+
+import os
+import json
+import logging
+from .artifacts import loadArtifact, writeArtifact
+
+# ====================================================
+# Constants
+SAFE_NAME_RULES_FILE = "./json/safenamerules.json"  # path is relative to script calling getSafeName()
+
+# Safe naming rules compiled by compileSafeNameRules(), keyed by rules file
+_safe_name_programs = {}
+
+# Generates safe name base on provisioning record values and rules
+#  defined in SAFE_NAME_RULES_FILE. Rules are compiled once per process
+#  (and again if the rules file changes), see compileSafeNameRules().
+
+def getSafeName(prov_req):
+    logging.debug("================ getSafeName() ================")
+
+    try:
+        program = loadSafeNameProgram()
+    except (IOError, ValueError):
+        err_msg = f"Could not read file: {SAFE_NAME_RULES_FILE}"
+        logging.error(err_msg)
+        return_dict = {}
+        return_dict["status_code"] = 500
+        return_dict["response_body"] = err_msg
+        return_dict["safe_name"] = ""
+        return return_dict
+
+    return_dict = applySafeNameRules(program, prov_req)
+    logging.debug(f"\tstatus_code: {return_dict['status_code']}\n\tresponse: {return_dict['response_body']}")
+    return return_dict
+
+
+# ====================================================
+# Generates safe names for a list of provisioning requests in one pass.
+# Returns list of getSafeName() response dictionaries, in request order.
+
+def getSafeNames(prov_reqs):
+    logging.debug("================ getSafeNames() ================")
+
+    try:
+        program = loadSafeNameProgram()
+    except (IOError, ValueError):
+        err_msg = f"Could not read file: {SAFE_NAME_RULES_FILE}"
+        logging.error(err_msg)
+        return_dict = {}
+        return_dict["status_code"] = 500
+        return_dict["response_body"] = err_msg
+        return_dict["safe_name"] = ""
+        return [dict(return_dict) for prov_req in prov_reqs]
+
+    return [applySafeNameRules(program, prov_req) for prov_req in prov_reqs]
+
+
+# ====================================================
+# Returns compiled rules for SAFE_NAME_RULES_FILE, recompiling them if the file changed.
+# Raises IOError/ValueError if the rules file cannot be read.
+
+def loadSafeNameProgram():
+    mtime = os.stat(SAFE_NAME_RULES_FILE).st_mtime_ns
+    cached = _safe_name_programs.get(SAFE_NAME_RULES_FILE, None)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    # tables of a valid precompiled artifact (see compiledArtifact.py) spare parsing the JSON
+    tables = loadArtifact(SAFE_NAME_RULES_FILE, "safenamerules")
+    if tables is None:
+        with open(SAFE_NAME_RULES_FILE) as sr:
+            tables = compileSafeNameTables(json.load(sr))
+    program = buildSafeNameProgram(tables)
+    _safe_name_programs[SAFE_NAME_RULES_FILE] = (mtime, program)
+    return program
+
+
+# ====================================================
+# Writes precompiled artifact of rules_file (see compiledArtifact.py).
+# Returns path of artifact. Raises IOError/ValueError if rules_file cannot be read.
+
+def compileSafeNameArtifact(rules_file=None):
+    if rules_file is None:
+        rules_file = SAFE_NAME_RULES_FILE
+    with open(rules_file, "rb") as f_in:
+        source_bytes = f_in.read()
+    return writeArtifact(rules_file, "safenamerules", compileSafeNameTables(json.loads(source_bytes)), source_bytes)
+
+
+# ====================================================
+# Compiles safe naming rules into a list of (keyname, mapper) tuples.
+# Each mapper takes a request value and returns its uppercase safe name part,
+# or None if the value has no mapping:
+#   valuemap  - dictionary lookup of uppercased value (first listed input wins)
+#   literal   - the value itself
+#   substring - characters start to end of the value
+
+def compileSafeNameRules(saferules):
+    return buildSafeNameProgram(compileSafeNameTables(saferules))
+
+
+# ====================================================
+# Compiles safe naming rules into a list of (keyname, maptype, arg) tuples, w/
+# plain data only so they can be saved in an artifact. arg is the valuemap
+# lookup table, (start, end) of a substring, or None.
+
+def compileSafeNameTables(saferules):
+    tables = []
+    for rule in saferules:
+        match rule["maptype"]:
+            case "valuemap":
+                table = {}
+                for vmap in rule["valuemap"]:
+                    for v in vmap["inputs"]:
+                        table.setdefault(v.upper(), vmap["output"].upper())
+                tables.append((rule["keyname"], "valuemap", table))
+            case "substring":
+                tables.append((rule["keyname"], "substring", (rule["substring"]["start"], rule["substring"]["end"])))
+            case maptype:
+                tables.append((rule["keyname"], maptype, None))
+    return tables
+
+
+# ====================================================
+# Turns tables of compileSafeNameTables() into a list of (keyname, mapper) tuples.
+
+def buildSafeNameProgram(tables):
+
+    # -------------------------------------------
+    def valueMapper(table):
+        return lambda keyval: table.get(str(keyval).upper(), None)
+
+    # -------------------------------------------
+    def substringMapper(start, end):
+        def mapper(keyval):
+            keyval = str(keyval)
+            beg = start
+            if beg > len(keyval):
+                beg = 0             # dubious error correction
+            return keyval[beg:min(end, len(keyval))].upper()
+        return mapper
+
+    # -------------------------------------------
+    program = []
+    for keyname, maptype, arg in tables:
+        match maptype:
+            case "valuemap":
+                mapper = valueMapper(arg)
+            case "literal":
+                mapper = lambda keyval: str(keyval).upper()
+            case "substring":
+                mapper = substringMapper(*arg)
+            case _:
+                logging.error(f"Invalid maptype: {maptype}")
+                mapper = lambda keyval: None
+        program.append((keyname, mapper))
+    return program
+
+
+# ====================================================
+# Applies compiled safe naming rules to a provisioning request.
+# Returns getSafeName() response dictionary.
+
+def applySafeNameRules(program, prov_req):
+    status_code = 200
+    response_body = "Safe name generated."
+    safe_name = ""
+
+    # first ensure we have request values required for rules
+    for keyname, mapper in program:
+        if prov_req.get(keyname, None) is None:
+            status_code = 400
+            response_body = f"Missing key required for safe naming: {keyname}"
+            logging.error(response_body)
+
+    if status_code == 200:
+        name_parts = []
+        for keyname, mapper in program:
+            keyval = prov_req[keyname]
+            outval = mapper(keyval)
+            if outval is None:
+                status_code = 400
+                response_body = f"No safename mapping rule found for {keyval}"
+                logging.error(response_body)
+                break
+            name_parts.append(outval)
+        else:
+            safe_name = "-".join(name_parts)
+
+    return_dict = {}
+    return_dict["status_code"] = status_code
+    return_dict["response_body"] = response_body
+    return_dict["safe_name"] = safe_name
+    return return_dict
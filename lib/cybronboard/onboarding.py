@@ -0,0 +1,403 @@
+#############################################################################
+#############################################################################
+# onboardJournal.py
+
+import os
+import json
+import time
+import hashlib
+import threading
+import logging
+
+# ====================================================
+# Append-only journal of completed onboarding steps, so a batch that stopped
+# part way resumes where it left off. Each line of the journal file is a JSON
+# record w/ request_key, request_id, step and the request values the step
+# produced (safe_name, source_store_id, target_store_id, filter_id, policy_id,
+# platform_id; safe_members also the members it added). Records are fsync'ed as
+# they are written. Session tokens and other request values are never journaled.
+
+class OnboardJournal:
+
+    def __init__(self, journal_file):
+        self.journal_file = journal_file
+        self._completed = {}
+        self._lock = threading.Lock()
+        if os.path.exists(journal_file):
+            with open(journal_file, "rb") as f_in:
+                data = f_in.read()
+            complete = data.rfind(b"\n") + 1
+            for line in data[:complete].splitlines():
+                self.load(line)
+            # a crash while writing leaves a partial last line; unless it is a whole
+            # record missing its newline, it is cut off so the next record starts clean
+            if complete < len(data):
+                if self.load(data[complete:]):
+                    with open(journal_file, "ab") as f_out:
+                        f_out.write(b"\n")
+                else:
+                    os.truncate(journal_file, complete)
+        self._f_out = open(journal_file, "a")
+
+    # -------------------------------------------
+    def load(self, line):
+        # adds record in journal line to completed steps, returns False if line is no record
+        try:
+            record = json.loads(line)
+            self._completed.setdefault(record["request_key"], {})[record["step"]] = record["outputs"]
+            return True
+        except (ValueError, TypeError, KeyError):
+            logging.error(f"Skipping incomplete journal record in {self.journal_file}")
+            return False
+
+    # -------------------------------------------
+    def completed(self, request_key):
+        # returns {step: outputs} of steps completed for request
+        with self._lock:
+            return dict(self._completed.get(request_key, {}))
+
+    # -------------------------------------------
+    def record(self, request_key, request_id, step, outputs):
+        record = {
+            "time": time.time(),
+            "request_key": request_key,
+            "request_id": request_id,
+            "step": step,
+            "outputs": outputs,
+        }
+        with self._lock:
+            self._completed.setdefault(request_key, {})[step] = outputs
+            self._f_out.write(json.dumps(record) + "\n")
+            self._f_out.flush()
+            os.fsync(self._f_out.fileno())
+
+    # -------------------------------------------
+    def close(self):
+        with self._lock:
+            self._f_out.close()
+
+
+# ====================================================
+# Returns journal key of a provisioning request: hash of its original contents,
+# so a request keeps its key across runs regardless of where it was read from.
+# Must be computed before the request is augmented by the workflow.
+
+def journalKey(prov_req):
+    return hashlib.sha256(json.dumps(prov_req, sort_keys=True, default=str).encode()).hexdigest()
+#############################################################################
+#############################################################################
+# onboardRequest.py
+
+import time
+import logging
+import functools
+from .accounts import createAccount
+from .auth import authnCyberarkCached, getAuthnCreds
+from .httpclient import getHttpClient
+from .naming import getSafeName
+from .platforms import getPlatformId, validateRequestWithPlatform
+from .safes import addSafeMembers, createSafe
+from .secretshub import getSHFilterForSafe, getSHSourceStoreId, getSHSyncPolicy, getSHTargetStoreId
+from .tracing import getTracer, traceSpan
+from .workflow import runWorkflow
+
+# ====================================================
+# Runs the complete onboarding workflow for one provisioning request in-process:
+#   safe name -> authenticate -> safe -> safe members
+#   -> Secrets Hub source/target stores, filter, sync policy (if cloudAccount & cloudRegion in request)
+#   -> platform, validation, account (if accountValues in request)
+# Authentication, HTTP connections, platforms and naming rules are shared by all
+# requests onboarded by the same process. admin_creds default to getAuthnCreds().
+# completed optionally maps names of steps that need not run again to the request
+# values they produced (see 'outputs' below); those values are added to the request
+# and the steps are reported as skipped.
+# on_step(step, outputs), if given, is called after each step that ran successfully,
+# e.g. to journal it (see onboardJournal.py).
+# The request and each step that runs are traced as spans (see traceSpans.py).
+# The provisioning request is augmented w/ the values produced by each step.
+# Returns status_code == 200 if all steps succeeded (else status_code of the failed step),
+# response_body w/ message, steps w/ step, status_code, response_body, seconds & skipped
+# of each step, and outputs w/ the request values produced by each step that ran.
+
+def onboardRequest(prov_req, admin_creds=None, http_client=None, completed=None, on_step=None):
+    with traceSpan("onboardRequest") as request_span:
+        return runWorkflow(onboardWorkflow(request_span, prov_req, admin_creds, http_client, completed, on_step))
+
+
+# ====================================================
+# onboardRequest() as a workflow generator (see runWorkflow.py): yields each
+# blocking step, i.e. each library call and on_step call, as a function w/o
+# arguments that may run on any thread. Step spans are children of request_span.
+# Returns onboardRequest()'s dictionary.
+
+def onboardWorkflow(request_span, prov_req, admin_creds=None, http_client=None, completed=None, on_step=None):
+    logging.debug("================ onboardRequest() ================")
+    if http_client is None:
+        http_client = getHttpClient()
+    if completed is None:
+        completed = {}
+
+    steps = []
+    outputs = {}
+
+    # -------------------------------------------
+    def recordStep(step, status_code, response_body, seconds, skipped=False):
+        step_result = {}
+        step_result["step"] = step
+        step_result["status_code"] = status_code
+        step_result["response_body"] = response_body
+        step_result["seconds"] = round(seconds, 6)
+        step_result["skipped"] = skipped
+        steps.append(step_result)
+
+    # -------------------------------------------
+    # returns function that runs step func(*args), traced & recorded, returns its response dict
+    def stepCall(step, expected, func, *args):
+        def call():
+            with getTracer().attach(request_span), traceSpan(f"step {step}", step=step) as span:
+                start = time.perf_counter()
+                resp_dict = func(*args)
+                recordStep(step, resp_dict["status_code"], resp_dict["response_body"], time.perf_counter() - start)
+                span.set("status_code", resp_dict["status_code"])
+                if resp_dict["status_code"] not in expected:
+                    span.fail(str(resp_dict["response_body"]))
+            return resp_dict
+        return call
+
+    # -------------------------------------------
+    # runs one workflow step unless already completed, adds values it produced to request,
+    # produces maps keys of step's response dict to request keys.
+    # returns False if step failed
+    def runStep(step, expected, produces, func, *args):
+        if step in completed:
+            prov_req.update(completed[step])
+            recordStep(step, 200, "Step already completed.", 0.0, skipped=True)
+            return True
+        resp_dict = yield stepCall(step, expected, func, *args)
+        if resp_dict["status_code"] not in expected:
+            logging.error(f"{step}: {resp_dict['response_body']}")
+            return False
+        outputs[step] = {req_key: resp_dict[resp_key] for resp_key, req_key in produces.items()}
+        prov_req.update(outputs[step])
+        if on_step is not None:
+            yield functools.partial(on_step, step, outputs[step])
+        return True
+
+    # -------------------------------------------
+    def workflow():
+        if not (yield from runStep("safe_name", [200], {"safe_name": "safe_name"}, getSafeName, prov_req)):
+            return False
+
+        # session tokens are never recorded as step outputs
+        creds = admin_creds
+        if creds is None:
+            resp_dict = yield stepCall("authn_creds", [200], getAuthnCreds)
+            if resp_dict["status_code"] != 200:
+                return False
+            creds = resp_dict["admin_creds"]
+        resp_dict = yield stepCall("authenticate", [200], authnCyberarkCached, creds, http_client)
+        if resp_dict["status_code"] != 200:
+            return False
+        prov_req["session_token"] = resp_dict["session_token"]
+        prov_req["cybr_subdomain"] = creds["cybr_subdomain"]
+
+        if not (yield from runStep("safe", [201,409], {}, createSafe, prov_req, http_client)):
+            return False
+        if not (yield from runStep("safe_members", [201,409], {}, addSafeMembers, prov_req, http_client)):
+            return False
+
+        if prov_req.get("cloudAccount", None) is not None and prov_req.get("cloudRegion", None) is not None:
+            if not (yield from runStep("source_store", [200], {"store_id": "source_store_id"},
+                                       getSHSourceStoreId, prov_req, http_client)):
+                return False
+            if not (yield from runStep("target_store", [200], {"store_id": "target_store_id"},
+                                       getSHTargetStoreId, prov_req, http_client)):
+                return False
+            if not (yield from runStep("filter", [200,201], {"filter_id": "filter_id"},
+                                       getSHFilterForSafe, prov_req, http_client)):
+                return False
+            if not (yield from runStep("sync_policy", [200,201], {"policy_id": "policy_id"},
+                                       getSHSyncPolicy, prov_req, http_client)):
+                return False
+
+        if prov_req.get("accountValues", None) is not None:
+            if not (yield from runStep("platform", [200], {"platform_id": "platform_id"}, getPlatformId, prov_req)):
+                return False
+            if not (yield from runStep("validate", [200], {}, validateRequestWithPlatform, prov_req)):
+                return False
+            if not (yield from runStep("account", [201,409], {}, createAccount, prov_req, http_client)):
+                return False
+
+        return True
+
+    # MAIN ====================================================
+    try:
+        succeeded = yield from workflow()
+    except Exception as e:      # e.g. connection errors, unexpected API responses
+        logging.exception("Onboarding workflow failed")
+        recordStep("exception", 500, f"{type(e).__name__}: {e}", 0.0)
+        succeeded = False
+    request_span.set("safe_name", prov_req.get("safe_name", ""))
+    request_span.set("status_code", 200 if succeeded else steps[-1]["status_code"])
+    if not succeeded:
+        request_span.fail(f"step {steps[-1]['step']} failed")
+
+    if succeeded:
+        status_code = 200
+        response_body = f"Request onboarded to safe {prov_req['safe_name']}."
+    else:
+        status_code = steps[-1]["status_code"]
+        response_body = f"Step {steps[-1]['step']} failed: {steps[-1]['response_body']}"
+
+    logging.debug(f"\tstatus_code: {status_code}\n\tresponse: {response_body}")
+
+    return_dict = {}
+    return_dict["status_code"] = status_code
+    return_dict["response_body"] = response_body
+    return_dict["steps"] = steps
+    return_dict["outputs"] = outputs
+    return return_dict
+#############################################################################
+#############################################################################
+# onboardBatch.py
+
+import os
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from .httpclient import getHttpClient
+from .naming import getSafeNames
+from .tracing import traceSpan
+
+# ====================================================
+# Constants
+BATCH_WORKERS = int(os.environ.get("CYBR_BATCH_WORKERS", "4"))   # safes onboarded in parallel
+SAFE_STEPS = ["safe", "safe_members"]                          # done once per safe
+SH_STEPS = ["source_store", "target_store", "filter", "sync_policy"]  # once per safe & cloud target
+MEMBER_KEYS = ["safeAdmins", "safeFullUsers", "syncMembers"]
+
+# ====================================================
+# Onboards a batch of (request_id, prov_req) tuples w/ onboardRequest().
+# Requests are partitioned by the safe name getSafeName() generates for them.
+# Partitions run concurrently on max_workers threads; the requests of one
+# partition run one after another, in batch order, so each safe is created and
+# populated before its accounts are added.
+# Within a partition, safe & member steps run only for the first request, whose
+# member lists are extended w/ the members of all other requests for that safe,
+# and Secrets Hub steps run only once per cloudAccount/cloudRegion.
+# result_callback(request_id, prov_req, resp_dict), if given, is called from the
+# worker threads as each request completes.
+# If journal (an OnboardJournal) is given, every completed step is journaled and
+# steps journaled by an earlier run are skipped, w/ the values they produced.
+# safe_members is journaled w/ the members it added and only skipped if those
+# cover the partition's merged members, so members of requests added to the
+# batch since are still provisioned.
+# Returns list of (request_id, resp_dict) tuples in batch order.
+
+def onboardBatch(prov_reqs, admin_creds=None, max_workers=None, http_client=None, result_callback=None,
+                 journal=None):
+    logging.debug("================ onboardBatch() ================")
+    if http_client is None:
+        http_client = getHttpClient()
+    if max_workers is None:
+        max_workers = BATCH_WORKERS
+
+    results = {}
+    results_lock = threading.Lock()
+
+    # -------------------------------------------
+    def finishRequest(idx, request_id, prov_req, resp_dict):
+        with results_lock:
+            results[idx] = (request_id, resp_dict)
+        if result_callback is not None:
+            result_callback(request_id, prov_req, resp_dict)
+
+    # -------------------------------------------
+    # merges member lists of all requests in partition into its first request,
+    # returns merged lists, {member key: members}
+    def mergeMembers(partition):
+        first_req = partition[0][2]
+        merged = {}
+        for mkey in MEMBER_KEYS:
+            members = []
+            for idx, request_id, prov_req in partition:
+                for mbr in prov_req.get(mkey, None) or []:
+                    if mbr not in members:
+                        members.append(mbr)
+            if len(members) > 0:
+                first_req[mkey] = members
+            merged[mkey] = members
+        return merged
+
+    # -------------------------------------------
+    # returns steps journaled for request, w/o safe_members unless the members
+    # it added cover merged members
+    def journaledSteps(idx, merged):
+        steps = journal.completed(request_keys[idx])
+        if "safe_members" in steps:
+            added = steps["safe_members"].get("members", {})
+            if all(mbr in added.get(mkey, []) for mkey, members in merged.items() for mbr in members):
+                steps["safe_members"] = {}
+            else:
+                del steps["safe_members"]
+        return steps
+
+    # -------------------------------------------
+    def journalStep(idx, request_id, prov_req, step, outputs):
+        if step == "safe_members":
+            outputs = dict(outputs, members={mkey: prov_req.get(mkey, None) or [] for mkey in MEMBER_KEYS})
+        journal.record(request_keys[idx], request_id, step, outputs)
+
+    # -------------------------------------------
+    # onboards requests of one partition (same safe) in order
+    def runPartition(partition):
+        merged = mergeMembers(partition)
+        completed = {}
+        sh_completed = {}   # (cloudAccount, cloudRegion) -> completed SH steps
+        for idx, request_id, prov_req in partition:
+            cloud = (str(prov_req.get("cloudAccount", None)), prov_req.get("cloudRegion", None))
+            req_completed = dict(completed)
+            req_completed.update(sh_completed.get(cloud, {}))
+            on_step = None
+            if journal is not None:
+                req_completed.update(journaledSteps(idx, merged))
+                on_step = lambda step, outputs, idx=idx, request_id=request_id, prov_req=prov_req: \
+                    journalStep(idx, request_id, prov_req, step, outputs)
+            with traceSpan("onboardBatch request", request_id=request_id):
+                resp_dict = onboardRequest(prov_req, admin_creds, http_client, req_completed, on_step)
+            # outputs only has steps that succeeded, even if a later step failed
+            done = dict(req_completed)
+            done.update(resp_dict["outputs"])
+            for step in SAFE_STEPS:
+                if step in done:
+                    completed[step] = done[step]
+            for step in SH_STEPS:
+                if step in done:
+                    sh_completed.setdefault(cloud, {})[step] = done[step]
+            finishRequest(idx, request_id, prov_req, resp_dict)
+
+    # MAIN ====================================================
+    prov_reqs = list(prov_reqs)
+    # journal keys are computed before requests are augmented or their members merged
+    request_keys = [journalKey(prov_req) for request_id, prov_req in prov_reqs]
+    name_dicts = getSafeNames([prov_req for request_id, prov_req in prov_reqs])
+
+    # partition requests by safe name, requests that cannot be named fail right away
+    partitions = {}
+    for idx, ((request_id, prov_req), name_dict) in enumerate(zip(prov_reqs, name_dicts)):
+        if name_dict["status_code"] != 200:
+            resp_dict = {}
+            resp_dict["status_code"] = name_dict["status_code"]
+            resp_dict["response_body"] = f"Step safe_name failed: {name_dict['response_body']}"
+            resp_dict["steps"] = []
+            resp_dict["outputs"] = {}
+            finishRequest(idx, request_id, prov_req, resp_dict)
+        else:
+            partitions.setdefault(name_dict["safe_name"], []).append((idx, request_id, prov_req))
+
+    logging.info(f"Onboarding {len(prov_reqs)} request(s) for {len(partitions)} safe(s) w/ {max_workers} worker(s)")
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        for future in [pool.submit(runPartition, p) for p in partitions.values()]:
+            future.result()
+
+    return [results[idx] for idx in range(len(prov_reqs))]
@@ -0,0 +1,300 @@
+#############################################################################
+#############################################################################
+# getPlatformId.py
+
+import json
+import logging
+
+# ====================================================
+# Constants
+PLATFORM_FILE = "./json/platforms.json"  # file with platform mapping k/v pairs
+# PLATFORM_FILE is loaded by the registry in platformRegistry.py
+
+# ====================================================
+# Compiles platforms dictionary into a searchpair index.
+# Platforms are grouped by the sorted tuple of their searchpair keys (signature),
+# then keyed by the tuple of their uppercased searchpair values, so matching a
+# request costs one dictionary lookup per signature instead of a scan of every
+# platform's searchpairs. Signatures are ordered most specific (most keys) first.
+# Platforms without searchpairs never match a request and are not indexed.
+
+def compilePlatformIndex(platforms):
+    index = {}
+    for pid, plat in platforms.items():
+        search_pairs = plat["searchpairs"]
+        if len(search_pairs) == 0:
+            continue
+        keys = tuple(sorted(search_pairs.keys()))
+        values = tuple(str(search_pairs[k]).upper() for k in keys)
+        index.setdefault(keys, {}).setdefault(values, []).append(pid)
+    return sorted(index.items(), key=lambda sig: (-len(sig[0]), sig[0]))
+
+
+# ====================================================
+# Finds platform where platform's searchpair values all match the provisioning request's.
+# If platforms w/ different numbers of searchpairs match, the one w/ the most searchpairs wins.
+# If found, returns status_code == 200 and platform id in response.
+# If more than one equally specific platform matches, returns status_code == 300.
+
+
+def getPlatformId(prov_req):
+    logging.debug("================ getPlatformId() ================")
+
+    # first ensure we have required request values
+    required_keys = ["cybr_subdomain", "session_token", "safe_name"]
+    for rkey in required_keys:
+        input_val = prov_req.get(rkey, None)
+        if input_val is None:
+            response_body = f"Request is missing key required for platform identification: {rkey}"
+            logging.error(response_body)
+            return_dict = {}
+            return_dict["status_code"] = 400
+            return_dict["response_body"] = response_body
+
+    # get searchpair index from platform registry, loaded from PLATFORM_FILE once per process
+    try:
+        platform_index = getPlatformRegistry().index()
+    except (IOError, ValueError):
+        response_body = f"Could not read file: {PLATFORM_FILE}"
+        logging.error(response_body)
+        return_dict = {}
+        return_dict["status_code"] = 500
+        return_dict["response_body"] = response_body
+        return return_dict
+
+    status_code = 200
+    response_body = "Platform found."
+
+    # Find platforms where platform search keys & values == request keys & values,
+    # one dictionary lookup per searchpair key signature, most specific signature first
+    plat_ids = []
+    match_len = 0
+    for keys, values_index in platform_index:
+        if len(keys) < match_len:  # less specific than a match already found
+            break
+        rvals = [prov_req.get(pkey, None) for pkey in keys]
+        if None in rvals:
+            continue
+        pids = values_index.get(tuple(str(rval).upper() for rval in rvals), [])
+        logging.debug(f"\tsearchpair keys: {keys}, matching platforms: {pids}")
+        if pids:
+            plat_ids += pids
+            match_len = len(keys)
+
+    if len(plat_ids) == 1:
+        plat_id = plat_ids[0]
+        response_body = f"Matching platform ID: {plat_id}"
+    elif len(plat_ids) > 1:
+        response_body = f"More than one platform has searchpairs that match request values: {plat_ids}"
+        logging.error(response_body)
+        status_code = 300
+        plat_id = "Ambiguous"
+    else:
+        response_body = "No platform found with searchpairs that match request values."
+        logging.error(response_body)
+        status_code = 404
+        plat_id = "NotFound"
+
+    logging.debug(f"\tstatus_code: {status_code}\n\tresponse: {response_body}")
+
+    return_dict = {}
+    return_dict["status_code"] = status_code
+    return_dict["response_body"] = response_body
+    return_dict["platform_id"] = plat_id
+    return return_dict
+
+#############################################################################
+#############################################################################
+# platformRegistry.py
+
+import os
+import json
+import threading
+import logging
+from .artifacts import loadArtifact, writeArtifact
+
+# ====================================================
+# In-process registry of platforms compiled with compileplats.py.
+# The platform file is parsed once and re-parsed only when its mtime changes,
+# so getPlatformId(), validateRequestWithPlatform() and createAccount() share
+# one copy of it. Each platform's 'required' and 'allkeys' lists are kept as
+# frozensets for set-based validation, and the searchpair index used by
+# getPlatformId() is rebuilt together with the platforms.
+# If a valid precompiled artifact of the platform file exists (see
+# compiledArtifact.py), platforms & index are loaded from it instead.
+
+class PlatformRegistry:
+
+    def __init__(self, platform_file):
+        self.platform_file = platform_file
+        self._mtime = None
+        self._platforms = {}
+        self._index = []
+        self._lock = threading.Lock()
+
+    # -------------------------------------------
+    def refresh(self):
+        # (re)loads platform file if it changed since last load, raises OSError if unreadable
+        mtime = os.stat(self.platform_file).st_mtime_ns
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            compiled = loadArtifact(self.platform_file, "platforms")
+            if compiled is None:
+                with open(self.platform_file) as f_in:
+                    compiled = compilePlatforms(json.load(f_in))
+            self._index = compiled["index"]
+            self._platforms = compiled["platforms"]
+            self._mtime = mtime
+            logging.debug(f"Loaded {len(self._platforms)} platforms from {self.platform_file}")
+
+    # -------------------------------------------
+    def platforms(self):
+        self.refresh()
+        return self._platforms
+
+    # -------------------------------------------
+    def get(self, platform_id):
+        # returns platform dictionary, or None if platform_id is unknown
+        return self.platforms().get(platform_id, None)
+
+    # -------------------------------------------
+    def index(self):
+        # returns searchpair index built by compilePlatformIndex()
+        self.refresh()
+        return self._index
+
+
+# ====================================================
+# Compiles platforms dictionary (as in the platform file) for the registry.
+# Returns dictionary w/ platforms, w/ frozenset 'required' & 'allkeys', and index.
+# Equal strings & frozensets are shared by all platforms, which saves memory and
+# makes an artifact of thousands of platforms several times smaller & faster to load.
+
+def compilePlatforms(raw_platforms):
+    shared = {}
+    def share(value):
+        return shared.setdefault(value, value) if isinstance(value, (str, frozenset)) else value
+
+    platforms = {}
+    for pid, plat in raw_platforms.items():
+        pid = share(pid)
+        platforms[pid] = {share(k): share(v) for k, v in plat.items()}
+        platforms[pid]["searchpairs"] = {share(k): share(v) for k, v in plat["searchpairs"].items()}
+        platforms[pid]["required"] = share(frozenset(share(k) for k in plat["required"]))
+        platforms[pid]["allkeys"] = share(frozenset(share(k) for k in plat["allkeys"]))
+    return {"platforms": platforms, "index": compilePlatformIndex(raw_platforms)}
+
+
+# ====================================================
+# Writes precompiled artifact of platform_file (see compiledArtifact.py).
+# Returns path of artifact. Raises IOError/ValueError if platform_file cannot be read.
+
+def compilePlatformArtifact(platform_file=None):
+    if platform_file is None:
+        platform_file = PLATFORM_FILE
+    with open(platform_file, "rb") as f_in:
+        source_bytes = f_in.read()
+    return writeArtifact(platform_file, "platforms", compilePlatforms(json.loads(source_bytes)), source_bytes)
+
+
+_platform_registries = {}
+_platform_registries_lock = threading.Lock()
+
+# ====================================================
+# Returns process-wide PlatformRegistry for platform_file (default PLATFORM_FILE).
+
+def getPlatformRegistry(platform_file=None):
+    if platform_file is None:
+        platform_file = PLATFORM_FILE
+    with _platform_registries_lock:
+        registry = _platform_registries.get(platform_file, None)
+        if registry is None:
+            registry = PlatformRegistry(platform_file)
+            _platform_registries[platform_file] = registry
+        return registry
+#############################################################################
+#############################################################################
+# validateRequestWithPlatform.py
+
+import logging
+
+# ====================================================
+# Validates that all keys in provisionng request map to platform properties
+# Returns status_code == 200 if valid, 400 if not
+
+
+def validateRequestWithPlatform(prov_req):
+    logging.debug("================ validateRequestWithPlatform() ================")
+
+    # first ensure we have request values required for rules
+    # get names of request keys in rules from which to compose safe name
+    required_keys = ["platform_id","accountValues"]
+    for rkey in required_keys:
+        input_val = prov_req.get(rkey, None)
+        if input_val is None:
+            err_msg = f"Request is missing key required for platform validation: {rkey}"
+            logging.error(err_msg)
+            return_dict = {}
+            return_dict["status_code"] = 400
+            return_dict["response_body"] = err_msg
+
+    # get platform from registry of platforms compiled with compileplats.py
+    # PLATFORM_FILE is a global constant defined in getPlatformId.py
+    try:
+        platform = getPlatformRegistry().get(prov_req["platform_id"])
+    except (IOError, ValueError):
+        err_msg = f"Could not read file: {PLATFORM_FILE}"
+        logging.error(err_msg)
+        return_dict = {}
+        return_dict["status_code"] = 500
+        return_dict["response_body"] = err_msg
+        return return_dict
+    if platform is None:
+        err_msg = f"Platform {prov_req['platform_id']} not found in {PLATFORM_FILE}"
+        logging.error(err_msg)
+        return_dict = {}
+        return_dict["status_code"] = 404
+        return_dict["response_body"] = err_msg
+        return return_dict
+
+    status_code = 200
+    response_body = "Platform is valid"
+
+    # determine if provisioning request keys map to platform properties
+    plat_id = platform["id"]
+    # get set of uppercase request properties to compare with platform properties
+    prov_keys = frozenset(k.upper() for k in prov_req["accountValues"].keys())
+    # first check if request has properties that are not in platform keys
+    missing_keys = sorted(prov_keys - platform["allkeys"])
+    valid_request = (len(missing_keys) == 0)
+    if valid_request:
+        # then check if any required platform properties are not in request
+        missing_reqd_keys = sorted(platform["required"] - prov_keys)
+        valid_request = (len(missing_reqd_keys) == 0)
+        if valid_request:
+            status_code = 200
+            response_body = f"Platform {plat_id} is a match for request."
+            logging.info(response_body)
+        else:
+            prov_keys = sorted(prov_keys)
+            status_code = 400
+            response_body = f"{plat_id} required propertie(s) '{missing_reqd_keys}' not found in request keys '{prov_keys}''."
+            logging.error(response_body)
+            plat_id = "Missing-Required-Keys"
+    else:
+        prov_keys = sorted(prov_keys)
+        all_keys = sorted(platform["allkeys"])
+        status_code = 400
+        response_body = f"Request keys '{missing_keys}' not found in {plat_id} properties: '{all_keys}'."
+        logging.error(response_body)
+        plat_id = "Request-Platform-KeyMismatch"
+
+    logging.debug(f"\tstatus_code: {status_code}\n\tresponse: {response_body}")
+
+    return_dict = {}
+    return_dict["status_code"] = status_code
+    return_dict["response_body"] = response_body
+    return return_dict
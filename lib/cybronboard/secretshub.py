@@ -0,0 +1,896 @@
+#############################################################################
+#############################################################################
+# getSHStoreCatalog.py
+
+import os
+import json
+import time
+import threading
+import logging
+from .httpclient import getHttpClient
+from .urls import secretsHubUrl
+
+# ====================================================
+# Constants
+SH_STORE_CACHE_FILE = os.environ.get("CYBR_SH_STORE_CACHE",
+                        os.path.expanduser("~/.cybronboard/shstores.json"))
+SH_STORE_CACHE_TTL = int(os.environ.get("CYBR_SH_STORE_CACHE_TTL", "0"))  # seconds, 0 = no on-disk cache
+# seconds the in-process store catalog, filter & policy indexes are reused,
+# 0 = for the life of the process (one-shot scripts); onboardService.py defaults to 300
+SH_CACHE_TTL = int(os.environ.get("CYBR_SH_CACHE_TTL", "0"))
+
+# Store catalogues already retrieved by this process, keyed by subdomain
+_sh_store_catalogs = {}
+_sh_store_catalogs_lock = threading.Lock()
+
+# ====================================================
+# Secrets Hub secret stores, indexed by behavior (SECRETS_SOURCE, SECRETS_TARGET)
+# and by (type, accountId, regionId) for stores that have account & region data.
+
+class SHStoreCatalog:
+
+    def __init__(self, stores):
+        self.fetched = time.monotonic()
+        self.stores = stores
+        self.by_behavior = {}
+        self.by_location = {}
+        for store in stores:
+            for behavior in store.get("behaviors", []):
+                self.by_behavior.setdefault(behavior, []).append(store)
+            data = store.get("data", {})
+            if "accountId" in data and "regionId" in data:
+                location = (store["type"], str(data["accountId"]), data["regionId"])
+                self.by_location.setdefault(location, []).append(store)
+
+    # -------------------------------------------
+    def sources(self):
+        return self.by_behavior.get("SECRETS_SOURCE", [])
+
+    # -------------------------------------------
+    def targets(self, store_type, account_id, region_id):
+        stores = self.by_location.get((store_type, str(account_id), region_id), [])
+        return [s for s in stores if "SECRETS_TARGET" in s.get("behaviors", [])]
+
+
+# ====================================================
+# Returns True if cached store catalog, filter or policy index must be
+# retrieved again: none cached, refresh requested or older than SH_CACHE_TTL.
+
+def shCacheStale(cached, refresh=False):
+    if cached is None or refresh:
+        return True
+    return SH_CACHE_TTL > 0 and time.monotonic() - cached.fetched > SH_CACHE_TTL
+
+
+# ====================================================
+# Retrieves Secrets Hub secret stores once per process (per subdomain), again
+# once older than SH_CACHE_TTL or if refresh is set.
+# If SH_STORE_CACHE_TTL > 0, stores are also cached in SH_STORE_CACHE_FILE
+# and reused by other processes until the cached copy is older than the TTL;
+# refresh skips that copy.
+# Returns status_code == 200 for success, response_body w/ message, store_catalog.
+
+def getSHStoreCatalog(prov_req, http_client=None, refresh=False):
+    logging.debug("================ getSHStoreCatalog() ================")
+    if http_client is None:
+        http_client = getHttpClient()
+
+    # -------------------------------------------
+    def readCachedStores():
+        if SH_STORE_CACHE_TTL <= 0 or refresh:
+            return None
+        try:
+            with open(SH_STORE_CACHE_FILE) as f_in:
+                cached = json.load(f_in).get(cybr_subdomain, None)
+        except (IOError, ValueError):
+            return None
+        if cached is None or time.time() - cached["fetched"] > SH_STORE_CACHE_TTL:
+            return None
+        return cached["secretStores"]
+
+    # -------------------------------------------
+    def writeCachedStores(stores):
+        if SH_STORE_CACHE_TTL <= 0:
+            return
+        try:
+            with open(SH_STORE_CACHE_FILE) as f_in:
+                cache = json.load(f_in)
+        except (IOError, ValueError):
+            cache = {}
+        cache[cybr_subdomain] = {"fetched": time.time(), "secretStores": stores}
+        try:
+            cache_dir = os.path.dirname(SH_STORE_CACHE_FILE)
+            if cache_dir:         # "" for a file in the current directory
+                os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+            tmp_file = f"{SH_STORE_CACHE_FILE}.{os.getpid()}.tmp"
+            fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f_out:
+                json.dump(cache, f_out)
+            os.replace(tmp_file, SH_STORE_CACHE_FILE)
+        except OSError as e:
+            logging.error(f"Could not write Secrets Hub store cache {SH_STORE_CACHE_FILE}: {e}")
+
+    # -------------------------------------------
+    # first ensure we have required request values
+    required_keys = ["cybr_subdomain", "session_token"]
+    for rkey in required_keys:
+        input_val = prov_req.get(rkey, None)
+        if input_val is None:
+            response_body = f"Request is missing key required for Secrets Hub store retrieval: {rkey}"
+            logging.error(response_body)
+            return_dict = {}
+            return_dict["status_code"] = 400
+            return_dict["response_body"] = response_body
+            return_dict["store_catalog"] = None
+            return return_dict
+
+    cybr_subdomain = prov_req["cybr_subdomain"]
+    session_token = prov_req["session_token"]
+
+    status_code = 200
+    response_body = "Secret stores retrieved successfully"
+
+    with _sh_store_catalogs_lock:
+        store_catalog = _sh_store_catalogs.get(cybr_subdomain, None)
+        if shCacheStale(store_catalog, refresh):
+            stores = readCachedStores()
+            if stores is None:
+                url = f"{secretsHubUrl(cybr_subdomain)}/api/secret-stores"
+                headers = {
+                    "Content-Type": "application/json",
+                    "Authorization": f"Bearer {session_token}",
+                }
+                response = http_client.request("GET", url, headers=headers)
+                status_code = response.status_code
+                if status_code == 200:
+                    stores = json.loads(response.text)["secretStores"]
+                    writeCachedStores(stores)
+                else:
+                    response_body = response.text
+            else:
+                logging.debug(f"\tusing secret stores cached in {SH_STORE_CACHE_FILE}")
+            if stores is not None:
+                store_catalog = SHStoreCatalog(stores)
+                _sh_store_catalogs[cybr_subdomain] = store_catalog
+
+    logging.debug(f"\tstatus_code: {status_code}\n\tresponse: {response_body}")
+
+    return_dict = {}
+    return_dict["status_code"] = status_code
+    return_dict["response_body"] = response_body
+    return_dict["store_catalog"] = store_catalog
+    return return_dict
+#############################################################################
+#############################################################################
+# getSHSourceStoreId.py
+
+import time
+import logging
+from .httpclient import getHttpClient
+
+# Exactly one source store must already exist.
+# Uses values in onboarding_dict to retrieve source store ID from Secrets Hub store catalogue
+# If the catalogue shared by this process has no source store, it is retrieved again once.
+# Returns ID, status_code == 200 for success, response_body with message
+
+# -------------------------------------------
+def getSHSourceStoreId(prov_req, http_client=None):
+    logging.debug("================ getSHSourceStoreId() ================")
+    if http_client is None:
+        http_client = getHttpClient()
+
+    # first ensure we have required request values
+    required_keys = ["cybr_subdomain", "session_token"]
+    for rkey in required_keys:
+        input_val = prov_req.get(rkey, None)
+        if input_val is None:
+            response_body = f"Request is missing key required for Secrets Hub source store ID retrieval: {rkey}"
+            logging.error(response_body)
+            return_dict = {}
+            return_dict["status_code"] = 400
+            return_dict["response_body"] = response_body
+
+    sstore_id = ""
+    status_code = 200
+    response_body = "Source store retrieved successfully"
+
+    started = time.monotonic()
+    resp_dict = getSHStoreCatalog(prov_req, http_client)
+    if (resp_dict["status_code"] == 200 and resp_dict["store_catalog"].fetched < started
+            and len(resp_dict["store_catalog"].sources()) == 0):
+        resp_dict = getSHStoreCatalog(prov_req, http_client, refresh=True)
+    status_code = resp_dict["status_code"]
+    if status_code == 200:
+        foundSource = list(resp_dict["store_catalog"].sources())
+        if len(foundSource) == 0:
+            status_code = 403
+            response_body = "No secret source found."
+        elif len(foundSource) > 1:
+            status_code = 300
+            response_body = "More than one secret source found."
+        else:
+            sstore_id = foundSource.pop()["id"]
+    else:
+        response_body = resp_dict["response_body"]
+
+    logging.debug(f"\tsstore_id: {sstore_id}")
+    logging.debug(f"\tstatus_code: {status_code}\n\tresponse: {response_body}")
+
+    return_dict = {}
+    return_dict["status_code"] = status_code
+    return_dict["response_body"] = response_body
+    return_dict["store_id"] = sstore_id
+    return return_dict#############################################################################
+#############################################################################
+# getSHTargetStoreId.py
+
+import time
+import logging
+from .httpclient import getHttpClient
+
+# Exactly one target store for account/region must already exist in Secrets Hub.
+# Uses account and region ID from provisioning request to find existing target store.
+# If the store catalog shared by this process has no such store, the catalog is
+# retrieved again once, so stores created since it was retrieved are found.
+# Returns status_code == 200 for success, response_body with message and tstore_id
+
+def getSHTargetStoreId(prov_req, http_client=None):
+    logging.debug("================ getSHTargetStoreId() ================")
+    if http_client is None:
+        http_client = getHttpClient()
+
+    # first ensure we have required request values
+    required_keys = [
+        "cybr_subdomain",
+        "session_token",
+        "cloudAccount",
+        "cloudRegion"
+    ]
+    for rkey in required_keys:
+        input_val = prov_req.get(rkey, None)
+        if input_val is None:
+            response_body = f"Request is missing key required for Secrets Hub target store retrieval: {rkey}"
+            logging.error(response_body)
+            return_dict = {}
+            return_dict["status_code"] = 400
+            return_dict["response_body"] = response_body
+
+    account_id = str(prov_req["cloudAccount"])     # str() needed in case acct# is not quoted
+    region_id = prov_req["cloudRegion"]
+
+    tstore_id = ""
+    status_code = 200
+    response_body = "Target store retrieved successfully"
+
+    # NEEDS REVISITING TO SUPPORT AZURE & GCP
+    # look up AWS target stores for account/region
+    started = time.monotonic()
+    resp_dict = getSHStoreCatalog(prov_req, http_client)
+    if (resp_dict["status_code"] == 200 and resp_dict["store_catalog"].fetched < started
+            and len(resp_dict["store_catalog"].targets("AWS_ASM", account_id, region_id)) == 0):
+        resp_dict = getSHStoreCatalog(prov_req, http_client, refresh=True)
+    status_code = resp_dict["status_code"]
+    if status_code == 200:
+        foundTarget = resp_dict["store_catalog"].targets("AWS_ASM", account_id, region_id)
+        logging.debug(f"foundTarget: {foundTarget}")
+        if len(foundTarget) == 0:
+            status_code = 404
+            response_body = f"Target store not found for account {account_id} and region {region_id}."
+        elif len(foundTarget) > 1:  # should not happen, but just in case
+            status_code = 300
+            response_body = f"More than one target store found for account {account_id} and region {region_id}."
+        else:
+            tstore_id = foundTarget[0]["id"]
+    else:
+        response_body = resp_dict["response_body"]
+
+    logging.debug(f"\ttstore_id: {tstore_id}")
+    logging.debug(f"\tstatus_code: {status_code}\n\tresponse: {response_body}")
+
+    return_dict = {}
+    return_dict["status_code"] = status_code
+    return_dict["response_body"] = response_body
+    return_dict["store_id"] = tstore_id
+    return return_dict
+#############################################################################
+#############################################################################
+# getSHFilterIndex.py
+
+import json
+import time
+import threading
+import logging
+from .httpclient import getHttpClient
+from .urls import secretsHubUrl
+
+# Filter indexes already retrieved by this process, keyed by (subdomain, source store ID)
+_sh_filter_indexes = {}
+_sh_filter_indexes_lock = threading.Lock()
+
+# ====================================================
+# PAM_SAFE filters of a Secrets Hub source store, indexed by safe name.
+# Filters created after the index was retrieved are added w/ add(), filters
+# deleted are removed w/ remove().
+
+class SHFilterIndex:
+
+    def __init__(self, filters):
+        self.by_safe = {}
+        self.by_id = {}
+        self.fetched = time.monotonic()
+        self._lock = threading.Lock()
+        for sh_filter in filters:
+            self.add(sh_filter)
+
+    # -------------------------------------------
+    def add(self, sh_filter):
+        if sh_filter.get("type", None) != "PAM_SAFE":
+            return
+        with self._lock:
+            self.by_safe.setdefault(sh_filter["data"]["safeName"], []).append(sh_filter)
+            self.by_id[sh_filter["id"]] = sh_filter
+
+    # -------------------------------------------
+    def remove(self, filter_id):
+        with self._lock:
+            sh_filter = self.by_id.pop(filter_id, None)
+            if sh_filter is None:
+                return
+            safe_name = sh_filter["data"]["safeName"]
+            sh_filters = [f for f in self.by_safe.get(safe_name, []) if f["id"] != filter_id]
+            if len(sh_filters) > 0:
+                self.by_safe[safe_name] = sh_filters
+            else:
+                self.by_safe.pop(safe_name, None)
+
+    # -------------------------------------------
+    def find(self, safe_name):
+        with self._lock:
+            return list(self.by_safe.get(safe_name, []))
+
+
+# ====================================================
+# Retrieves filters of source store in provisioning request once per process
+# and returns them indexed by safe name, so a batch of safes shares one listing.
+# Filters are retrieved again once older than SH_CACHE_TTL, or if refresh is set
+# (see getSHStoreCatalog.py).
+# Returns status_code == 200 for success, response_body w/ message, filter_index.
+
+def getSHFilterIndex(prov_req, http_client=None, refresh=False):
+    logging.debug("================ getSHFilterIndex() ================")
+    if http_client is None:
+        http_client = getHttpClient()
+
+    # first ensure we have required request values
+    required_keys = ["cybr_subdomain", "session_token", "source_store_id"]
+    for rkey in required_keys:
+        input_val = prov_req.get(rkey, None)
+        if input_val is None:
+            response_body = f"Request is missing key required for Secrets Hub filter retrieval: {rkey}"
+            logging.error(response_body)
+            return_dict = {}
+            return_dict["status_code"] = 400
+            return_dict["response_body"] = response_body
+            return_dict["filter_index"] = None
+            return return_dict
+
+    cybr_subdomain = prov_req["cybr_subdomain"]
+    session_token = prov_req["session_token"]
+    source_store_id = prov_req["source_store_id"]
+
+    status_code = 200
+    response_body = f"Filters for store ID {source_store_id} retrieved successfully."
+
+    with _sh_filter_indexes_lock:
+        filter_index = _sh_filter_indexes.get((cybr_subdomain, source_store_id), None)
+        if shCacheStale(filter_index, refresh):
+            url = f"{secretsHubUrl(cybr_subdomain)}/api/secret-stores/{source_store_id}/filters"
+            headers = {
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {session_token}",
+            }
+            response = http_client.request("GET", url, headers=headers)
+            status_code = response.status_code
+            if status_code == 200:
+                filter_index = SHFilterIndex(json.loads(response.text)["filters"])
+                _sh_filter_indexes[(cybr_subdomain, source_store_id)] = filter_index
+            else:
+                response_body = response.text
+
+    logging.debug(f"\tstatus_code: {status_code}\n\tresponse: {response_body}")
+
+    return_dict = {}
+    return_dict["status_code"] = status_code
+    return_dict["response_body"] = response_body
+    return_dict["filter_index"] = filter_index
+    return return_dict
+#############################################################################
+#############################################################################
+# getSHFilterForSafe.py
+
+import json
+import sys
+import logging
+from .httpclient import getHttpClient
+from .urls import secretsHubUrl
+
+# Does not assume filter exists in Secrets Hub.
+# Uses source_store_id and safename from provisioning request to find policy filter for safe
+#   in filter index shared by all requests in this process (see getSHFilterIndex.py).
+# If filter doesn't exist, creates it. If creating it conflicts (409), the filter was
+#   created since the index was retrieved, so the index is retrieved again once.
+# Returns status_code == 200 or 201 for success, response_body with message, filter_id.
+
+# -------------------------------------------
+def getSHFilterForSafe(prov_req, http_client=None):
+    logging.debug("================ getSHFilterForSafe() ================")
+    if http_client is None:
+        http_client = getHttpClient()
+
+    # -------------------------------------------
+    # NOTE: cybr_subdomain, source_store_id, safe_name, filter_index are global vars to this function
+    def createSHFilterForSafe():
+        logging.debug("================ createSHFilterForSafe() ================")
+        filter_id = ""
+        url = f"{secretsHubUrl(cybr_subdomain)}/api/secret-stores/{source_store_id}/filters"
+        payload = json.dumps({"data": {"safeName": safe_name}, "type": "PAM_SAFE"})
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {session_token}",
+        }
+        response = http_client.request("POST", url, headers=headers, data=payload)
+        status_code = response.status_code
+        if status_code == 201:
+            filter_dict = json.loads(response.text)
+            filter_id = filter_dict["id"]
+            # keep index current for later requests
+            filter_index.add({"id": filter_id, "type": "PAM_SAFE", "data": {"safeName": safe_name}})
+            response_body = (
+                f"Filter for store ID {source_store_id} and safe {safe_name} created."
+            )
+        else:
+            status_code = response.status_code
+            response_body = response.text
+
+        logging.debug(f"\tfilter_id: {filter_id}")
+        logging.debug(f"\tstatus_code: {status_code}\n\tresponse: {response_body}")
+
+        return filter_id, status_code, response_body
+
+    # -------------------------------------------
+    # first ensure we have required request values
+    required_keys = ["cybr_subdomain", "session_token", "safe_name", "source_store_id"]
+    for rkey in required_keys:
+        input_val = prov_req.get(rkey, None)
+        if input_val is None:
+            response_body = f"Request is missing key required for Secrets Hub filter retrieval/creation: {rkey}"
+            logging.error(response_body)
+            return_dict = {}
+            return_dict["status_code"] = 400
+            return_dict["response_body"] = response_body
+
+    cybr_subdomain = prov_req["cybr_subdomain"]
+    session_token = prov_req["session_token"]
+    safe_name = prov_req["safe_name"]
+    source_store_id = prov_req["source_store_id"]
+
+    filter_id = ""
+    status_code = 0
+    response_body = f"Source store filter for store ID {source_store_id} and safe {safe_name} retrieved successfully."
+
+    # get filters of source store, indexed by safe name
+    resp_dict = getSHFilterIndex(prov_req, http_client)
+    status_code = resp_dict["status_code"]
+    if status_code == 200:
+        # see if filter already exists for safe
+        filter_index = resp_dict["filter_index"]
+        foundFilter = filter_index.find(safe_name)
+        if len(foundFilter) == 0:  # filter does not exist - create it
+            filter_id, status_code, response_body = createSHFilterForSafe()
+            if status_code == 409:  # created elsewhere since index was retrieved - look it up again
+                resp_dict = getSHFilterIndex(prov_req, http_client, refresh=True)
+                if resp_dict["status_code"] == 200:
+                    filter_index = resp_dict["filter_index"]
+                    foundFilter = filter_index.find(safe_name)
+                    if len(foundFilter) > 0:
+                        status_code = 200
+                        response_body = f"Source store filter for store ID {source_store_id} and safe {safe_name} retrieved successfully."
+        if len(foundFilter) == 1:  # filter already exists - use it
+            filter_id = foundFilter.pop()["id"]
+        elif len(foundFilter) > 1:  # more than one filter exists - ambiguous - should not happen
+            status_code = 300
+            response_body = f"More than one filter already exists for store ID {source_store_id} and safe {safe_name}."
+    else:
+        response_body = resp_dict["response_body"]
+
+    logging.debug(f"\tfilter_id: {filter_id}")
+    logging.debug(f"\tstatus_code: {status_code}\n\tresponse: {response_body}")
+
+    return_dict = {}
+    return_dict["status_code"] = status_code
+    return_dict["response_body"] = response_body
+    return_dict["filter_id"] = filter_id
+    return return_dict
+#############################################################################
+#############################################################################
+# getSHPolicyIndex.py
+
+import json
+import time
+import threading
+import logging
+from .httpclient import getHttpClient
+from .urls import secretsHubUrl
+
+# Policy indexes already retrieved by this process, keyed by subdomain
+_sh_policy_indexes = {}
+_sh_policy_indexes_lock = threading.Lock()
+
+# ====================================================
+# Secrets Hub sync policies, indexed by (source ID, target ID, filter ID)
+# and by filter ID. Policies created after the index was retrieved are added
+# w/ add(), policies deleted are removed w/ remove().
+
+class SHPolicyIndex:
+
+    def __init__(self, policies):
+        self.by_ids = {}
+        self.by_filter = {}
+        self.by_id = {}
+        self.fetched = time.monotonic()
+        self._lock = threading.Lock()
+        for policy in policies:
+            self.add(policy)
+
+    # -------------------------------------------
+    def add(self, policy):
+        ids = (policy["source"]["id"], policy["target"]["id"], policy["filter"]["id"])
+        with self._lock:
+            self.by_ids.setdefault(ids, []).append(policy)
+            self.by_filter.setdefault(policy["filter"]["id"], []).append(policy)
+            self.by_id[policy["id"]] = policy
+
+    # -------------------------------------------
+    def remove(self, policy_id):
+        with self._lock:
+            policy = self.by_id.pop(policy_id, None)
+            if policy is None:
+                return
+            ids = (policy["source"]["id"], policy["target"]["id"], policy["filter"]["id"])
+            for index, key in [(self.by_ids, ids), (self.by_filter, policy["filter"]["id"])]:
+                policies = [p for p in index.get(key, []) if p["id"] != policy_id]
+                if len(policies) > 0:
+                    index[key] = policies
+                else:
+                    index.pop(key, None)
+
+    # -------------------------------------------
+    def findByFilter(self, filter_id):
+        with self._lock:
+            return list(self.by_filter.get(filter_id, []))
+
+    # -------------------------------------------
+    def find(self, sstore_id, tstore_id, filter_id):
+        with self._lock:
+            return list(self.by_ids.get((sstore_id, tstore_id, filter_id), []))
+
+
+# ====================================================
+# Retrieves Secrets Hub sync policies once per process and returns them
+# indexed by source, target & filter IDs, so a batch shares one listing.
+# Policies are retrieved again once older than SH_CACHE_TTL, or if refresh is set
+# (see getSHStoreCatalog.py).
+# Returns status_code == 200 for success, response_body w/ message, policy_index.
+
+def getSHPolicyIndex(prov_req, http_client=None, refresh=False):
+    logging.debug("================ getSHPolicyIndex() ================")
+    if http_client is None:
+        http_client = getHttpClient()
+
+    # first ensure we have required request values
+    required_keys = ["cybr_subdomain", "session_token"]
+    for rkey in required_keys:
+        input_val = prov_req.get(rkey, None)
+        if input_val is None:
+            response_body = f"Request is missing key required for Secrets Hub policy retrieval: {rkey}"
+            logging.error(response_body)
+            return_dict = {}
+            return_dict["status_code"] = 400
+            return_dict["response_body"] = response_body
+            return_dict["policy_index"] = None
+            return return_dict
+
+    cybr_subdomain = prov_req["cybr_subdomain"]
+    session_token = prov_req["session_token"]
+
+    status_code = 200
+    response_body = "Sync policies retrieved successfully."
+
+    with _sh_policy_indexes_lock:
+        policy_index = _sh_policy_indexes.get(cybr_subdomain, None)
+        if shCacheStale(policy_index, refresh):
+            url = f"{secretsHubUrl(cybr_subdomain)}/api/policies"
+            headers = {
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {session_token}",
+            }
+            response = http_client.request("GET", url, headers=headers)
+            status_code = response.status_code
+            if status_code == 200:
+                policy_index = SHPolicyIndex(json.loads(response.text)["policies"])
+                _sh_policy_indexes[cybr_subdomain] = policy_index
+            else:
+                response_body = response.text
+
+    logging.debug(f"\tstatus_code: {status_code}\n\tresponse: {response_body}")
+
+    return_dict = {}
+    return_dict["status_code"] = status_code
+    return_dict["response_body"] = response_body
+    return_dict["policy_index"] = policy_index
+    return return_dict
+#############################################################################
+#############################################################################
+# getSHSyncPolicy.py
+
+import json
+import sys
+import logging
+from .httpclient import getHttpClient
+from .urls import secretsHubUrl
+
+# Does not assume sync policy exists in Secrets Hub.
+# Uses IDs from dict to find existing policy in policy index shared by
+#   all requests in this process (see getSHPolicyIndex.py).
+# If policy not fount, creates it. If creating it conflicts (409), the policy was
+#   created since the index was retrieved, so the index is retrieved again once.
+#   If the source, target or filter is not found (404), the store catalogue and
+#   filter index are retrieved again for later requests.
+# Returns policy_id, status_code == 200 or 201 for success, response_body with message
+
+
+# -------------------------------------------
+def getSHSyncPolicy(prov_req, http_client=None):
+    logging.debug("================ getSHSyncPolicy() ================")
+    if http_client is None:
+        http_client = getHttpClient()
+
+    # -------------------------------------------
+    def createSHSyncPolicy(
+        cybr_subdomain, session_token, sstore_id, tstore_id, filter_id
+    ):
+        # should probably get source, target, filter names for policy name/description
+        policy_id = ""
+        url = f"{secretsHubUrl(cybr_subdomain)}/api/policies"
+        payload = json.dumps(
+            {
+                "name": "ASM policy",
+                "description": "Auto-created by onboarding automation",
+                "source": {"id": sstore_id},
+                "target": {"id": tstore_id},
+                "filter": {"id": filter_id},
+            }
+        )
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {session_token}",
+        }
+        response = http_client.request("POST", url, headers=headers, data=payload)
+        status_code = response.status_code
+        if status_code == 201:
+            policy_dict = json.loads(response.text)
+            policy_id = policy_dict["id"]
+            # keep index current for later requests, new policies are enabled
+            policy_index.add({
+                "id": policy_id,
+                "source": {"id": sstore_id},
+                "target": {"id": tstore_id},
+                "filter": {"id": filter_id},
+                "state": policy_dict.get("state", {"current": "ENABLED"}),
+            })
+            response_body = f"Policy with source ID {sstore_id}, target ID {tstore_id}, filter ID {filter_id} created."
+        else:
+            status_code = response.status_code
+            response_body = response.text
+
+        logging.debug(f"\tpolicy_id: {policy_id}")
+        logging.debug(f"\tstatus_code: {status_code}\n\tresponse: {response_body}")
+
+        return policy_id, status_code, response_body
+
+    # MAIN ====================================================
+    # first ensure we have required request values
+    required_keys = [
+        "cybr_subdomain",
+        "session_token",
+        "source_store_id",
+        "target_store_id",
+        "filter_id",
+    ]
+    for rkey in required_keys:
+        input_val = prov_req.get(rkey, None)
+        if input_val is None:
+            response_body = f"Request is missing key required for Secrets Hub sync policy retrieval/creation: {rkey}"
+            logging.error(response_body)
+            return_dict = {}
+            return_dict["status_code"] = 400
+            return_dict["response_body"] = response_body
+
+    cybr_subdomain = prov_req["cybr_subdomain"]
+    session_token = prov_req["session_token"]
+    sstore_id = prov_req["source_store_id"]
+    tstore_id = prov_req["target_store_id"]
+    filter_id = prov_req["filter_id"]
+
+    policy_id = ""
+    status_code = 200
+    response_body = "Sync policy retrieved successfully"
+
+    resp_dict = getSHPolicyIndex(prov_req, http_client)
+    status_code = resp_dict["status_code"]
+    if status_code == 200:
+        policy_index = resp_dict["policy_index"]
+        foundPolicy = policy_index.find(sstore_id, tstore_id, filter_id)
+        if len(foundPolicy) == 0:  # policy not found - create it
+            policy_id, status_code, response_body = createSHSyncPolicy(
+                cybr_subdomain, session_token, sstore_id, tstore_id, filter_id
+            )
+            if status_code == 409:  # created elsewhere since index was retrieved - look it up again
+                resp_dict = getSHPolicyIndex(prov_req, http_client, refresh=True)
+                if resp_dict["status_code"] == 200:
+                    policy_index = resp_dict["policy_index"]
+                    foundPolicy = policy_index.find(sstore_id, tstore_id, filter_id)
+                    if len(foundPolicy) > 0:
+                        status_code = 200
+                        response_body = "Sync policy retrieved successfully"
+            elif status_code == 404:
+                # store or filter deleted since they were retrieved, later requests see current ones
+                getSHStoreCatalog(prov_req, http_client, refresh=True)
+                getSHFilterIndex(prov_req, http_client, refresh=True)
+        if len(foundPolicy) > 1:
+            status_code = 300
+            response_body = f"More than one sync policy found for source ID {sstore_id}, filter ID {filter_id}, target ID {tstore_id}."
+            policy_id = foundPolicy.pop()["id"]
+        elif len(foundPolicy) == 1:
+            policy = foundPolicy.pop()
+            policy_id = policy["id"]
+            if policy["state"]["current"] != "ENABLED":
+                status_code = 409
+                response_body = f"Policy ID {policy_id} is not currently enabled."
+    else:
+        response_body = resp_dict["response_body"]
+
+    logging.debug(f"\tpolicy_id: {policy_id}")
+    logging.debug(f"\tstatus_code: {status_code}\n\tresponse: {response_body}")
+
+    return_dict = {}
+    return_dict["status_code"] = status_code
+    return_dict["response_body"] = response_body
+    return_dict["policy_id"] = policy_id
+    return return_dict
+#############################################################################
+#############################################################################
+# deleteSHFilterForSafe.py
+
+import json
+import logging
+import requests
+from .httpclient import getHttpClient
+from .urls import secretsHubUrl
+
+# Tears down the Secrets Hub sync of a safe, as set up by getSHFilterForSafe()
+#   and getSHSyncPolicy().
+# Uses source_store_id and safename from provisioning request to find the safe's
+#   filters in the filter index, and their policies in the policy index, shared
+#   by all requests in this process (see getSHFilterIndex.py, getSHPolicyIndex.py).
+# Each policy is disabled (unless already disabled) and deleted, then the filter
+#   is deleted. Deleted filters & policies are removed from the indexes.
+# Returns status_code == 200 for success (also if the safe has no filter or the
+#   source store no longer exists), response_body with message, policy_ids &
+#   filter_ids deleted.
+
+# -------------------------------------------
+def deleteSHFilterForSafe(prov_req, http_client=None):
+    logging.debug("================ deleteSHFilterForSafe() ================")
+    if http_client is None:
+        http_client = getHttpClient()
+
+    # -------------------------------------------
+    # Sends Secrets Hub API request, returns (status_code, response text)
+    # NOTE: cybr_subdomain & session_token are global vars to this function
+    def shRequest(method, path, payload=None):
+        url = f"{secretsHubUrl(cybr_subdomain)}{path}"
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {session_token}",
+        }
+        data = None if payload is None else json.dumps(payload)
+        try:
+            response = http_client.request(method, url, headers=headers, data=data)
+            return response.status_code, response.text
+        except requests.RequestException as e:
+            return 500, str(e)
+
+    # -------------------------------------------
+    # Disables & deletes policy, returns (status_code, response_body)
+    def deletePolicy(policy):
+        policy_id = policy["id"]
+        if policy.get("state", {}).get("current", None) != "DISABLED":
+            status_code, response_text = shRequest("PUT", f"/api/policies/{policy_id}/state", {"action": "disable"})
+            if status_code not in [200, 204, 404]:
+                return status_code, f"Error disabling policy {policy_id}: {response_text}"
+        status_code, response_text = shRequest("DELETE", f"/api/policies/{policy_id}")
+        if status_code not in [200, 204, 404]:
+            return status_code, f"Error deleting policy {policy_id}: {response_text}"
+        policy_index.remove(policy_id)
+        return 200, f"Policy {policy_id} deleted."
+
+    # -------------------------------------------
+    # first ensure we have required request values
+    required_keys = ["cybr_subdomain", "session_token", "safe_name", "source_store_id"]
+    for rkey in required_keys:
+        input_val = prov_req.get(rkey, None)
+        if input_val is None:
+            response_body = f"Request is missing key required for Secrets Hub filter deletion: {rkey}"
+            logging.error(response_body)
+            return_dict = {}
+            return_dict["status_code"] = 400
+            return_dict["response_body"] = response_body
+            return_dict["policy_ids"] = []
+            return_dict["filter_ids"] = []
+            return return_dict
+
+    cybr_subdomain = prov_req["cybr_subdomain"]
+    session_token = prov_req["session_token"]
+    safe_name = prov_req["safe_name"]
+    source_store_id = prov_req["source_store_id"]
+
+    policy_ids = []
+    filter_ids = []
+    status_code = 200
+    response_body = f"No Secrets Hub filter for store ID {source_store_id} and safe {safe_name}."
+
+    # get filters of source store, indexed by safe name, and policies, indexed by filter
+    resp_dict = getSHFilterIndex(prov_req, http_client)
+    store_gone = resp_dict["status_code"] == 404    # and w/ it, its filters
+    if resp_dict["status_code"] == 200:
+        filter_index = resp_dict["filter_index"]
+        resp_dict = getSHPolicyIndex(prov_req, http_client)
+    if store_gone:
+        response_body = f"No Secrets Hub source store w/ ID {source_store_id}, no filter for safe {safe_name}."
+    elif resp_dict["status_code"] != 200:
+        status_code = resp_dict["status_code"]
+        response_body = resp_dict["response_body"]
+    else:
+        policy_index = resp_dict["policy_index"]
+        for sh_filter in filter_index.find(safe_name):
+            filter_id = sh_filter["id"]
+            # a filter cannot be deleted while policies use it
+            for policy in policy_index.findByFilter(filter_id):
+                status_code, response_body = deletePolicy(policy)
+                if status_code != 200:
+                    break
+                policy_ids.append(policy["id"])
+            if status_code != 200:
+                break
+            status_code, response_text = shRequest("DELETE", f"/api/secret-stores/{source_store_id}/filters/{filter_id}")
+            if status_code not in [200, 204, 404]:
+                response_body = f"Error deleting filter {filter_id}: {response_text}"
+                break
+            status_code = 200
+            filter_index.remove(filter_id)
+            filter_ids.append(filter_id)
+            response_body = (f"Deleted {len(filter_ids)} filter(s) and {len(policy_ids)} policy(ies) "
+                             f"for store ID {source_store_id} and safe {safe_name}.")
+
+    if status_code != 200:
+        logging.error(response_body)
+    logging.debug(f"\tpolicy_ids: {policy_ids}\n\tfilter_ids: {filter_ids}")
+    logging.debug(f"\tstatus_code: {status_code}\n\tresponse: {response_body}")
+
+    return_dict = {}
+    return_dict["status_code"] = status_code
+    return_dict["response_body"] = response_body
+    return_dict["policy_ids"] = policy_ids
+    return_dict["filter_ids"] = filter_ids
+    return return_dict
@@ -0,0 +1,33 @@
+#############################################################################
+#############################################################################
+# cybrUrl.py
+
+import os
+
+# ====================================================
+# Constants
+CYBR_BASE_URL = os.environ.get("CYBR_BASE_URL", "").rstrip("/")   # e.g. http://127.0.0.1:8080
+
+# ====================================================
+# Base URLs of the CyberArk services of a tenant:
+#   Identity         https://<subdomain>.cyberark.cloud
+#   Privilege Cloud  https://<subdomain>.privilegecloud.cyberark.cloud
+#   Secrets Hub      https://<subdomain>.secretshub.cyberark.cloud
+# If CYBR_BASE_URL is set, all three services are reached at that one URL
+# instead, e.g. to run against bin/mockCybrServer.py. API paths of the
+# services do not overlap, so one server can stand in for all of them.
+
+def identityUrl(cybr_subdomain):
+    if CYBR_BASE_URL:
+        return CYBR_BASE_URL
+    return f"https://{cybr_subdomain}.cyberark.cloud"
+
+def pcloudUrl(cybr_subdomain):
+    if CYBR_BASE_URL:
+        return CYBR_BASE_URL
+    return f"https://{cybr_subdomain}.privilegecloud.cyberark.cloud"
+
+def secretsHubUrl(cybr_subdomain):
+    if CYBR_BASE_URL:
+        return CYBR_BASE_URL
+    return f"https://{cybr_subdomain}.secretshub.cyberark.cloud"
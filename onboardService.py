@@ -0,0 +1,199 @@
+#!/usr/local/bin/python3
+
+'''
+ Long-running onboarding service.
+
+ Keeps the library loaded, the session token cached, platforms and
+ naming rules compiled and HTTP connections open, and onboards
+ provisioning requests (same JSON as ./requests/*.json) submitted to a
+ local HTTP/JSON API, so each request costs milliseconds of overhead
+ instead of an interpreter start, imports and an authentication.
+
+   POST /jobs          body: provisioning request, or list of requests
+                       optional ?request_id=<id> (single request only)
+                       -> 202 w/ job(s): job_id, status, ...
+   GET  /jobs          -> summaries of all jobs, optional ?status=<status>
+   GET  /jobs/<job_id> -> job w/ status (queued, running, succeeded, failed)
+                          and, once finished, the onboardRequest() result
+   GET  /health        -> job counts, queue depth per priority lane &
+                          HTTP client metrics
+
+ Jobs wait in a bounded priority queue (see src/onboardWorkQueue.py):
+ requests for production envs first, and POST /jobs is rejected w/ 429 and
+ Retry-After while the queue is full. W/ --queue-db the queue is kept in
+ SQLite, so jobs queued or running when the service stops are run after it
+ restarts.
+
+ Listens on 127.0.0.1 by default. If CYBR_SERVICE_TOKEN is set, requests
+ must send it as "Authorization: Bearer <token>".
+'''
+
+import os
+import sys
+import json
+import hmac
+import signal
+import argparse
+import threading
+import logging
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from cybronboard import (
+    authnCyberarkCached, errCheck, getAuthnCreds, getPlatformRegistry, JOB_WORKERS,
+    loadSafeNameProgram, OnboardJobManager, OnboardWorkQueue, QueueFull, WORK_QUEUE_DB,
+    WORK_QUEUE_SIZE)
+import cybronboard.secretshub
+
+logfile = "./logs/onboardService.log"
+loglevel = logging.INFO       # BEWARE! DEBUG loglevel can leak secrets!
+logfmode = 'a'                # w = overwrite, a = append
+
+SERVICE_PORT = int(os.environ.get("CYBR_SERVICE_PORT", "8770"))
+SERVICE_TOKEN = os.environ.get("CYBR_SERVICE_TOKEN", "")
+MAX_BODY_BYTES = 10 * 1024 * 1024
+QUEUE_FULL_RETRY_AFTER = 5        # seconds clients are asked to wait when the queue is full
+# the service outlives Secrets Hub changes made elsewhere (new target stores, batchOffboard.py),
+# so its store catalog, filter & policy indexes are retrieved again after this many seconds
+SERVICE_SH_CACHE_TTL = int(os.environ.get("CYBR_SH_CACHE_TTL", "300"))
+
+# ====================================================
+# HTTP/JSON API of the job manager
+
+class OnboardServiceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    job_manager = None            # set below
+
+    def do_GET(self):
+        if not self.authorized():
+            return
+        url = urlsplit(self.path)
+        parts = url.path.strip("/").split("/")
+        if parts == ["health"]:
+            return self.reply(200, {"status": "ok", "jobs": self.job_manager.counts(),
+                                    "http": self.job_manager.http_client.stats()})
+        if parts == ["jobs"]:
+            status = parse_qs(url.query).get("status", [None])[0]
+            return self.reply(200, {"jobs": self.job_manager.jobs(status)})
+        if len(parts) == 2 and parts[0] == "jobs":
+            job = self.job_manager.get(parts[1])
+            if job is None:
+                return self.reply(404, {"error": f"Job {parts[1]} not found."})
+            return self.reply(200, job)
+        self.reply(404, {"error": f"No route for GET {url.path}"})
+
+    def do_POST(self):
+        if not self.authorized():
+            return
+        url = urlsplit(self.path)
+        # replies w/o reading the body close the connection, the body would be read as the next request
+        if url.path.rstrip("/") != "/jobs":
+            return self.reply(404, {"error": f"No route for POST {url.path}"}, {"Connection": "close"})
+        try:
+            length = int(self.headers.get("Content-Length", "0"))
+        except ValueError:
+            return self.reply(400, {"error": "Content-Length header is not a number."}, {"Connection": "close"})
+        if length <= 0 or length > MAX_BODY_BYTES:
+            return self.reply(400, {"error": f"Request body must be 1 to {MAX_BODY_BYTES} bytes of JSON."},
+                              {"Connection": "close"})
+        try:
+            body = json.loads(self.rfile.read(length))
+        except ValueError as e:
+            return self.reply(400, {"error": f"Request body is not JSON: {e}"})
+        request_id = parse_qs(url.query).get("request_id", [None])[0]
+        try:
+            if isinstance(body, dict):
+                job = self.job_manager.submit(body, request_id)
+                return self.reply(202, job, {"Location": f"/jobs/{job['job_id']}"})
+            if isinstance(body, list) and all(isinstance(prov_req, dict) for prov_req in body):
+                jobs = self.job_manager.submitMany([(None, prov_req) for prov_req in body])
+                return self.reply(202, {"jobs": jobs})
+        except QueueFull as e:
+            # backpressure: nothing was queued, client retries later
+            return self.reply(429, {"error": str(e)}, {"Retry-After": str(QUEUE_FULL_RETRY_AFTER)})
+        self.reply(400, {"error": "Request body must be a provisioning request or a list of them."})
+
+    # -------------------------------------------
+    def authorized(self):
+        # constant-time compare, so response time does not reveal how much of the token matched
+        presented = self.headers.get("Authorization", "").encode()
+        if SERVICE_TOKEN and not hmac.compare_digest(presented, f"Bearer {SERVICE_TOKEN}".encode()):
+            # body of unauthenticated client is not read, so connection is closed
+            self.reply(401, {"error": "Missing or invalid bearer token."}, {"Connection": "close"})
+            return False
+        return True
+
+    # -------------------------------------------
+    def reply(self, status_code, body, headers=None):
+        data = json.dumps(body, default=str).encode()
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    # -------------------------------------------
+    def log_message(self, format, *args):
+        logging.debug(format % args)
+
+
+# MAIN =================================================
+os.makedirs(os.path.dirname(logfile), exist_ok=True)
+logging.basicConfig(filename=logfile, encoding='utf-8', level=loglevel, filemode=logfmode,
+                    format="%(asctime)s %(levelname)s %(threadName)s %(message)s")
+
+parser = argparse.ArgumentParser(description="Serve onboarding jobs over a local HTTP/JSON API.")
+parser.add_argument("--host", default="127.0.0.1")
+parser.add_argument("-p", "--port", type=int, default=SERVICE_PORT,
+                    help=f"port to listen on (default CYBR_SERVICE_PORT or {SERVICE_PORT})")
+parser.add_argument("-w", "--workers", type=int, default=JOB_WORKERS,
+                    help=f"requests onboarded in parallel (default {JOB_WORKERS})")
+parser.add_argument("-q", "--queue-size", type=int, default=WORK_QUEUE_SIZE,
+                    help=f"max queued jobs before new ones are rejected (default {WORK_QUEUE_SIZE})")
+parser.add_argument("--queue-db", default=WORK_QUEUE_DB,
+                    help="SQLite file keeping queued jobs across restarts (default CYBR_QUEUE_DB, none)")
+parser.add_argument("--sh-cache-ttl", type=int, default=SERVICE_SH_CACHE_TTL,
+                    help=f"seconds Secrets Hub stores, filters & policies are reused (default {SERVICE_SH_CACHE_TTL}, 0 = forever)")
+args = parser.parse_args()
+cybronboard.secretshub.SH_CACHE_TTL = args.sh_cache_ttl
+
+print("Getting admin creds...")
+resp_dict = getAuthnCreds()
+errCheck(resp_dict)
+admin_creds = resp_dict["admin_creds"]
+
+# pay all one-time costs before the first job arrives
+print("Authenticating...")
+resp_dict = authnCyberarkCached(admin_creds)
+errCheck(resp_dict)
+try:
+    loadSafeNameProgram()
+    getPlatformRegistry().refresh()
+except (IOError, ValueError) as e:
+    err_msg = f"{sys.argv[0]}: Could not load naming rules or platforms: {e}"
+    print(err_msg)
+    logging.error(err_msg)
+    sys.exit(-1)
+
+work_queue = OnboardWorkQueue(args.queue_size, args.queue_db)
+job_manager = OnboardJobManager(admin_creds, args.workers, work_queue=work_queue)
+job_manager.start()
+OnboardServiceHandler.job_manager = job_manager
+server = ThreadingHTTPServer((args.host, args.port), OnboardServiceHandler)
+server.daemon_threads = True
+
+# SIGTERM stops the service like Ctrl-C
+signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+
+print(f"Onboarding service listening on http://{args.host}:{args.port} w/ {args.workers} worker(s)")
+logging.info(f"Listening on {args.host}:{args.port} w/ {args.workers} worker(s)")
+try:
+    server.serve_forever()
+except KeyboardInterrupt:
+    pass
+server.server_close()
+# a durable queue keeps jobs not yet started for the next run, else they are run now
+job_manager.stop(drain=not args.queue_db)
+logging.info("Stopped.")
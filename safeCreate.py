@@ -3,7 +3,8 @@
 import json
 import sys
 import logging
-from cybronboard import *
+from cybronboard import (
+    addSafeMembers, authnCyberarkCached, createSafe, errCheck, getAuthnCreds, getSafeName)
 
 logfile = "./logs/safeCreate.log"
 loglevel = logging.INFO       # BEWARE! DEBUG loglevel can leak secrets!
@@ -37,7 +38,7 @@ errCheck(resp_dict)
 admin_creds = resp_dict["admin_creds"]
 
 print("Authenticating...")
-resp_dict = authnCyberark(admin_creds)
+resp_dict = authnCyberarkCached(admin_creds)
 errCheck(resp_dict)
 logging.info("Successfully authenticated.")
 prov_req["session_token"] = resp_dict["session_token"]
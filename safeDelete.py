@@ -3,7 +3,8 @@
 import json
 import sys
 import logging
-from cybronboard import *
+from cybronboard import (
+    authnCyberarkCached, deleteAccountsInSafes, deleteSafe, errCheck, getAuthnCreds, getSafeName)
 
 logfile = "./logs/safeDelete.log"
 loglevel = logging.DEBUG           # BEWARE: DEBUG loglevel can leak secrets!
@@ -12,23 +13,36 @@ logfmode = 'w'  		              # w = overwrite, a = append
 # MAIN =================================================
 logging.basicConfig(filename=logfile, encoding='utf-8', level=loglevel, filemode=logfmode)
 
-# Get provisioning request from single filename argument
-try:
-  reqfile = sys.argv[1]
-  with open(reqfile) as f_in:
-    prov_req = json.load(f_in)
-except IOError:
-    err_msg = f"{sys.argv[0]}: Could not read provisioning request from filename argument."
+# Get provisioning requests from one or more filename arguments
+if len(sys.argv) < 2:
+    err_msg = f"Usage: {sys.argv[0]} <provisioning-request-file> [<provisioning-request-file> ...]"
+    print(err_msg)
+    logging.error(err_msg)
+    sys.exit(-1)
+prov_reqs = []
+for reqfile in sys.argv[1:]:
+  try:
+    with open(reqfile) as f_in:
+      prov_reqs.append(json.load(f_in))
+  except IOError:
+    err_msg = f"{sys.argv[0]}: Could not read provisioning request from filename argument {reqfile}."
     print(err_msg)
     logging.error(err_msg)
     sys.exit(-1)
 
-# Generate safe name based on provisioning request values, add to provisioning request
-print("Generating safe name...")
-resp_dict = getSafeName(prov_req)
-errCheck(resp_dict)
-logging.info(f"safe_name: {resp_dict['safe_name']}")
-prov_req["safe_name"] = resp_dict["safe_name"]
+# Generate safe names based on provisioning request values, add to provisioning requests
+print("Generating safe name(s)...")
+for prov_req in prov_reqs:
+  resp_dict = getSafeName(prov_req)
+  errCheck(resp_dict)
+  logging.info(f"safe_name: {resp_dict['safe_name']}")
+  prov_req["safe_name"] = resp_dict["safe_name"]
+
+# Requests that name the same safe delete it once (safe names are case-insensitive)
+unique_reqs = {}
+for prov_req in prov_reqs:
+  unique_reqs.setdefault(prov_req["safe_name"].lower(), prov_req)
+prov_reqs = list(unique_reqs.values())
 
 print("Getting admin creds...")
 resp_dict = getAuthnCreds()
@@ -36,15 +50,24 @@ errCheck(resp_dict)
 admin_creds = resp_dict["admin_creds"]
 
 print("Authenticating...")
-resp_dict = authnCyberark(admin_creds)
+resp_dict = authnCyberarkCached(admin_creds)
 errCheck(resp_dict)
 logging.info("Successfully authenticated.")
-prov_req["session_token"] = resp_dict["session_token"]
-prov_req["cybr_subdomain"] = admin_creds["cybr_subdomain"]
+for prov_req in prov_reqs:
+  prov_req["session_token"] = resp_dict["session_token"]
+  prov_req["cybr_subdomain"] = admin_creds["cybr_subdomain"]
+
+# A safe can only be deleted once it has no accounts. Accounts of all safes
+# are deleted in parallel, at most CYBR_DELETE_CONCURRENCY at a time.
+print("Deleting accounts...")
+for prov_req, resp_dict in zip(prov_reqs, deleteAccountsInSafes(prov_reqs)):
+  print(f"  {resp_dict['response_body']}")
+  errCheck(resp_dict)
 
-print("Deleting safe...")
-resp_dict = deleteSafe(prov_req)
-errCheck(resp_dict, expected=[204])
-logging.info(f"safe_name: {prov_req['safe_name']} no longer exists.")
+print("Deleting safe(s)...")
+for prov_req in prov_reqs:
+  resp_dict = deleteSafe(prov_req)
+  errCheck(resp_dict, expected=[204])
+  logging.info(f"safe_name: {prov_req['safe_name']} no longer exists.")
 
-sys.exit(0)
\ No newline at end of file
+sys.exit(0)
@@ -3,11 +3,35 @@
 #############################################################################
 # addSafeMembers.py
 
+import os
 import json
-import requests
 import logging
+import requests
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from .httpclient import getHttpClient
+from .tracing import getTracer
+from .urls import pcloudUrl
+
+# ====================================================
+# Constants
+SAFE_MEMBER_CONCURRENCY = int(os.environ.get("CYBR_MEMBER_CONCURRENCY", "8"))  # max parallel member writes
+MEMBER_PAGE_SIZE = 1000             # members per page when listing current safe members
+MEMBER_OK_STATUS = [200, 201, 409]  # unchanged, added/updated, already a member
 
-def addSafeMembers(prov_req):
+# ====================================================
+# Adds safeAdmins, then safeFullUsers and syncMembers, to safe in provisioning request.
+# A member listed under several of these gets only the strongest role (admin > full > sync).
+# Current safe members are read first; members that are missing are added, members
+# whose permissions differ are updated and members that match are left untouched.
+# Member writes within each phase run concurrently, at most member_concurrency
+# (request key, default SAFE_MEMBER_CONCURRENCY) at a time. Admins are always
+# added before other members, and other members are not added if an admin fails.
+# Returns status_code == 201 if all members were added or already exist, and
+# member_results with member, role, action (add/update/none), status_code &
+# response_body of each member.
+
+def addSafeMembers(prov_req, http_client=None):
     #====================================================
     sync_permissions = {
         "accessWithoutConfirmation": True,
@@ -65,45 +89,144 @@ def addSafeMembers(prov_req):
     }
     admin_permissions = admin_permission_delta | full_permissions
 
-    # Adds members of memberlist to safe w/ permissions
+    # Adds one member to safe w/ permissions, returns member result dictionary
     # NOTE: safe_name, cybr_subdomain & session_token are global vars to this function
-    def addMembers(memberList, permissions):
-        status_code = 201
-        response_body = f"All members added to safe {safe_name} successfully."
-        for mbr in memberList:
-            mbr = mbr.replace("%2f"," ").replace("%2F"," ")
-            member_req = {
-                "safeName": safe_name,
-                "memberName": mbr,
-                "memberType": "User",
-                "searchIn": "Vault",
-                "membershipExpirationDate": None
-            }
-            member_req["permissions"] = permissions
-            url = f"https://{cybr_subdomain}.privilegecloud.cyberark.cloud/passwordvault/api/safes/{safe_name}/members"
-            payload = json.dumps(member_req)
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {session_token}",
-            }
-            response = requests.request("POST", url, headers=headers, data=payload)
+    def addMember(mbr, role, permissions):
+        member_req = {
+            "safeName": safe_name,
+            "memberName": mbr,
+            "memberType": "User",
+            "searchIn": "Vault",
+            "membershipExpirationDate": None
+        }
+        member_req["permissions"] = permissions
+        url = f"{pcloudUrl(cybr_subdomain)}/passwordvault/api/safes/{safe_name}/members"
+        payload = json.dumps(member_req)
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {session_token}",
+        }
+        try:
+            response = http_client.request("POST", url, headers=headers, data=payload)
             status_code = response.status_code
-            if status_code == 201:
-                logging.info(f"{mbr} added to safe {safe_name}")
-            elif status_code == 409:
-                logging.info(f"User named {mbr} is already a member of safe {safe_name}.")              
-            else:
-                response_body = f"Error adding user named {mbr} to safe {safe_name}."
-                logging.error(response_body)
-                logging.error(f"\t{response.text}")
+            response_text = response.text
+        except requests.RequestException as e:
+            status_code = 500
+            response_text = str(e)
+        if status_code == 201:
+            response_body = f"{mbr} added to safe {safe_name}"
+            logging.info(response_body)
+        elif status_code == 409:
+            response_body = f"User named {mbr} is already a member of safe {safe_name}."
+            logging.info(response_body)
+        else:
+            response_body = f"Error adding user named {mbr} to safe {safe_name}."
+            logging.error(response_body)
+            logging.error(f"\t{response_text}")
+
+        return memberResult(mbr, role, "add", status_code, response_body)
+
+    # Updates permissions of existing safe member, returns member result dictionary
+    def updateMember(mbr, role, permissions):
+        url = f"{pcloudUrl(cybr_subdomain)}/passwordvault/api/safes/{safe_name}/members/{urllib.parse.quote(mbr)}"
+        payload = json.dumps({"permissions": permissions})
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {session_token}",
+        }
+        try:
+            response = http_client.request("PUT", url, headers=headers, data=payload)
+            status_code = response.status_code
+            response_text = response.text
+        except requests.RequestException as e:
+            status_code = 500
+            response_text = str(e)
+        if status_code == 200:
+            response_body = f"Permissions of {mbr} in safe {safe_name} updated."
+            logging.info(response_body)
+        else:
+            response_body = f"Error updating permissions of user named {mbr} in safe {safe_name}."
+            logging.error(response_body)
+            logging.error(f"\t{response_text}")
 
-            if status_code not in [201,409]:
-                break
+        return memberResult(mbr, role, "update", status_code, response_body)
 
-        return status_code, response_body
+    # Returns member result dictionary for report in return_dict['member_results']
+    def memberResult(mbr, role, action, status_code, response_body):
+        member_result = {}
+        member_result["member"] = mbr
+        member_result["role"] = role
+        member_result["action"] = action
+        member_result["status_code"] = status_code
+        member_result["response_body"] = response_body
+        return member_result
+
+    # Returns dictionary of current safe members keyed by lowercase member name,
+    # or None if the member list could not be retrieved
+    def getCurrentMembers():
+        url = f"{pcloudUrl(cybr_subdomain)}/passwordvault/api/safes/{safe_name}/members"
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {session_token}",
+        }
+        current_members = {}
+        offset = 0
+        while True:
+            try:
+                response = http_client.request("GET", url, headers=headers,
+                                params={"offset": offset, "limit": MEMBER_PAGE_SIZE})
+            except requests.RequestException as e:
+                logging.info(f"Could not list members of safe {safe_name}: {e}")
+                return None
+            if response.status_code != 200:
+                logging.info(f"Could not list members of safe {safe_name}: {response.status_code}")
+                return None
+            try:
+                members_dict = json.loads(response.text)
+                page = members_dict.get("value", [])
+                for member in page:
+                    current_members[member["memberName"].lower()] = member
+            except (ValueError, AttributeError, KeyError, TypeError) as e:
+                logging.info(f"Could not list members of safe {safe_name}: unexpected response: {e}")
+                return None
+            offset += len(page)
+            if len(page) == 0 or offset >= members_dict.get("count", 0):
+                return current_members
+
+    # Adds or updates (member, role, permissions) tuples that differ from current
+    # safe members, at most member_concurrency at a time
+    def provisionMembers(members):
+        todo = []
+        results = {}
+        for idx, (mbr, role, permissions) in enumerate(members):
+            current = None if current_members is None else current_members.get(mbr.lower(), None)
+            if current_members is None or current is None:
+                todo.append((idx, addMember, mbr, role, permissions))
+            elif any(current.get("permissions", {}).get(k, None) != v for k, v in permissions.items()):
+                todo.append((idx, updateMember, mbr, role, permissions))
+            else:
+                response_body = f"User named {mbr} is already a member of safe {safe_name}."
+                logging.info(response_body)
+                results[idx] = memberResult(mbr, role, "none", 200, response_body)
+        if len(todo) > 0:
+            # HTTP spans of pool threads belong to the caller's span
+            parent_span = getTracer().current()
+            def provisionMember(t):
+                with getTracer().attach(parent_span):
+                    return t[1](*t[2:])
+            with ThreadPoolExecutor(max_workers=min(member_concurrency, len(todo))) as pool:
+                for idx, result in zip([t[0] for t in todo], pool.map(provisionMember, todo)):
+                    results[idx] = result
+        return [results[idx] for idx in range(len(members))]
+
+    # Member names may have URL-encoded slashes, which are stored as spaces
+    def normalizeMember(mbr):
+        return mbr.replace("%2f"," ").replace("%2F"," ")
 
     # MAIN ====================================================
     logging.debug("================ addSafeMembers() ================")
+    if http_client is None:
+        http_client = getHttpClient()
 
     # first ensure we have required request values
     required_keys = ["cybr_subdomain","session_token","safe_name"]
@@ -115,35 +238,66 @@ def addSafeMembers(prov_req):
             return_dict = {}
             return_dict["status_code"] = 400
             return_dict["response_body"] = err_msg
+            return_dict["member_results"] = []
+            return return_dict
 
     cybr_subdomain = prov_req["cybr_subdomain"]
     session_token = prov_req["session_token"]
     safe_name = prov_req["safe_name"]
+    try:
+        member_concurrency = int(prov_req.get("member_concurrency", SAFE_MEMBER_CONCURRENCY))
+    except (TypeError, ValueError):
+        member_concurrency = 0
+    if member_concurrency < 1:
+        err_msg = f"Request value member_concurrency must be a positive integer: {prov_req.get('member_concurrency', SAFE_MEMBER_CONCURRENCY)}"
+        logging.error(err_msg)
+        return_dict = {}
+        return_dict["status_code"] = 400
+        return_dict["response_body"] = err_msg
+        return_dict["member_results"] = []
+        return return_dict
 
-    # add safe admins first
-    safe_admins = prov_req.get("safeAdmins", None)
-    if safe_admins is not None:
-        status_code, response_body = addMembers(safe_admins,admin_permissions)
-    else: 
-        logging.info(f"No admins to add to safe {safe_name}.")
-
-    # if no errors, add full users (account managers)
-    if status_code in [201,409]:
-        safe_full_users = prov_req.get("safeFullUsers", None)
-        if safe_full_users is not None:
-            status_code, response_body = addMembers(safe_full_users,full_permissions)
-        else:
-            logging.info(f"No sync members to add to safe {safe_name}.")
+    # each member is provisioned once, w/ its strongest role: admin > full > sync,
+    # so concurrent writes never race for a member listed under two roles
+    role_members = {"admin": [], "full": [], "sync": []}
+    member_roles = {}
+    for role, rkey, label in [("admin", "safeAdmins", "admins"), ("full", "safeFullUsers", "full users"),
+                              ("sync", "syncMembers", "sync members")]:
+        members = prov_req.get(rkey, None)
+        if members is None:
+            logging.info(f"No {label} to add to safe {safe_name}.")
+            continue
+        for mbr in [normalizeMember(m) for m in members]:
+            if mbr.lower() in member_roles:
+                if member_roles[mbr.lower()] != role:
+                    logging.info(f"User named {mbr} is added to safe {safe_name} as {member_roles[mbr.lower()]}, not {role}.")
+                continue
+            member_roles[mbr.lower()] = role
+            role_members[role].append(mbr)
 
-    # if no errors, add sync users (SecretsHub, 'Conjur Sync', etc.)
-    if status_code in [201,409]:
-        sync_members = prov_req.get("syncMembers", None)
-        if sync_members is not None:
-            status_code, response_body = addMembers(sync_members,sync_permissions)
-        else:
-            logging.info(f"No sync members to add to safe {safe_name}.")
+    # read current members once, so only missing members & changed permissions are written
+    current_members = getCurrentMembers()
+
+    # safe admins are added first, so the safe has managers before any other member is added
+    member_results = provisionMembers([(m, "admin", admin_permissions) for m in role_members["admin"]])
+
+    # if no errors, add full users (account managers) and sync users (SecretsHub, 'Conjur Sync', etc.)
+    if all(r["status_code"] in MEMBER_OK_STATUS for r in member_results):
+        member_results += provisionMembers(
+            [(m, "full", full_permissions) for m in role_members["full"]]
+            + [(m, "sync", sync_permissions) for m in role_members["sync"]]
+        )
+
+    failed = [r for r in member_results if r["status_code"] not in MEMBER_OK_STATUS]
+    if failed:
+        status_code = failed[0]["status_code"]
+        response_body = f"Error adding member(s) {[r['member'] for r in failed]} to safe {safe_name}."
+    else:
+        status_code = 201
+        response_body = f"All members added to safe {safe_name} successfully."
 
     return_dict = {}
     return_dict["status_code"] = status_code
     return_dict["response_body"] = response_body
+    return_dict["member_results"] = member_results
     return return_dict
@@ -5,15 +5,18 @@
 
 import os
 import sys
-import requests
 import urllib.parse
 import logging
+from .httpclient import getHttpClient
+from .urls import identityUrl
 
 # Authenticates with creds in dictionary argument.
 # Returns session_token in response dictionary.
 
-def authnCyberark(admin_creds):
+def authnCyberark(admin_creds, http_client=None):
     logging.debug("================ authnCyberark() ================")
+    if http_client is None:
+        http_client = getHttpClient()
 
     # -------------------------------------------
     def urlify(s):
@@ -44,10 +47,10 @@ def authnCyberark(admin_creds):
     response_body = "Successfully authenticated to CyberArk Privilege Cloud."
 
     # Authenticate to CyberArk Identity
-    url = f"https://{cybr_subdomain}.cyberark.cloud/api/idadmin/oauth2/platformtoken"
+    url = f"{identityUrl(cybr_subdomain)}/api/idadmin/oauth2/platformtoken"
     payload = f"grant_type=client_credentials&client_id={urlify(cybr_username)}&client_secret={urlify(cybr_password)}"
     headers = {"Content-Type": "application/x-www-form-urlencoded"}
-    response = requests.request("POST", url, headers=headers, data=payload)
+    response = http_client.request("POST", url, headers=headers, data=payload)
     status_code = response.status_code
     if status_code == 200:
         # Parse the JSON response into a dictionary
@@ -4,11 +4,15 @@
 # createAccount.py
 
 import json
-import requests
 import logging
+from .httpclient import getHttpClient
+from .platforms import getPlatformRegistry
+from .urls import pcloudUrl
 
-def createAccount(prov_req):
+def createAccount(prov_req, http_client=None):
     logging.debug("================ createAccount() ================")
+    if http_client is None:
+        http_client = getHttpClient()
 
     # ensure provisioning request has accountValues, if not exit w/ error
     if prov_req.get("accountValues",None) is None:
@@ -19,13 +23,11 @@ def createAccount(prov_req):
         return_dict["response_body"] = err_msg
         return return_dict
 
-    # load platform dictionary from json file created with compileplats.py
-    # PLATFORM_FILE is a constant defined in getPlatform.py
+    # get platform dictionary from registry of platforms compiled with compileplats.py
     try:
-        with open(PLATFORM_FILE) as f_in:
-            platforms = json.load(f_in)
-    except IOError:
-        err_msg = f"Could not read file: {PLATFORM_FILE}"
+        platforms = getPlatformRegistry().platforms()
+    except (IOError, ValueError):
+        err_msg = f"Could not read file: {getPlatformRegistry().platform_file}"
         logging.error(err_msg)
         return_dict = {}
         return_dict["status_code"] = 500
@@ -85,13 +87,13 @@ def createAccount(prov_req):
 
     logging.debug(f"account_req: {account_req}")
 
-    url = f"https://{cybr_subdomain}.privilegecloud.cyberark.cloud/passwordvault/api/accounts"
+    url = f"{pcloudUrl(cybr_subdomain)}/passwordvault/api/accounts"
     payload = json.dumps(account_req)
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {session_token}",
     }
-    response = requests.request("POST", url, headers=headers, data=payload)
+    response = http_client.request("POST", url, headers=headers, data=payload)
     status_code = response.status_code
     logging.debug(response.text)
     if status_code != 201:
@@ -3,12 +3,15 @@
 # createSafe(prov_req)
 
 import json
-import requests
 import logging
+from .httpclient import getHttpClient
+from .urls import pcloudUrl
 
 
-def createSafe(prov_req):
+def createSafe(prov_req, http_client=None):
     logging.debug("================ createSafe() ================")
+    if http_client is None:
+        http_client = getHttpClient()
 
     # first ensure we have required request values
     required_keys = ["cybr_subdomain", "session_token", "safe_name"]
@@ -35,13 +38,13 @@ def createSafe(prov_req):
         "managingCPM": "",
         "numberOfDaysRetention": 0,
     }
-    url = f"https://{cybr_subdomain}.privilegecloud.cyberark.cloud/passwordvault/api/safes"
+    url = f"{pcloudUrl(cybr_subdomain)}/passwordvault/api/safes"
     payload = json.dumps(safe_req)
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {session_token}",
     }
-    response = requests.request("POST", url, headers=headers, data=payload)
+    response = http_client.request("POST", url, headers=headers, data=payload)
     status_code = response.status_code
     if status_code != 201:
         if status_code == 409:
@@ -0,0 +1,126 @@
+#############################################################################
+#############################################################################
+# deleteSHFilterForSafe.py
+
+import json
+import logging
+import requests
+from .httpclient import getHttpClient
+from .urls import secretsHubUrl
+
+# Tears down the Secrets Hub sync of a safe, as set up by getSHFilterForSafe()
+#   and getSHSyncPolicy().
+# Uses source_store_id and safename from provisioning request to find the safe's
+#   filters in the filter index, and their policies in the policy index, shared
+#   by all requests in this process (see getSHFilterIndex.py, getSHPolicyIndex.py).
+# Each policy is disabled (unless already disabled) and deleted, then the filter
+#   is deleted. Deleted filters & policies are removed from the indexes.
+# Returns status_code == 200 for success (also if the safe has no filter or the
+#   source store no longer exists), response_body with message, policy_ids &
+#   filter_ids deleted.
+
+# -------------------------------------------
+def deleteSHFilterForSafe(prov_req, http_client=None):
+    logging.debug("================ deleteSHFilterForSafe() ================")
+    if http_client is None:
+        http_client = getHttpClient()
+
+    # -------------------------------------------
+    # Sends Secrets Hub API request, returns (status_code, response text)
+    # NOTE: cybr_subdomain & session_token are global vars to this function
+    def shRequest(method, path, payload=None):
+        url = f"{secretsHubUrl(cybr_subdomain)}{path}"
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {session_token}",
+        }
+        data = None if payload is None else json.dumps(payload)
+        try:
+            response = http_client.request(method, url, headers=headers, data=data)
+            return response.status_code, response.text
+        except requests.RequestException as e:
+            return 500, str(e)
+
+    # -------------------------------------------
+    # Disables & deletes policy, returns (status_code, response_body)
+    def deletePolicy(policy):
+        policy_id = policy["id"]
+        if policy.get("state", {}).get("current", None) != "DISABLED":
+            status_code, response_text = shRequest("PUT", f"/api/policies/{policy_id}/state", {"action": "disable"})
+            if status_code not in [200, 204, 404]:
+                return status_code, f"Error disabling policy {policy_id}: {response_text}"
+        status_code, response_text = shRequest("DELETE", f"/api/policies/{policy_id}")
+        if status_code not in [200, 204, 404]:
+            return status_code, f"Error deleting policy {policy_id}: {response_text}"
+        policy_index.remove(policy_id)
+        return 200, f"Policy {policy_id} deleted."
+
+    # -------------------------------------------
+    # first ensure we have required request values
+    required_keys = ["cybr_subdomain", "session_token", "safe_name", "source_store_id"]
+    for rkey in required_keys:
+        input_val = prov_req.get(rkey, None)
+        if input_val is None:
+            response_body = f"Request is missing key required for Secrets Hub filter deletion: {rkey}"
+            logging.error(response_body)
+            return_dict = {}
+            return_dict["status_code"] = 400
+            return_dict["response_body"] = response_body
+            return_dict["policy_ids"] = []
+            return_dict["filter_ids"] = []
+            return return_dict
+
+    cybr_subdomain = prov_req["cybr_subdomain"]
+    session_token = prov_req["session_token"]
+    safe_name = prov_req["safe_name"]
+    source_store_id = prov_req["source_store_id"]
+
+    policy_ids = []
+    filter_ids = []
+    status_code = 200
+    response_body = f"No Secrets Hub filter for store ID {source_store_id} and safe {safe_name}."
+
+    # get filters of source store, indexed by safe name, and policies, indexed by filter
+    resp_dict = getSHFilterIndex(prov_req, http_client)
+    store_gone = resp_dict["status_code"] == 404    # and w/ it, its filters
+    if resp_dict["status_code"] == 200:
+        filter_index = resp_dict["filter_index"]
+        resp_dict = getSHPolicyIndex(prov_req, http_client)
+    if store_gone:
+        response_body = f"No Secrets Hub source store w/ ID {source_store_id}, no filter for safe {safe_name}."
+    elif resp_dict["status_code"] != 200:
+        status_code = resp_dict["status_code"]
+        response_body = resp_dict["response_body"]
+    else:
+        policy_index = resp_dict["policy_index"]
+        for sh_filter in filter_index.find(safe_name):
+            filter_id = sh_filter["id"]
+            # a filter cannot be deleted while policies use it
+            for policy in policy_index.findByFilter(filter_id):
+                status_code, response_body = deletePolicy(policy)
+                if status_code != 200:
+                    break
+                policy_ids.append(policy["id"])
+            if status_code != 200:
+                break
+            status_code, response_text = shRequest("DELETE", f"/api/secret-stores/{source_store_id}/filters/{filter_id}")
+            if status_code not in [200, 204, 404]:
+                response_body = f"Error deleting filter {filter_id}: {response_text}"
+                break
+            status_code = 200
+            filter_index.remove(filter_id)
+            filter_ids.append(filter_id)
+            response_body = (f"Deleted {len(filter_ids)} filter(s) and {len(policy_ids)} policy(ies) "
+                             f"for store ID {source_store_id} and safe {safe_name}.")
+
+    if status_code != 200:
+        logging.error(response_body)
+    logging.debug(f"\tpolicy_ids: {policy_ids}\n\tfilter_ids: {filter_ids}")
+    logging.debug(f"\tstatus_code: {status_code}\n\tresponse: {response_body}")
+
+    return_dict = {}
+    return_dict["status_code"] = status_code
+    return_dict["response_body"] = response_body
+    return_dict["policy_ids"] = policy_ids
+    return_dict["filter_ids"] = filter_ids
+    return return_dict
@@ -5,11 +5,14 @@
 
 import json
 import sys
-import requests
 import logging
+from .httpclient import getHttpClient
+from .urls import pcloudUrl
 
-def deleteSafe(prov_req):
+def deleteSafe(prov_req, http_client=None):
     logging.debug("================ deleteSafe() ================")
+    if http_client is None:
+        http_client = getHttpClient()
 
     # first ensure we have required request values
     required_keys = ["cybr_subdomain", "session_token", "safe_name"]
@@ -29,11 +32,11 @@ def deleteSafe(prov_req):
     status_code = 204
     response_body = f"Safe {safe_name} deleted successfully."
 
-    url = f"https://{cybr_subdomain}.privilegecloud.cyberark.cloud/passwordvault/api/safes/{safe_name}"
+    url = f"{pcloudUrl(cybr_subdomain)}/passwordvault/api/safes/{safe_name}"
     headers = {
         "Authorization": f"Bearer {session_token}",
     }
-    response = requests.request("DELETE", url, headers=headers)
+    response = http_client.request("DELETE", url, headers=headers)
     status_code = response.status_code
     if status_code != 204:
         if status_code == 404:
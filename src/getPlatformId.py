@@ -8,11 +8,33 @@ import logging
 # ====================================================
 # Constants
 PLATFORM_FILE = "./json/platforms.json"  # file with platform mapping k/v pairs
-# PLATFORM_FILE is also referenced in validateRequestWithPlatform.py and createAccount.py
+# PLATFORM_FILE is loaded by the registry in platformRegistry.py
 
 # ====================================================
-# Finds first platform where platform's searchpair values all match the provisioning request's
-# If found, returns status_code == 200 and platform id in response
+# Compiles platforms dictionary into a searchpair index.
+# Platforms are grouped by the sorted tuple of their searchpair keys (signature),
+# then keyed by the tuple of their uppercased searchpair values, so matching a
+# request costs one dictionary lookup per signature instead of a scan of every
+# platform's searchpairs. Signatures are ordered most specific (most keys) first.
+# Platforms without searchpairs never match a request and are not indexed.
+
+def compilePlatformIndex(platforms):
+    index = {}
+    for pid, plat in platforms.items():
+        search_pairs = plat["searchpairs"]
+        if len(search_pairs) == 0:
+            continue
+        keys = tuple(sorted(search_pairs.keys()))
+        values = tuple(str(search_pairs[k]).upper() for k in keys)
+        index.setdefault(keys, {}).setdefault(values, []).append(pid)
+    return sorted(index.items(), key=lambda sig: (-len(sig[0]), sig[0]))
+
+
+# ====================================================
+# Finds platform where platform's searchpair values all match the provisioning request's.
+# If platforms w/ different numbers of searchpairs match, the one w/ the most searchpairs wins.
+# If found, returns status_code == 200 and platform id in response.
+# If more than one equally specific platform matches, returns status_code == 300.
 
 
 def getPlatformId(prov_req):
@@ -29,11 +51,10 @@ def getPlatformId(prov_req):
             return_dict["status_code"] = 400
             return_dict["response_body"] = response_body
 
-    # load platform dictionary from json file created with compileplats.py
+    # get searchpair index from platform registry, loaded from PLATFORM_FILE once per process
     try:
-        with open(PLATFORM_FILE) as f_in:
-            platforms = json.load(f_in)
-    except IOError:
+        platform_index = getPlatformRegistry().index()
+    except (IOError, ValueError):
         response_body = f"Could not read file: {PLATFORM_FILE}"
         logging.error(response_body)
         return_dict = {}
@@ -44,30 +65,31 @@ def getPlatformId(prov_req):
     status_code = 200
     response_body = "Platform found."
 
-    # Find platform where platform search keys & values == request keys & values
-    plat_id = None
-    for pid in platforms.keys():  # top-level platforms keys are platform IDs
-        search_pairs = platforms[pid]["searchpairs"]
-        logging.debug(f"pid: {pid}, searchpairs: {search_pairs}")
-        # all k/v pairs in searchpairs must be found in the provisioning request for a match
-        pair_counter = len(search_pairs)
-        for pkey, pval in search_pairs.items():
-            logging.debug(f"\tpkey: {pkey}, pval: {pval}")
-            rval = prov_req.get(pkey, None)  # get value of key in request, if any
-            if rval is not None:
-                logging.debug(f"\tplatform: ({pkey},{pval}), request: ({pkey},{rval})")
-                if rval.upper() == pval.upper():
-                    pair_counter -= 1  # k/v matches, decrement searchpair counter
-                    if pair_counter == 0:  # if all k/v pairs have matched...
-                        plat_id = pid
-                        response_body = f"Matching platform ID: {plat_id}"
-                        break
-                else:
-                    break  # k/v does not match, on to next platform
-        if plat_id is not None:  # if platform found, stop searching
+    # Find platforms where platform search keys & values == request keys & values,
+    # one dictionary lookup per searchpair key signature, most specific signature first
+    plat_ids = []
+    match_len = 0
+    for keys, values_index in platform_index:
+        if len(keys) < match_len:  # less specific than a match already found
             break
+        rvals = [prov_req.get(pkey, None) for pkey in keys]
+        if None in rvals:
+            continue
+        pids = values_index.get(tuple(str(rval).upper() for rval in rvals), [])
+        logging.debug(f"\tsearchpair keys: {keys}, matching platforms: {pids}")
+        if pids:
+            plat_ids += pids
+            match_len = len(keys)
 
-    if plat_id is None:
+    if len(plat_ids) == 1:
+        plat_id = plat_ids[0]
+        response_body = f"Matching platform ID: {plat_id}"
+    elif len(plat_ids) > 1:
+        response_body = f"More than one platform has searchpairs that match request values: {plat_ids}"
+        logging.error(response_body)
+        status_code = 300
+        plat_id = "Ambiguous"
+    else:
         response_body = "No platform found with searchpairs that match request values."
         logging.error(response_body)
         status_code = 404
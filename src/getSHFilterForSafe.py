@@ -4,34 +4,41 @@
 
 import json
 import sys
-import requests
 import logging
+from .httpclient import getHttpClient
+from .urls import secretsHubUrl
 
 # Does not assume filter exists in Secrets Hub.
-# Uses source_store_id and safename from provisioning request to find policy filter for safe.
-# If filter doesn't exist, creates it.
+# Uses source_store_id and safename from provisioning request to find policy filter for safe
+#   in filter index shared by all requests in this process (see getSHFilterIndex.py).
+# If filter doesn't exist, creates it. If creating it conflicts (409), the filter was
+#   created since the index was retrieved, so the index is retrieved again once.
 # Returns status_code == 200 or 201 for success, response_body with message, filter_id.
 
 # -------------------------------------------
-def getSHFilterForSafe(prov_req):
+def getSHFilterForSafe(prov_req, http_client=None):
     logging.debug("================ getSHFilterForSafe() ================")
+    if http_client is None:
+        http_client = getHttpClient()
 
     # -------------------------------------------
-    # NOTE: cybr_subdomain, source_store_id, safe_name are global vars to this function
+    # NOTE: cybr_subdomain, source_store_id, safe_name, filter_index are global vars to this function
     def createSHFilterForSafe():
         logging.debug("================ createSHFilterForSafe() ================")
         filter_id = ""
-        url = f"https://{cybr_subdomain}.secretshub.cyberark.cloud/api/secret-stores/{source_store_id}/filters"
+        url = f"{secretsHubUrl(cybr_subdomain)}/api/secret-stores/{source_store_id}/filters"
         payload = json.dumps({"data": {"safeName": safe_name}, "type": "PAM_SAFE"})
         headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {session_token}",
         }
-        response = requests.request("POST", url, headers=headers, data=payload)
+        response = http_client.request("POST", url, headers=headers, data=payload)
         status_code = response.status_code
         if status_code == 201:
             filter_dict = json.loads(response.text)
             filter_id = filter_dict["id"]
+            # keep index current for later requests
+            filter_index.add({"id": filter_id, "type": "PAM_SAFE", "data": {"safeName": safe_name}})
             response_body = (
                 f"Filter for store ID {source_store_id} and safe {safe_name} created."
             )
@@ -65,30 +72,30 @@ def getSHFilterForSafe(prov_req):
     status_code = 0
     response_body = f"Source store filter for store ID {source_store_id} and safe {safe_name} retrieved successfully."
 
-    # get all filters
-    url = f"https://{cybr_subdomain}.secretshub.cyberark.cloud/api/secret-stores/{source_store_id}/filters"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {session_token}",
-    }
-    response = requests.request("GET", url, headers=headers)
-    status_code = response.status_code
+    # get filters of source store, indexed by safe name
+    resp_dict = getSHFilterIndex(prov_req, http_client)
+    status_code = resp_dict["status_code"]
     if status_code == 200:
         # see if filter already exists for safe
-        filters_dict = json.loads(response.text)
-        isFilter = lambda x: (
-            (x["type"] == "PAM_SAFE") & (x["data"]["safeName"] == safe_name)
-        )
-        foundFilter = [a for a in filters_dict["filters"] if isFilter(a)]
+        filter_index = resp_dict["filter_index"]
+        foundFilter = filter_index.find(safe_name)
         if len(foundFilter) == 0:  # filter does not exist - create it
             filter_id, status_code, response_body = createSHFilterForSafe()
-        elif len(foundFilter) == 1:  # filter already exists - use it
+            if status_code == 409:  # created elsewhere since index was retrieved - look it up again
+                resp_dict = getSHFilterIndex(prov_req, http_client, refresh=True)
+                if resp_dict["status_code"] == 200:
+                    filter_index = resp_dict["filter_index"]
+                    foundFilter = filter_index.find(safe_name)
+                    if len(foundFilter) > 0:
+                        status_code = 200
+                        response_body = f"Source store filter for store ID {source_store_id} and safe {safe_name} retrieved successfully."
+        if len(foundFilter) == 1:  # filter already exists - use it
             filter_id = foundFilter.pop()["id"]
-        else:  # more than one filter exists - ambiguous - should not happen
+        elif len(foundFilter) > 1:  # more than one filter exists - ambiguous - should not happen
             status_code = 300
             response_body = f"More than one filter already exists for store ID {source_store_id} and safe {safe_name}."
     else:
-        response_body = response.text
+        response_body = resp_dict["response_body"]
 
     logging.debug(f"\tfilter_id: {filter_id}")
     logging.debug(f"\tstatus_code: {status_code}\n\tresponse: {response_body}")
@@ -0,0 +1,112 @@
+#############################################################################
+#############################################################################
+# getSHFilterIndex.py
+
+import json
+import time
+import threading
+import logging
+from .httpclient import getHttpClient
+from .urls import secretsHubUrl
+
+# Filter indexes already retrieved by this process, keyed by (subdomain, source store ID)
+_sh_filter_indexes = {}
+_sh_filter_indexes_lock = threading.Lock()
+
+# ====================================================
+# PAM_SAFE filters of a Secrets Hub source store, indexed by safe name.
+# Filters created after the index was retrieved are added w/ add(), filters
+# deleted are removed w/ remove().
+
+class SHFilterIndex:
+
+    def __init__(self, filters):
+        self.by_safe = {}
+        self.by_id = {}
+        self.fetched = time.monotonic()
+        self._lock = threading.Lock()
+        for sh_filter in filters:
+            self.add(sh_filter)
+
+    # -------------------------------------------
+    def add(self, sh_filter):
+        if sh_filter.get("type", None) != "PAM_SAFE":
+            return
+        with self._lock:
+            self.by_safe.setdefault(sh_filter["data"]["safeName"], []).append(sh_filter)
+            self.by_id[sh_filter["id"]] = sh_filter
+
+    # -------------------------------------------
+    def remove(self, filter_id):
+        with self._lock:
+            sh_filter = self.by_id.pop(filter_id, None)
+            if sh_filter is None:
+                return
+            safe_name = sh_filter["data"]["safeName"]
+            sh_filters = [f for f in self.by_safe.get(safe_name, []) if f["id"] != filter_id]
+            if len(sh_filters) > 0:
+                self.by_safe[safe_name] = sh_filters
+            else:
+                self.by_safe.pop(safe_name, None)
+
+    # -------------------------------------------
+    def find(self, safe_name):
+        with self._lock:
+            return list(self.by_safe.get(safe_name, []))
+
+
+# ====================================================
+# Retrieves filters of source store in provisioning request once per process
+# and returns them indexed by safe name, so a batch of safes shares one listing.
+# Filters are retrieved again once older than SH_CACHE_TTL, or if refresh is set
+# (see getSHStoreCatalog.py).
+# Returns status_code == 200 for success, response_body w/ message, filter_index.
+
+def getSHFilterIndex(prov_req, http_client=None, refresh=False):
+    logging.debug("================ getSHFilterIndex() ================")
+    if http_client is None:
+        http_client = getHttpClient()
+
+    # first ensure we have required request values
+    required_keys = ["cybr_subdomain", "session_token", "source_store_id"]
+    for rkey in required_keys:
+        input_val = prov_req.get(rkey, None)
+        if input_val is None:
+            response_body = f"Request is missing key required for Secrets Hub filter retrieval: {rkey}"
+            logging.error(response_body)
+            return_dict = {}
+            return_dict["status_code"] = 400
+            return_dict["response_body"] = response_body
+            return_dict["filter_index"] = None
+            return return_dict
+
+    cybr_subdomain = prov_req["cybr_subdomain"]
+    session_token = prov_req["session_token"]
+    source_store_id = prov_req["source_store_id"]
+
+    status_code = 200
+    response_body = f"Filters for store ID {source_store_id} retrieved successfully."
+
+    with _sh_filter_indexes_lock:
+        filter_index = _sh_filter_indexes.get((cybr_subdomain, source_store_id), None)
+        if shCacheStale(filter_index, refresh):
+            url = f"{secretsHubUrl(cybr_subdomain)}/api/secret-stores/{source_store_id}/filters"
+            headers = {
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {session_token}",
+            }
+            response = http_client.request("GET", url, headers=headers)
+            status_code = response.status_code
+            if status_code == 200:
+                filter_index = SHFilterIndex(json.loads(response.text)["filters"])
+                _sh_filter_indexes[(cybr_subdomain, source_store_id)] = filter_index
+            else:
+                response_body = response.text
+
+    logging.debug(f"\tstatus_code: {status_code}\n\tresponse: {response_body}")
+
+    return_dict = {}
+    return_dict["status_code"] = status_code
+    return_dict["response_body"] = response_body
+    return_dict["filter_index"] = filter_index
+    return return_dict
@@ -0,0 +1,118 @@
+#############################################################################
+#############################################################################
+# getSHPolicyIndex.py
+
+import json
+import time
+import threading
+import logging
+from .httpclient import getHttpClient
+from .urls import secretsHubUrl
+
+# Policy indexes already retrieved by this process, keyed by subdomain
+_sh_policy_indexes = {}
+_sh_policy_indexes_lock = threading.Lock()
+
+# ====================================================
+# Secrets Hub sync policies, indexed by (source ID, target ID, filter ID)
+# and by filter ID. Policies created after the index was retrieved are added
+# w/ add(), policies deleted are removed w/ remove().
+
+class SHPolicyIndex:
+
+    def __init__(self, policies):
+        self.by_ids = {}
+        self.by_filter = {}
+        self.by_id = {}
+        self.fetched = time.monotonic()
+        self._lock = threading.Lock()
+        for policy in policies:
+            self.add(policy)
+
+    # -------------------------------------------
+    def add(self, policy):
+        ids = (policy["source"]["id"], policy["target"]["id"], policy["filter"]["id"])
+        with self._lock:
+            self.by_ids.setdefault(ids, []).append(policy)
+            self.by_filter.setdefault(policy["filter"]["id"], []).append(policy)
+            self.by_id[policy["id"]] = policy
+
+    # -------------------------------------------
+    def remove(self, policy_id):
+        with self._lock:
+            policy = self.by_id.pop(policy_id, None)
+            if policy is None:
+                return
+            ids = (policy["source"]["id"], policy["target"]["id"], policy["filter"]["id"])
+            for index, key in [(self.by_ids, ids), (self.by_filter, policy["filter"]["id"])]:
+                policies = [p for p in index.get(key, []) if p["id"] != policy_id]
+                if len(policies) > 0:
+                    index[key] = policies
+                else:
+                    index.pop(key, None)
+
+    # -------------------------------------------
+    def findByFilter(self, filter_id):
+        with self._lock:
+            return list(self.by_filter.get(filter_id, []))
+
+    # -------------------------------------------
+    def find(self, sstore_id, tstore_id, filter_id):
+        with self._lock:
+            return list(self.by_ids.get((sstore_id, tstore_id, filter_id), []))
+
+
+# ====================================================
+# Retrieves Secrets Hub sync policies once per process and returns them
+# indexed by source, target & filter IDs, so a batch shares one listing.
+# Policies are retrieved again once older than SH_CACHE_TTL, or if refresh is set
+# (see getSHStoreCatalog.py).
+# Returns status_code == 200 for success, response_body w/ message, policy_index.
+
+def getSHPolicyIndex(prov_req, http_client=None, refresh=False):
+    logging.debug("================ getSHPolicyIndex() ================")
+    if http_client is None:
+        http_client = getHttpClient()
+
+    # first ensure we have required request values
+    required_keys = ["cybr_subdomain", "session_token"]
+    for rkey in required_keys:
+        input_val = prov_req.get(rkey, None)
+        if input_val is None:
+            response_body = f"Request is missing key required for Secrets Hub policy retrieval: {rkey}"
+            logging.error(response_body)
+            return_dict = {}
+            return_dict["status_code"] = 400
+            return_dict["response_body"] = response_body
+            return_dict["policy_index"] = None
+            return return_dict
+
+    cybr_subdomain = prov_req["cybr_subdomain"]
+    session_token = prov_req["session_token"]
+
+    status_code = 200
+    response_body = "Sync policies retrieved successfully."
+
+    with _sh_policy_indexes_lock:
+        policy_index = _sh_policy_indexes.get(cybr_subdomain, None)
+        if shCacheStale(policy_index, refresh):
+            url = f"{secretsHubUrl(cybr_subdomain)}/api/policies"
+            headers = {
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {session_token}",
+            }
+            response = http_client.request("GET", url, headers=headers)
+            status_code = response.status_code
+            if status_code == 200:
+                policy_index = SHPolicyIndex(json.loads(response.text)["policies"])
+                _sh_policy_indexes[cybr_subdomain] = policy_index
+            else:
+                response_body = response.text
+
+    logging.debug(f"\tstatus_code: {status_code}\n\tresponse: {response_body}")
+
+    return_dict = {}
+    return_dict["status_code"] = status_code
+    return_dict["response_body"] = response_body
+    return_dict["policy_index"] = policy_index
+    return return_dict
@@ -2,17 +2,20 @@
 #############################################################################
 # getSHSourceStoreId.py
 
-import json
-import requests
+import time
 import logging
+from .httpclient import getHttpClient
 
 # Exactly one source store must already exist.
-# Uses values in onboarding_dict to retrieve source store ID from Secrets Hub
+# Uses values in onboarding_dict to retrieve source store ID from Secrets Hub store catalogue
+# If the catalogue shared by this process has no source store, it is retrieved again once.
 # Returns ID, status_code == 200 for success, response_body with message
 
 # -------------------------------------------
-def getSHSourceStoreId(prov_req):
+def getSHSourceStoreId(prov_req, http_client=None):
     logging.debug("================ getSHSourceStoreId() ================")
+    if http_client is None:
+        http_client = getHttpClient()
 
     # first ensure we have required request values
     required_keys = ["cybr_subdomain", "session_token"]
@@ -25,24 +28,18 @@ def getSHSourceStoreId(prov_req):
             return_dict["status_code"] = 400
             return_dict["response_body"] = response_body
 
-    cybr_subdomain = prov_req["cybr_subdomain"]
-    session_token = prov_req["session_token"]
-
     sstore_id = ""
     status_code = 200
     response_body = "Source store retrieved successfully"
 
-    url = f"https://{cybr_subdomain}.secretshub.cyberark.cloud/api/secret-stores"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {session_token}",
-    }
-    response = requests.request("GET", url, headers=headers)
-    status_code = response.status_code
+    started = time.monotonic()
+    resp_dict = getSHStoreCatalog(prov_req, http_client)
+    if (resp_dict["status_code"] == 200 and resp_dict["store_catalog"].fetched < started
+            and len(resp_dict["store_catalog"].sources()) == 0):
+        resp_dict = getSHStoreCatalog(prov_req, http_client, refresh=True)
+    status_code = resp_dict["status_code"]
     if status_code == 200:
-        stores_dict = json.loads(response.text)
-        isSource = lambda store: "SECRETS_SOURCE" in store["behaviors"]
-        foundSource = [store for store in stores_dict["secretStores"] if isSource(store)]
+        foundSource = list(resp_dict["store_catalog"].sources())
         if len(foundSource) == 0:
             status_code = 403
             response_body = "No secret source found."
@@ -52,7 +49,7 @@ def getSHSourceStoreId(prov_req):
         else:
             sstore_id = foundSource.pop()["id"]
     else:
-        response_body = response.text
+        response_body = resp_dict["response_body"]
 
     logging.debug(f"\tsstore_id: {sstore_id}")
     logging.debug(f"\tstatus_code: {status_code}\n\tresponse: {response_body}")
@@ -0,0 +1,162 @@
+#############################################################################
+#############################################################################
+# getSHStoreCatalog.py
+
+import os
+import json
+import time
+import threading
+import logging
+from .httpclient import getHttpClient
+from .urls import secretsHubUrl
+
+# ====================================================
+# Constants
+SH_STORE_CACHE_FILE = os.environ.get("CYBR_SH_STORE_CACHE",
+                        os.path.expanduser("~/.cybronboard/shstores.json"))
+SH_STORE_CACHE_TTL = int(os.environ.get("CYBR_SH_STORE_CACHE_TTL", "0"))  # seconds, 0 = no on-disk cache
+# seconds the in-process store catalog, filter & policy indexes are reused,
+# 0 = for the life of the process (one-shot scripts); onboardService.py defaults to 300
+SH_CACHE_TTL = int(os.environ.get("CYBR_SH_CACHE_TTL", "0"))
+
+# Store catalogues already retrieved by this process, keyed by subdomain
+_sh_store_catalogs = {}
+_sh_store_catalogs_lock = threading.Lock()
+
+# ====================================================
+# Secrets Hub secret stores, indexed by behavior (SECRETS_SOURCE, SECRETS_TARGET)
+# and by (type, accountId, regionId) for stores that have account & region data.
+
+class SHStoreCatalog:
+
+    def __init__(self, stores):
+        self.fetched = time.monotonic()
+        self.stores = stores
+        self.by_behavior = {}
+        self.by_location = {}
+        for store in stores:
+            for behavior in store.get("behaviors", []):
+                self.by_behavior.setdefault(behavior, []).append(store)
+            data = store.get("data", {})
+            if "accountId" in data and "regionId" in data:
+                location = (store["type"], str(data["accountId"]), data["regionId"])
+                self.by_location.setdefault(location, []).append(store)
+
+    # -------------------------------------------
+    def sources(self):
+        return self.by_behavior.get("SECRETS_SOURCE", [])
+
+    # -------------------------------------------
+    def targets(self, store_type, account_id, region_id):
+        stores = self.by_location.get((store_type, str(account_id), region_id), [])
+        return [s for s in stores if "SECRETS_TARGET" in s.get("behaviors", [])]
+
+
+# ====================================================
+# Returns True if cached store catalog, filter or policy index must be
+# retrieved again: none cached, refresh requested or older than SH_CACHE_TTL.
+
+def shCacheStale(cached, refresh=False):
+    if cached is None or refresh:
+        return True
+    return SH_CACHE_TTL > 0 and time.monotonic() - cached.fetched > SH_CACHE_TTL
+
+
+# ====================================================
+# Retrieves Secrets Hub secret stores once per process (per subdomain), again
+# once older than SH_CACHE_TTL or if refresh is set.
+# If SH_STORE_CACHE_TTL > 0, stores are also cached in SH_STORE_CACHE_FILE
+# and reused by other processes until the cached copy is older than the TTL;
+# refresh skips that copy.
+# Returns status_code == 200 for success, response_body w/ message, store_catalog.
+
+def getSHStoreCatalog(prov_req, http_client=None, refresh=False):
+    logging.debug("================ getSHStoreCatalog() ================")
+    if http_client is None:
+        http_client = getHttpClient()
+
+    # -------------------------------------------
+    def readCachedStores():
+        if SH_STORE_CACHE_TTL <= 0 or refresh:
+            return None
+        try:
+            with open(SH_STORE_CACHE_FILE) as f_in:
+                cached = json.load(f_in).get(cybr_subdomain, None)
+        except (IOError, ValueError):
+            return None
+        if cached is None or time.time() - cached["fetched"] > SH_STORE_CACHE_TTL:
+            return None
+        return cached["secretStores"]
+
+    # -------------------------------------------
+    def writeCachedStores(stores):
+        if SH_STORE_CACHE_TTL <= 0:
+            return
+        try:
+            with open(SH_STORE_CACHE_FILE) as f_in:
+                cache = json.load(f_in)
+        except (IOError, ValueError):
+            cache = {}
+        cache[cybr_subdomain] = {"fetched": time.time(), "secretStores": stores}
+        try:
+            cache_dir = os.path.dirname(SH_STORE_CACHE_FILE)
+            if cache_dir:         # "" for a file in the current directory
+                os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+            tmp_file = f"{SH_STORE_CACHE_FILE}.{os.getpid()}.tmp"
+            fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f_out:
+                json.dump(cache, f_out)
+            os.replace(tmp_file, SH_STORE_CACHE_FILE)
+        except OSError as e:
+            logging.error(f"Could not write Secrets Hub store cache {SH_STORE_CACHE_FILE}: {e}")
+
+    # -------------------------------------------
+    # first ensure we have required request values
+    required_keys = ["cybr_subdomain", "session_token"]
+    for rkey in required_keys:
+        input_val = prov_req.get(rkey, None)
+        if input_val is None:
+            response_body = f"Request is missing key required for Secrets Hub store retrieval: {rkey}"
+            logging.error(response_body)
+            return_dict = {}
+            return_dict["status_code"] = 400
+            return_dict["response_body"] = response_body
+            return_dict["store_catalog"] = None
+            return return_dict
+
+    cybr_subdomain = prov_req["cybr_subdomain"]
+    session_token = prov_req["session_token"]
+
+    status_code = 200
+    response_body = "Secret stores retrieved successfully"
+
+    with _sh_store_catalogs_lock:
+        store_catalog = _sh_store_catalogs.get(cybr_subdomain, None)
+        if shCacheStale(store_catalog, refresh):
+            stores = readCachedStores()
+            if stores is None:
+                url = f"{secretsHubUrl(cybr_subdomain)}/api/secret-stores"
+                headers = {
+                    "Content-Type": "application/json",
+                    "Authorization": f"Bearer {session_token}",
+                }
+                response = http_client.request("GET", url, headers=headers)
+                status_code = response.status_code
+                if status_code == 200:
+                    stores = json.loads(response.text)["secretStores"]
+                    writeCachedStores(stores)
+                else:
+                    response_body = response.text
+            else:
+                logging.debug(f"\tusing secret stores cached in {SH_STORE_CACHE_FILE}")
+            if stores is not None:
+                store_catalog = SHStoreCatalog(stores)
+                _sh_store_catalogs[cybr_subdomain] = store_catalog
+
+    logging.debug(f"\tstatus_code: {status_code}\n\tresponse: {response_body}")
+
+    return_dict = {}
+    return_dict["status_code"] = status_code
+    return_dict["response_body"] = response_body
+    return_dict["store_catalog"] = store_catalog
+    return return_dict
@@ -4,25 +4,33 @@
 
 import json
 import sys
-import requests
 import logging
+from .httpclient import getHttpClient
+from .urls import secretsHubUrl
 
 # Does not assume sync policy exists in Secrets Hub.
-# Uses IDs from dict to find existing policy.
-# If policy not fount, creates it.
+# Uses IDs from dict to find existing policy in policy index shared by
+#   all requests in this process (see getSHPolicyIndex.py).
+# If policy not fount, creates it. If creating it conflicts (409), the policy was
+#   created since the index was retrieved, so the index is retrieved again once.
+#   If the source, target or filter is not found (404), the store catalogue and
+#   filter index are retrieved again for later requests.
 # Returns policy_id, status_code == 200 or 201 for success, response_body with message
 
 
 # -------------------------------------------
-def getSHSyncPolicy(prov_req):
+def getSHSyncPolicy(prov_req, http_client=None):
     logging.debug("================ getSHSyncPolicy() ================")
+    if http_client is None:
+        http_client = getHttpClient()
 
     # -------------------------------------------
     def createSHSyncPolicy(
         cybr_subdomain, session_token, sstore_id, tstore_id, filter_id
     ):
         # should probably get source, target, filter names for policy name/description
-        url = f"https://{cybr_subdomain}.secretshub.cyberark.cloud/api/policies"
+        policy_id = ""
+        url = f"{secretsHubUrl(cybr_subdomain)}/api/policies"
         payload = json.dumps(
             {
                 "name": "ASM policy",
@@ -36,11 +44,19 @@ def getSHSyncPolicy(prov_req):
             "Content-Type": "application/json",
             "Authorization": f"Bearer {session_token}",
         }
-        response = requests.request("POST", url, headers=headers, data=payload)
+        response = http_client.request("POST", url, headers=headers, data=payload)
         status_code = response.status_code
         if status_code == 201:
             policy_dict = json.loads(response.text)
             policy_id = policy_dict["id"]
+            # keep index current for later requests, new policies are enabled
+            policy_index.add({
+                "id": policy_id,
+                "source": {"id": sstore_id},
+                "target": {"id": tstore_id},
+                "filter": {"id": filter_id},
+                "state": policy_dict.get("state", {"current": "ENABLED"}),
+            })
             response_body = f"Policy with source ID {sstore_id}, target ID {tstore_id}, filter ID {filter_id} created."
         else:
             status_code = response.status_code
@@ -79,37 +95,39 @@ def getSHSyncPolicy(prov_req):
     status_code = 200
     response_body = "Sync policy retrieved successfully"
 
-    url = f"https://{cybr_subdomain}.secretshub.cyberark.cloud/api/policies"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {session_token}",
-    }
-    response = requests.request("GET", url, headers=headers)
-    status_code = response.status_code
+    resp_dict = getSHPolicyIndex(prov_req, http_client)
+    status_code = resp_dict["status_code"]
     if status_code == 200:
-        policies_dict = json.loads(response.text)
-        isPolicy = lambda x: (
-            ((x["source"]["id"] == sstore_id)
-            & (x["target"]["id"] == tstore_id)
-            & (x["filter"]["id"] == filter_id))
-        )
-        foundPolicy = [a for a in policies_dict["policies"] if isPolicy(a)]
+        policy_index = resp_dict["policy_index"]
+        foundPolicy = policy_index.find(sstore_id, tstore_id, filter_id)
         if len(foundPolicy) == 0:  # policy not found - create it
             policy_id, status_code, response_body = createSHSyncPolicy(
                 cybr_subdomain, session_token, sstore_id, tstore_id, filter_id
             )
-        elif len(foundPolicy) > 1:
+            if status_code == 409:  # created elsewhere since index was retrieved - look it up again
+                resp_dict = getSHPolicyIndex(prov_req, http_client, refresh=True)
+                if resp_dict["status_code"] == 200:
+                    policy_index = resp_dict["policy_index"]
+                    foundPolicy = policy_index.find(sstore_id, tstore_id, filter_id)
+                    if len(foundPolicy) > 0:
+                        status_code = 200
+                        response_body = "Sync policy retrieved successfully"
+            elif status_code == 404:
+                # store or filter deleted since they were retrieved, later requests see current ones
+                getSHStoreCatalog(prov_req, http_client, refresh=True)
+                getSHFilterIndex(prov_req, http_client, refresh=True)
+        if len(foundPolicy) > 1:
             status_code = 300
             response_body = f"More than one sync policy found for source ID {sstore_id}, filter ID {filter_id}, target ID {tstore_id}."
             policy_id = foundPolicy.pop()["id"]
-        else:
+        elif len(foundPolicy) == 1:
             policy = foundPolicy.pop()
             policy_id = policy["id"]
             if policy["state"]["current"] != "ENABLED":
                 status_code = 409
                 response_body = f"Policy ID {policy_id} is not currently enabled."
     else:
-        response_body = response.text
+        response_body = resp_dict["response_body"]
 
     logging.debug(f"\tpolicy_id: {policy_id}")
     logging.debug(f"\tstatus_code: {status_code}\n\tresponse: {response_body}")
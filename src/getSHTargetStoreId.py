@@ -2,16 +2,20 @@
 #############################################################################
 # getSHTargetStoreId.py
 
-import json
-import requests
+import time
 import logging
+from .httpclient import getHttpClient
 
 # Exactly one target store for account/region must already exist in Secrets Hub.
 # Uses account and region ID from provisioning request to find existing target store.
+# If the store catalog shared by this process has no such store, the catalog is
+# retrieved again once, so stores created since it was retrieved are found.
 # Returns status_code == 200 for success, response_body with message and tstore_id
 
-def getSHTargetStoreId(prov_req):
+def getSHTargetStoreId(prov_req, http_client=None):
     logging.debug("================ getSHTargetStoreId() ================")
+    if http_client is None:
+        http_client = getHttpClient()
 
     # first ensure we have required request values
     required_keys = [
@@ -29,8 +33,6 @@ def getSHTargetStoreId(prov_req):
             return_dict["status_code"] = 400
             return_dict["response_body"] = response_body
 
-    cybr_subdomain = prov_req["cybr_subdomain"]
-    session_token = prov_req["session_token"]
     account_id = str(prov_req["cloudAccount"])     # str() needed in case acct# is not quoted
     region_id = prov_req["cloudRegion"]
 
@@ -38,29 +40,17 @@ def getSHTargetStoreId(prov_req):
     status_code = 200
     response_body = "Target store retrieved successfully"
 
-    url = f"https://{cybr_subdomain}.secretshub.cyberark.cloud/api/secret-stores"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {session_token}",
-    }
-    response = requests.request("GET", url, headers=headers)
-    status_code = response.status_code
+    # NEEDS REVISITING TO SUPPORT AZURE & GCP
+    # look up AWS target stores for account/region
+    started = time.monotonic()
+    resp_dict = getSHStoreCatalog(prov_req, http_client)
+    if (resp_dict["status_code"] == 200 and resp_dict["store_catalog"].fetched < started
+            and len(resp_dict["store_catalog"].targets("AWS_ASM", account_id, region_id)) == 0):
+        resp_dict = getSHStoreCatalog(prov_req, http_client, refresh=True)
+    status_code = resp_dict["status_code"]
     if status_code == 200:
-        stores_dict = json.loads(response.text)
-
-        # NEEDS REVISITING TO SUPPORT AZURE & GCP
-        # filter out Source & non-AWS stores because they don't have entries for AWS account/region
-        isAwsTarget = lambda x: (
-            (x["type"] == "AWS_ASM") & ("SECRETS_TARGET" in x["behaviors"])
-        )
-        allAwsTargets = [t for t in stores_dict["secretStores"] if isAwsTarget(t)]
-        logging.debug(f"allAwsTargets: {allAwsTargets}")
-
-        isTheTarget = lambda x: (
-            (x["data"]["accountId"] == account_id)
-            & (x["data"]["regionId"] == region_id)
-        )
-        foundTarget = [a for a in allAwsTargets if isTheTarget(a)]
+        foundTarget = resp_dict["store_catalog"].targets("AWS_ASM", account_id, region_id)
+        logging.debug(f"foundTarget: {foundTarget}")
         if len(foundTarget) == 0:
             status_code = 404
             response_body = f"Target store not found for account {account_id} and region {region_id}."
@@ -68,9 +58,9 @@ def getSHTargetStoreId(prov_req):
             status_code = 300
             response_body = f"More than one target store found for account {account_id} and region {region_id}."
         else:
-            tstore_id = foundTarget.pop()["id"]
+            tstore_id = foundTarget[0]["id"]
     else:
-        response_body = response.text
+        response_body = resp_dict["response_body"]
 
     logging.debug(f"\ttstore_id: {tstore_id}")
     logging.debug(f"\tstatus_code: {status_code}\n\tresponse: {response_body}")
@@ -0,0 +1,40 @@
+#############################################################################
+#############################################################################
+# loadProvRequests.py
+
+import os
+import json
+import glob
+import logging
+
+# ====================================================
+# Reads provisioning requests from a directory (all *.json files in it),
+# a JSONL file (one request per line), a single JSON file, or a glob pattern
+# matching any of those.
+# Yields (request_id, prov_req) tuples, where request_id is the file name,
+# or file name and line number for JSONL files.
+# Raises IOError/ValueError if a request cannot be read.
+
+def loadProvRequests(source):
+    logging.debug("================ loadProvRequests() ================")
+
+    if os.path.isdir(source):
+        filenames = sorted(glob.glob(os.path.join(source, "*.json")))
+    elif os.path.exists(source):
+        filenames = [source]
+    else:
+        filenames = sorted(glob.glob(source))
+        if len(filenames) == 0:
+            raise IOError(f"No provisioning requests found for: {source}")
+
+    for filename in filenames:
+        if os.path.isdir(filename):
+            yield from loadProvRequests(filename)
+        elif filename.endswith(".jsonl"):
+            with open(filename) as f_in:
+                for lineno, line in enumerate(f_in, start=1):
+                    if line.strip() != "":
+                        yield f"{filename}:{lineno}", json.loads(line)
+        else:
+            with open(filename) as f_in:
+                yield filename, json.load(f_in)
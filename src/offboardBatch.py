@@ -0,0 +1,112 @@
+#############################################################################
+#############################################################################
+# offboardBatch.py
+
+import os
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from .auth import authnCyberarkCached, getAuthnCreds
+from .httpclient import getHttpClient
+from .naming import getSafeNames
+from .secretshub import getSHFilterIndex, getSHPolicyIndex, getSHSourceStoreId
+from .tracing import traceSpan
+
+# ====================================================
+# Constants
+OFFBOARD_WORKERS = int(os.environ.get("CYBR_OFFBOARD_WORKERS", "8"))   # safes offboarded in parallel
+
+# ====================================================
+# Offboards a batch of (request_id, prov_req) tuples w/ offboardRequest().
+# Requests are grouped by the safe name getSafeName() generates for them and
+# each safe is offboarded once, on one of max_workers threads; all requests
+# for a safe get that safe's result. Account deletes within a safe run in
+# parallel too (see deleteAccount.py).
+# The Secrets Hub store, filter & policy indexes are retrieved once, before any
+# safe is offboarded, and shared by all safes, if any request has a cloudAccount
+# & cloudRegion.
+# result_callback(request_id, prov_req, resp_dict), if given, is called from the
+# worker threads as each request completes.
+# Returns list of (request_id, resp_dict) tuples in batch order.
+
+def offboardBatch(prov_reqs, admin_creds=None, max_workers=None, http_client=None, result_callback=None):
+    logging.debug("================ offboardBatch() ================")
+    if http_client is None:
+        http_client = getHttpClient()
+    if max_workers is None:
+        max_workers = OFFBOARD_WORKERS
+
+    results = {}
+    results_lock = threading.Lock()
+
+    # -------------------------------------------
+    def finishRequest(idx, request_id, prov_req, resp_dict):
+        with results_lock:
+            results[idx] = (request_id, resp_dict)
+        if result_callback is not None:
+            result_callback(request_id, prov_req, resp_dict)
+
+    # -------------------------------------------
+    def hasCloudTarget(prov_req):
+        return prov_req.get("cloudAccount", None) is not None and prov_req.get("cloudRegion", None) is not None
+
+    # -------------------------------------------
+    # offboards safe of one group of requests, values of the first request w/ a
+    # cloud target are used (so the safe's Secrets Hub sync is torn down), else
+    # those of the first request
+    def runGroup(group):
+        first_req = next((prov_req for idx, request_id, prov_req in group if hasCloudTarget(prov_req)), group[0][2])
+        with traceSpan("offboardBatch safe", request_id=group[0][1] or ""):
+            resp_dict = offboardRequest(first_req, admin_creds, http_client)
+        for idx, request_id, prov_req in group:
+            if prov_req is not first_req:
+                prov_req.update({k: first_req[k] for k in ["safe_name", "source_store_id"] if k in first_req})
+            finishRequest(idx, request_id, prov_req, resp_dict)
+
+    # -------------------------------------------
+    # retrieves Secrets Hub indexes once, so safes offboarded in parallel don't queue on them
+    def prefetchIndexes():
+        creds = admin_creds
+        if creds is None:
+            resp_dict = getAuthnCreds()
+            if resp_dict["status_code"] != 200:
+                return
+            creds = resp_dict["admin_creds"]
+        resp_dict = authnCyberarkCached(creds, http_client)
+        if resp_dict["status_code"] != 200:
+            return
+        sh_req = {"cybr_subdomain": creds["cybr_subdomain"], "session_token": resp_dict["session_token"]}
+        resp_dict = getSHSourceStoreId(sh_req, http_client)
+        if resp_dict["status_code"] != 200:
+            return
+        sh_req["source_store_id"] = resp_dict["store_id"]
+        getSHFilterIndex(sh_req, http_client)
+        getSHPolicyIndex(sh_req, http_client)
+
+    # MAIN ====================================================
+    prov_reqs = list(prov_reqs)
+    name_dicts = getSafeNames([prov_req for request_id, prov_req in prov_reqs])
+
+    # group requests by safe name, requests that cannot be named fail right away
+    groups = {}
+    for idx, ((request_id, prov_req), name_dict) in enumerate(zip(prov_reqs, name_dicts)):
+        if name_dict["status_code"] != 200:
+            resp_dict = {}
+            resp_dict["status_code"] = name_dict["status_code"]
+            resp_dict["response_body"] = f"Step safe_name failed: {name_dict['response_body']}"
+            resp_dict["steps"] = []
+            finishRequest(idx, request_id, prov_req, resp_dict)
+        else:
+            groups.setdefault(name_dict["safe_name"], []).append((idx, request_id, prov_req))
+
+    # failures here surface again in each request's own steps
+    if any(hasCloudTarget(prov_req) for group in groups.values() for idx, request_id, prov_req in group):
+        with traceSpan("offboardBatch prefetch"):
+            prefetchIndexes()
+
+    logging.info(f"Offboarding {len(groups)} safe(s) for {len(prov_reqs)} request(s) w/ {max_workers} worker(s)")
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        for future in [pool.submit(runGroup, g) for g in groups.values()]:
+            future.result()
+
+    return [results[idx] for idx in range(len(prov_reqs))]
@@ -0,0 +1,159 @@
+#############################################################################
+#############################################################################
+# offboardRequest.py
+
+import time
+import logging
+from .accounts import deleteSafeAccounts
+from .auth import authnCyberarkCached, getAuthnCreds
+from .httpclient import getHttpClient
+from .naming import getSafeName
+from .safes import deleteSafe
+from .secretshub import deleteSHFilterForSafe, getSHSourceStoreId, getSHStoreCatalog
+from .tracing import getTracer, traceSpan
+from .workflow import runWorkflow
+
+# ====================================================
+# Runs the complete offboarding workflow for one provisioning request in-process,
+# undoing what onboardRequest() set up:
+#   safe name -> authenticate
+#   -> Secrets Hub source store, disable & delete sync policies, delete filter of safe
+#      (if cloudAccount & cloudRegion in request)
+#   -> delete all accounts in safe -> delete safe
+# The safe is only deleted once its Secrets Hub sync is torn down and it has no
+# accounts left. A tenant w/o source store or a safe w/o filter has no sync to
+# tear down. Safes that no longer exist count as offboarded, so a run that
+# stopped part way can simply be repeated.
+# Authentication, HTTP connections, naming rules and the Secrets Hub store,
+# filter & policy indexes are shared by all requests offboarded by the same
+# process. admin_creds default to getAuthnCreds().
+# The request and each step are traced as spans (see traceSpans.py).
+# Returns status_code == 200 if all steps succeeded (else status_code of the failed step),
+# response_body w/ message, steps w/ step, status_code, response_body & seconds of each
+# step, policy_ids & filter_ids deleted and accounts_deleted.
+
+def offboardRequest(prov_req, admin_creds=None, http_client=None):
+    with traceSpan("offboardRequest") as request_span:
+        return runWorkflow(offboardWorkflow(request_span, prov_req, admin_creds, http_client))
+
+
+# ====================================================
+# offboardRequest() as a workflow generator (see runWorkflow.py): yields each
+# blocking step as a function w/o arguments that may run on any thread. Step
+# spans are children of request_span. Returns offboardRequest()'s dictionary.
+
+def offboardWorkflow(request_span, prov_req, admin_creds=None, http_client=None):
+    logging.debug("================ offboardRequest() ================")
+    if http_client is None:
+        http_client = getHttpClient()
+
+    steps = []
+    results = {"policy_ids": [], "filter_ids": [], "accounts_deleted": 0}
+
+    # -------------------------------------------
+    def recordStep(step, status_code, response_body, seconds):
+        step_result = {}
+        step_result["step"] = step
+        step_result["status_code"] = status_code
+        step_result["response_body"] = response_body
+        step_result["seconds"] = round(seconds, 6)
+        steps.append(step_result)
+
+    # -------------------------------------------
+    # returns function that runs step func(*args), traced & recorded, returns its response dict
+    def stepCall(step, expected, func, *args):
+        def call():
+            with getTracer().attach(request_span), traceSpan(f"step {step}", step=step) as span:
+                start = time.perf_counter()
+                resp_dict = func(*args)
+                recordStep(step, resp_dict["status_code"], resp_dict["response_body"], time.perf_counter() - start)
+                span.set("status_code", resp_dict["status_code"])
+                if resp_dict["status_code"] not in expected:
+                    span.fail(str(resp_dict["response_body"]))
+            return resp_dict
+        return call
+
+    # -------------------------------------------
+    # runs one workflow step, returns its response dict, or None if step failed
+    def runStep(step, expected, func, *args):
+        resp_dict = yield stepCall(step, expected, func, *args)
+        if resp_dict["status_code"] not in expected:
+            logging.error(f"{step}: {resp_dict['response_body']}")
+            return None
+        return resp_dict
+
+    # -------------------------------------------
+    # getSHSourceStoreId() w/ status_code 404 if the store catalog was read but has
+    # no source store, which it reports as 403 like a refused catalog request
+    def getSourceStore(prov_req, http_client):
+        resp_dict = getSHSourceStoreId(prov_req, http_client)
+        if resp_dict["status_code"] == 403 and getSHStoreCatalog(prov_req, http_client)["status_code"] == 200:
+            resp_dict["status_code"] = 404
+        return resp_dict
+
+    # -------------------------------------------
+    def workflow():
+        resp_dict = yield from runStep("safe_name", [200], getSafeName, prov_req)
+        if resp_dict is None:
+            return False
+        prov_req["safe_name"] = resp_dict["safe_name"]
+
+        creds = admin_creds
+        if creds is None:
+            resp_dict = yield from runStep("authn_creds", [200], getAuthnCreds)
+            if resp_dict is None:
+                return False
+            creds = resp_dict["admin_creds"]
+        resp_dict = yield from runStep("authenticate", [200], authnCyberarkCached, creds, http_client)
+        if resp_dict is None:
+            return False
+        prov_req["session_token"] = resp_dict["session_token"]
+        prov_req["cybr_subdomain"] = creds["cybr_subdomain"]
+
+        if prov_req.get("cloudAccount", None) is not None and prov_req.get("cloudRegion", None) is not None:
+            resp_dict = yield from runStep("source_store", [200, 404], getSourceStore, prov_req, http_client)
+            if resp_dict is None:
+                return False
+            if resp_dict["status_code"] == 200:
+                prov_req["source_store_id"] = resp_dict["store_id"]
+                resp_dict = yield from runStep("sh_teardown", [200], deleteSHFilterForSafe, prov_req, http_client)
+                if resp_dict is None:
+                    return False
+                results["policy_ids"] = resp_dict["policy_ids"]
+                results["filter_ids"] = resp_dict["filter_ids"]
+
+        resp_dict = yield from runStep("accounts", [200], deleteSafeAccounts, prov_req, http_client)
+        if resp_dict is None:
+            return False
+        results["accounts_deleted"] = resp_dict["deleted"]
+
+        return (yield from runStep("safe", [204, 404], deleteSafe, prov_req, http_client)) is not None
+
+    # MAIN ====================================================
+    try:
+        succeeded = yield from workflow()
+    except Exception as e:      # e.g. connection errors, unexpected API responses
+        logging.exception("Offboarding workflow failed")
+        recordStep("exception", 500, f"{type(e).__name__}: {e}", 0.0)
+        succeeded = False
+    request_span.set("safe_name", prov_req.get("safe_name", ""))
+    request_span.set("status_code", 200 if succeeded else steps[-1]["status_code"])
+    if not succeeded:
+        request_span.fail(f"step {steps[-1]['step']} failed")
+
+    if succeeded:
+        status_code = 200
+        response_body = (f"Safe {prov_req['safe_name']} offboarded: {results['accounts_deleted']} account(s), "
+                         f"{len(results['filter_ids'])} filter(s), {len(results['policy_ids'])} policy(ies) deleted.")
+    else:
+        status_code = steps[-1]["status_code"]
+        response_body = f"Step {steps[-1]['step']} failed: {steps[-1]['response_body']}"
+
+    logging.debug(f"\tstatus_code: {status_code}\n\tresponse: {response_body}")
+
+    return_dict = {}
+    return_dict["status_code"] = status_code
+    return_dict["response_body"] = response_body
+    return_dict["steps"] = steps
+    return_dict.update(results)
+    return return_dict
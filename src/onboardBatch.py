@@ -0,0 +1,144 @@
+#############################################################################
+#############################################################################
+# onboardBatch.py
+
+import os
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from .httpclient import getHttpClient
+from .naming import getSafeNames
+from .tracing import traceSpan
+
+# ====================================================
+# Constants
+BATCH_WORKERS = int(os.environ.get("CYBR_BATCH_WORKERS", "4"))   # safes onboarded in parallel
+SAFE_STEPS = ["safe", "safe_members"]                          # done once per safe
+SH_STEPS = ["source_store", "target_store", "filter", "sync_policy"]  # once per safe & cloud target
+MEMBER_KEYS = ["safeAdmins", "safeFullUsers", "syncMembers"]
+
+# ====================================================
+# Onboards a batch of (request_id, prov_req) tuples w/ onboardRequest().
+# Requests are partitioned by the safe name getSafeName() generates for them.
+# Partitions run concurrently on max_workers threads; the requests of one
+# partition run one after another, in batch order, so each safe is created and
+# populated before its accounts are added.
+# Within a partition, safe & member steps run only for the first request, whose
+# member lists are extended w/ the members of all other requests for that safe,
+# and Secrets Hub steps run only once per cloudAccount/cloudRegion.
+# result_callback(request_id, prov_req, resp_dict), if given, is called from the
+# worker threads as each request completes.
+# If journal (an OnboardJournal) is given, every completed step is journaled and
+# steps journaled by an earlier run are skipped, w/ the values they produced.
+# safe_members is journaled w/ the members it added and only skipped if those
+# cover the partition's merged members, so members of requests added to the
+# batch since are still provisioned.
+# Returns list of (request_id, resp_dict) tuples in batch order.
+
+def onboardBatch(prov_reqs, admin_creds=None, max_workers=None, http_client=None, result_callback=None,
+                 journal=None):
+    logging.debug("================ onboardBatch() ================")
+    if http_client is None:
+        http_client = getHttpClient()
+    if max_workers is None:
+        max_workers = BATCH_WORKERS
+
+    results = {}
+    results_lock = threading.Lock()
+
+    # -------------------------------------------
+    def finishRequest(idx, request_id, prov_req, resp_dict):
+        with results_lock:
+            results[idx] = (request_id, resp_dict)
+        if result_callback is not None:
+            result_callback(request_id, prov_req, resp_dict)
+
+    # -------------------------------------------
+    # merges member lists of all requests in partition into its first request,
+    # returns merged lists, {member key: members}
+    def mergeMembers(partition):
+        first_req = partition[0][2]
+        merged = {}
+        for mkey in MEMBER_KEYS:
+            members = []
+            for idx, request_id, prov_req in partition:
+                for mbr in prov_req.get(mkey, None) or []:
+                    if mbr not in members:
+                        members.append(mbr)
+            if len(members) > 0:
+                first_req[mkey] = members
+            merged[mkey] = members
+        return merged
+
+    # -------------------------------------------
+    # returns steps journaled for request, w/o safe_members unless the members
+    # it added cover merged members
+    def journaledSteps(idx, merged):
+        steps = journal.completed(request_keys[idx])
+        if "safe_members" in steps:
+            added = steps["safe_members"].get("members", {})
+            if all(mbr in added.get(mkey, []) for mkey, members in merged.items() for mbr in members):
+                steps["safe_members"] = {}
+            else:
+                del steps["safe_members"]
+        return steps
+
+    # -------------------------------------------
+    def journalStep(idx, request_id, prov_req, step, outputs):
+        if step == "safe_members":
+            outputs = dict(outputs, members={mkey: prov_req.get(mkey, None) or [] for mkey in MEMBER_KEYS})
+        journal.record(request_keys[idx], request_id, step, outputs)
+
+    # -------------------------------------------
+    # onboards requests of one partition (same safe) in order
+    def runPartition(partition):
+        merged = mergeMembers(partition)
+        completed = {}
+        sh_completed = {}   # (cloudAccount, cloudRegion) -> completed SH steps
+        for idx, request_id, prov_req in partition:
+            cloud = (str(prov_req.get("cloudAccount", None)), prov_req.get("cloudRegion", None))
+            req_completed = dict(completed)
+            req_completed.update(sh_completed.get(cloud, {}))
+            on_step = None
+            if journal is not None:
+                req_completed.update(journaledSteps(idx, merged))
+                on_step = lambda step, outputs, idx=idx, request_id=request_id, prov_req=prov_req: \
+                    journalStep(idx, request_id, prov_req, step, outputs)
+            with traceSpan("onboardBatch request", request_id=request_id):
+                resp_dict = onboardRequest(prov_req, admin_creds, http_client, req_completed, on_step)
+            # outputs only has steps that succeeded, even if a later step failed
+            done = dict(req_completed)
+            done.update(resp_dict["outputs"])
+            for step in SAFE_STEPS:
+                if step in done:
+                    completed[step] = done[step]
+            for step in SH_STEPS:
+                if step in done:
+                    sh_completed.setdefault(cloud, {})[step] = done[step]
+            finishRequest(idx, request_id, prov_req, resp_dict)
+
+    # MAIN ====================================================
+    prov_reqs = list(prov_reqs)
+    # journal keys are computed before requests are augmented or their members merged
+    request_keys = [journalKey(prov_req) for request_id, prov_req in prov_reqs]
+    name_dicts = getSafeNames([prov_req for request_id, prov_req in prov_reqs])
+
+    # partition requests by safe name, requests that cannot be named fail right away
+    partitions = {}
+    for idx, ((request_id, prov_req), name_dict) in enumerate(zip(prov_reqs, name_dicts)):
+        if name_dict["status_code"] != 200:
+            resp_dict = {}
+            resp_dict["status_code"] = name_dict["status_code"]
+            resp_dict["response_body"] = f"Step safe_name failed: {name_dict['response_body']}"
+            resp_dict["steps"] = []
+            resp_dict["outputs"] = {}
+            finishRequest(idx, request_id, prov_req, resp_dict)
+        else:
+            partitions.setdefault(name_dict["safe_name"], []).append((idx, request_id, prov_req))
+
+    logging.info(f"Onboarding {len(prov_reqs)} request(s) for {len(partitions)} safe(s) w/ {max_workers} worker(s)")
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        for future in [pool.submit(runPartition, p) for p in partitions.values()]:
+            future.result()
+
+    return [results[idx] for idx in range(len(prov_reqs))]
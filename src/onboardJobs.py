@@ -0,0 +1,188 @@
+#############################################################################
+#############################################################################
+# onboardJobs.py
+
+import os
+import uuid
+import time
+import collections
+import threading
+import logging
+from .httpclient import getHttpClient
+from .naming import getSafeName
+from .onboarding import onboardRequest
+from .tracing import traceSpan
+
+# ====================================================
+# Constants
+JOB_WORKERS = int(os.environ.get("CYBR_JOB_WORKERS", "4"))         # requests onboarded in parallel
+JOB_HISTORY = int(os.environ.get("CYBR_JOB_HISTORY", "10000"))     # finished jobs kept for status queries
+JOB_SAFE_LOCKS = 64               # lock stripes serializing jobs for the same safe
+JOB_RESULT_KEYS = ["safe_name", "source_store_id", "target_store_id", "filter_id", "policy_id", "platform_id"]
+
+# ====================================================
+# Onboarding jobs of a long-running process (see onboardService.py).
+# Each submitted provisioning request becomes a job that worker threads run
+# w/ onboardRequest(), sharing authentication, HTTP connections, platforms
+# and naming rules. Jobs wait in a bounded priority queue (see
+# onboardWorkQueue.py); submit() raises QueueFull when it is full. If the
+# queue is durable, jobs left queued or running by an earlier process are
+# queued again (re-running a step that already completed is harmless: safes,
+# members, accounts, filters & policies that exist are reused). Account secrets
+# are not kept in the queue database, so recovered jobs that had one fail and
+# must be submitted again.
+# Jobs for the same safe run one at a time, so a safe is created and
+# populated before its accounts are added. Finished jobs are kept for status
+# queries, up to JOB_HISTORY, oldest dropped first.
+# Job status: queued -> running -> succeeded | failed
+
+class OnboardJobManager:
+
+    def __init__(self, admin_creds=None, workers=None, http_client=None, work_queue=None):
+        self.admin_creds = admin_creds
+        self.workers = JOB_WORKERS if workers is None else workers
+        self.http_client = getHttpClient() if http_client is None else http_client
+        self.work_queue = OnboardWorkQueue() if work_queue is None else work_queue
+        self._jobs = {}               # job_id -> job dictionary, in submission order
+        self._finished = collections.deque()   # job_ids of finished jobs, oldest first
+        for job_id, item in self.work_queue.recovered():
+            self._jobs[job_id] = self.newJob(job_id, item)
+        self._safe_locks = [threading.Lock() for _ in range(JOB_SAFE_LOCKS)]
+        self._lock = threading.Lock()
+        self._threads = []
+
+    # -------------------------------------------
+    def start(self):
+        for idx in range(max(1, self.workers)):
+            thread = threading.Thread(target=self.work, name=f"onboard-job-{idx}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    # -------------------------------------------
+    def stop(self, drain=True):
+        # w/ drain, runs jobs already queued before workers stop; else
+        # running jobs finish and queued jobs stay in a durable queue
+        self.work_queue.close(drain)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self.work_queue.closeDb()
+
+    # -------------------------------------------
+    def newJob(self, job_id, item):
+        job = {}
+        job["job_id"] = job_id
+        job["request_id"] = item.get("request_id", None)
+        job["status"] = "queued"
+        job["submitted"] = item.get("submitted", time.time())
+        job["started"] = None
+        job["finished"] = None
+        job["result"] = None
+        return job
+
+    # -------------------------------------------
+    def submit(self, prov_req, request_id=None, block=False, timeout=None):
+        # queues provisioning request, returns copy of its job dictionary
+        return self.submitMany([(request_id, prov_req)], block, timeout)[0]
+
+    # -------------------------------------------
+    def submitMany(self, prov_reqs, block=False, timeout=None):
+        # queues (request_id, prov_req) tuples, all or none, returns copies of their job dictionaries.
+        # Raises QueueFull if the queue has no room (w/ block, after waiting up to timeout seconds).
+        keyed_items = []
+        for request_id, prov_req in prov_reqs:
+            item = {"request_id": request_id, "submitted": time.time(), "prov_req": prov_req}
+            keyed_items.append((uuid.uuid4().hex, item))
+        jobs = [self.newJob(job_id, item) for job_id, item in keyed_items]
+        with self._lock:
+            for job in jobs:
+                self._jobs[job["job_id"]] = job
+        try:
+            self.work_queue.putMany(keyed_items, block, timeout)
+        except QueueFull:
+            with self._lock:
+                for job in jobs:
+                    self._jobs.pop(job["job_id"], None)
+            raise
+        return [dict(job) for job in jobs]
+
+    # -------------------------------------------
+    def get(self, job_id):
+        # returns copy of job dictionary, or None if unknown
+        with self._lock:
+            job = self._jobs.get(job_id, None)
+            return None if job is None else dict(job)
+
+    # -------------------------------------------
+    def jobs(self, status=None):
+        # returns copies of job dictionaries w/o results, optionally only those w/ status
+        with self._lock:
+            return [{k: v for k, v in job.items() if k != "result"}
+                    for job in self._jobs.values() if status is None or job["status"] == status]
+
+    # -------------------------------------------
+    def counts(self):
+        # returns number of jobs per status, and of queued jobs per priority lane
+        counts = {"queued": 0, "running": 0, "succeeded": 0, "failed": 0}
+        with self._lock:
+            for job in self._jobs.values():
+                counts[job["status"]] += 1
+        counts["lanes"] = self.work_queue.sizes()
+        counts["capacity"] = self.work_queue.maxsize
+        return counts
+
+    # -------------------------------------------
+    def work(self):
+        while True:
+            taken = self.work_queue.get()
+            if taken is None:
+                return
+            job_id, item = taken
+            with self._lock:
+                job = self._jobs.get(job_id, None)
+                if job is None:        # dropped from history while queued, should not happen
+                    job = self._jobs[job_id] = self.newJob(job_id, item)
+            try:
+                if item.get("secret_withheld", False):
+                    self.finish(job, {"status_code": 400, "steps": [],
+                                      "response_body": "Account secret is not kept across restarts, submit request again."})
+                else:
+                    self.run(job, item["prov_req"])
+            except Exception as e:    # never lose a worker
+                logging.exception(f"Job {job_id} failed")
+                self.finish(job, {"status_code": 500, "response_body": f"{type(e).__name__}: {e}", "steps": []})
+            self.work_queue.done(job_id)
+
+    # -------------------------------------------
+    def run(self, job, prov_req):
+        with self._lock:
+            job["status"] = "running"
+            job["started"] = time.time()
+        name_dict = getSafeName(prov_req)
+        if name_dict["status_code"] != 200:
+            resp_dict = {}
+            resp_dict["status_code"] = name_dict["status_code"]
+            resp_dict["response_body"] = f"Step safe_name failed: {name_dict['response_body']}"
+            resp_dict["steps"] = []
+            self.finish(job, resp_dict)
+            return
+        with self._safe_locks[hash(name_dict["safe_name"]) % JOB_SAFE_LOCKS]:
+            with traceSpan("onboardJob", job_id=job["job_id"], request_id=job["request_id"] or ""):
+                resp_dict = onboardRequest(prov_req, self.admin_creds, self.http_client)
+        for key in JOB_RESULT_KEYS:
+            if key in prov_req:
+                resp_dict[key] = prov_req[key]
+        self.finish(job, resp_dict)
+
+    # -------------------------------------------
+    def finish(self, job, resp_dict):
+        result = {k: v for k, v in resp_dict.items() if k != "outputs"}
+        with self._lock:
+            job["status"] = "succeeded" if resp_dict["status_code"] == 200 else "failed"
+            job["finished"] = time.time()
+            job["result"] = result
+            self._finished.append(job["job_id"])
+            while len(self._finished) > JOB_HISTORY:
+                self._jobs.pop(self._finished.popleft(), None)
+        log = logging.info if job["status"] == "succeeded" else logging.error
+        log(f"Job {job['job_id']} ({job['request_id']}): {resp_dict['response_body']}")
@@ -0,0 +1,86 @@
+#############################################################################
+#############################################################################
+# onboardJournal.py
+
+import os
+import json
+import time
+import hashlib
+import threading
+import logging
+
+# ====================================================
+# Append-only journal of completed onboarding steps, so a batch that stopped
+# part way resumes where it left off. Each line of the journal file is a JSON
+# record w/ request_key, request_id, step and the request values the step
+# produced (safe_name, source_store_id, target_store_id, filter_id, policy_id,
+# platform_id; safe_members also the members it added). Records are fsync'ed as
+# they are written. Session tokens and other request values are never journaled.
+
+class OnboardJournal:
+
+    def __init__(self, journal_file):
+        self.journal_file = journal_file
+        self._completed = {}
+        self._lock = threading.Lock()
+        if os.path.exists(journal_file):
+            with open(journal_file, "rb") as f_in:
+                data = f_in.read()
+            complete = data.rfind(b"\n") + 1
+            for line in data[:complete].splitlines():
+                self.load(line)
+            # a crash while writing leaves a partial last line; unless it is a whole
+            # record missing its newline, it is cut off so the next record starts clean
+            if complete < len(data):
+                if self.load(data[complete:]):
+                    with open(journal_file, "ab") as f_out:
+                        f_out.write(b"\n")
+                else:
+                    os.truncate(journal_file, complete)
+        self._f_out = open(journal_file, "a")
+
+    # -------------------------------------------
+    def load(self, line):
+        # adds record in journal line to completed steps, returns False if line is no record
+        try:
+            record = json.loads(line)
+            self._completed.setdefault(record["request_key"], {})[record["step"]] = record["outputs"]
+            return True
+        except (ValueError, TypeError, KeyError):
+            logging.error(f"Skipping incomplete journal record in {self.journal_file}")
+            return False
+
+    # -------------------------------------------
+    def completed(self, request_key):
+        # returns {step: outputs} of steps completed for request
+        with self._lock:
+            return dict(self._completed.get(request_key, {}))
+
+    # -------------------------------------------
+    def record(self, request_key, request_id, step, outputs):
+        record = {
+            "time": time.time(),
+            "request_key": request_key,
+            "request_id": request_id,
+            "step": step,
+            "outputs": outputs,
+        }
+        with self._lock:
+            self._completed.setdefault(request_key, {})[step] = outputs
+            self._f_out.write(json.dumps(record) + "\n")
+            self._f_out.flush()
+            os.fsync(self._f_out.fileno())
+
+    # -------------------------------------------
+    def close(self):
+        with self._lock:
+            self._f_out.close()
+
+
+# ====================================================
+# Returns journal key of a provisioning request: hash of its original contents,
+# so a request keeps its key across runs regardless of where it was read from.
+# Must be computed before the request is augmented by the workflow.
+
+def journalKey(prov_req):
+    return hashlib.sha256(json.dumps(prov_req, sort_keys=True, default=str).encode()).hexdigest()
@@ -0,0 +1,173 @@
+#############################################################################
+#############################################################################
+# onboardRequest.py
+
+import time
+import logging
+import functools
+from .accounts import createAccount
+from .auth import authnCyberarkCached, getAuthnCreds
+from .httpclient import getHttpClient
+from .naming import getSafeName
+from .platforms import getPlatformId, validateRequestWithPlatform
+from .safes import addSafeMembers, createSafe
+from .secretshub import getSHFilterForSafe, getSHSourceStoreId, getSHSyncPolicy, getSHTargetStoreId
+from .tracing import getTracer, traceSpan
+from .workflow import runWorkflow
+
+# ====================================================
+# Runs the complete onboarding workflow for one provisioning request in-process:
+#   safe name -> authenticate -> safe -> safe members
+#   -> Secrets Hub source/target stores, filter, sync policy (if cloudAccount & cloudRegion in request)
+#   -> platform, validation, account (if accountValues in request)
+# Authentication, HTTP connections, platforms and naming rules are shared by all
+# requests onboarded by the same process. admin_creds default to getAuthnCreds().
+# completed optionally maps names of steps that need not run again to the request
+# values they produced (see 'outputs' below); those values are added to the request
+# and the steps are reported as skipped.
+# on_step(step, outputs), if given, is called after each step that ran successfully,
+# e.g. to journal it (see onboardJournal.py).
+# The request and each step that runs are traced as spans (see traceSpans.py).
+# The provisioning request is augmented w/ the values produced by each step.
+# Returns status_code == 200 if all steps succeeded (else status_code of the failed step),
+# response_body w/ message, steps w/ step, status_code, response_body, seconds & skipped
+# of each step, and outputs w/ the request values produced by each step that ran.
+
+def onboardRequest(prov_req, admin_creds=None, http_client=None, completed=None, on_step=None):
+    with traceSpan("onboardRequest") as request_span:
+        return runWorkflow(onboardWorkflow(request_span, prov_req, admin_creds, http_client, completed, on_step))
+
+
+# ====================================================
+# onboardRequest() as a workflow generator (see runWorkflow.py): yields each
+# blocking step, i.e. each library call and on_step call, as a function w/o
+# arguments that may run on any thread. Step spans are children of request_span.
+# Returns onboardRequest()'s dictionary.
+
+def onboardWorkflow(request_span, prov_req, admin_creds=None, http_client=None, completed=None, on_step=None):
+    logging.debug("================ onboardRequest() ================")
+    if http_client is None:
+        http_client = getHttpClient()
+    if completed is None:
+        completed = {}
+
+    steps = []
+    outputs = {}
+
+    # -------------------------------------------
+    def recordStep(step, status_code, response_body, seconds, skipped=False):
+        step_result = {}
+        step_result["step"] = step
+        step_result["status_code"] = status_code
+        step_result["response_body"] = response_body
+        step_result["seconds"] = round(seconds, 6)
+        step_result["skipped"] = skipped
+        steps.append(step_result)
+
+    # -------------------------------------------
+    # returns function that runs step func(*args), traced & recorded, returns its response dict
+    def stepCall(step, expected, func, *args):
+        def call():
+            with getTracer().attach(request_span), traceSpan(f"step {step}", step=step) as span:
+                start = time.perf_counter()
+                resp_dict = func(*args)
+                recordStep(step, resp_dict["status_code"], resp_dict["response_body"], time.perf_counter() - start)
+                span.set("status_code", resp_dict["status_code"])
+                if resp_dict["status_code"] not in expected:
+                    span.fail(str(resp_dict["response_body"]))
+            return resp_dict
+        return call
+
+    # -------------------------------------------
+    # runs one workflow step unless already completed, adds values it produced to request,
+    # produces maps keys of step's response dict to request keys.
+    # returns False if step failed
+    def runStep(step, expected, produces, func, *args):
+        if step in completed:
+            prov_req.update(completed[step])
+            recordStep(step, 200, "Step already completed.", 0.0, skipped=True)
+            return True
+        resp_dict = yield stepCall(step, expected, func, *args)
+        if resp_dict["status_code"] not in expected:
+            logging.error(f"{step}: {resp_dict['response_body']}")
+            return False
+        outputs[step] = {req_key: resp_dict[resp_key] for resp_key, req_key in produces.items()}
+        prov_req.update(outputs[step])
+        if on_step is not None:
+            yield functools.partial(on_step, step, outputs[step])
+        return True
+
+    # -------------------------------------------
+    def workflow():
+        if not (yield from runStep("safe_name", [200], {"safe_name": "safe_name"}, getSafeName, prov_req)):
+            return False
+
+        # session tokens are never recorded as step outputs
+        creds = admin_creds
+        if creds is None:
+            resp_dict = yield stepCall("authn_creds", [200], getAuthnCreds)
+            if resp_dict["status_code"] != 200:
+                return False
+            creds = resp_dict["admin_creds"]
+        resp_dict = yield stepCall("authenticate", [200], authnCyberarkCached, creds, http_client)
+        if resp_dict["status_code"] != 200:
+            return False
+        prov_req["session_token"] = resp_dict["session_token"]
+        prov_req["cybr_subdomain"] = creds["cybr_subdomain"]
+
+        if not (yield from runStep("safe", [201,409], {}, createSafe, prov_req, http_client)):
+            return False
+        if not (yield from runStep("safe_members", [201,409], {}, addSafeMembers, prov_req, http_client)):
+            return False
+
+        if prov_req.get("cloudAccount", None) is not None and prov_req.get("cloudRegion", None) is not None:
+            if not (yield from runStep("source_store", [200], {"store_id": "source_store_id"},
+                                       getSHSourceStoreId, prov_req, http_client)):
+                return False
+            if not (yield from runStep("target_store", [200], {"store_id": "target_store_id"},
+                                       getSHTargetStoreId, prov_req, http_client)):
+                return False
+            if not (yield from runStep("filter", [200,201], {"filter_id": "filter_id"},
+                                       getSHFilterForSafe, prov_req, http_client)):
+                return False
+            if not (yield from runStep("sync_policy", [200,201], {"policy_id": "policy_id"},
+                                       getSHSyncPolicy, prov_req, http_client)):
+                return False
+
+        if prov_req.get("accountValues", None) is not None:
+            if not (yield from runStep("platform", [200], {"platform_id": "platform_id"}, getPlatformId, prov_req)):
+                return False
+            if not (yield from runStep("validate", [200], {}, validateRequestWithPlatform, prov_req)):
+                return False
+            if not (yield from runStep("account", [201,409], {}, createAccount, prov_req, http_client)):
+                return False
+
+        return True
+
+    # MAIN ====================================================
+    try:
+        succeeded = yield from workflow()
+    except Exception as e:      # e.g. connection errors, unexpected API responses
+        logging.exception("Onboarding workflow failed")
+        recordStep("exception", 500, f"{type(e).__name__}: {e}", 0.0)
+        succeeded = False
+    request_span.set("safe_name", prov_req.get("safe_name", ""))
+    request_span.set("status_code", 200 if succeeded else steps[-1]["status_code"])
+    if not succeeded:
+        request_span.fail(f"step {steps[-1]['step']} failed")
+
+    if succeeded:
+        status_code = 200
+        response_body = f"Request onboarded to safe {prov_req['safe_name']}."
+    else:
+        status_code = steps[-1]["status_code"]
+        response_body = f"Step {steps[-1]['step']} failed: {steps[-1]['response_body']}"
+
+    logging.debug(f"\tstatus_code: {status_code}\n\tresponse: {response_body}")
+
+    return_dict = {}
+    return_dict["status_code"] = status_code
+    return_dict["response_body"] = response_body
+    return_dict["steps"] = steps
+    return_dict["outputs"] = outputs
+    return return_dict
@@ -0,0 +1,190 @@
+#############################################################################
+#############################################################################
+# onboardWorkQueue.py
+
+import os
+import json
+import heapq
+import sqlite3
+import threading
+import logging
+
+# ====================================================
+# Constants
+WORK_QUEUE_SIZE = int(os.environ.get("CYBR_QUEUE_SIZE", "1000"))   # max queued items
+WORK_QUEUE_DB = os.environ.get("CYBR_QUEUE_DB", "")                 # SQLite file, "" = in memory only
+# priority lanes by request env value, highest priority first; ";" separates lanes,
+# "," values of one lane. Requests w/ other env values go in a last lane.
+WORK_QUEUE_LANES = os.environ.get("CYBR_QUEUE_LANES", "PRD,PROD,PRODUCTION")
+
+
+class QueueFull(Exception):
+    pass
+
+
+# ====================================================
+# Bounded priority queue of onboarding work items (JSON-serializable dicts
+# w/ a provisioning request under "prov_req"), taken by worker threads.
+# Items are taken lowest lane first, in submission order within a lane; the
+# lane of an item is that of its request's env value (see WORK_QUEUE_LANES).
+# Producers are pushed back when maxsize items are queued: put() raises
+# QueueFull, or w/ block=True waits for room.
+# If db_file is given, queued items are also kept in SQLite until done(), so
+# items queued or running when the process stopped are queued again by the
+# next process that opens the same db_file (see recovered()).
+# db_file holds provisioning requests, so it is created owner-only in an
+# owner-only directory, and deleted items are overwritten. Account secrets
+# (accountValues.secret) are only kept in memory: items recovered from db_file
+# lack them and are marked w/ "secret_withheld".
+
+class OnboardWorkQueue:
+
+    def __init__(self, maxsize=None, db_file=None, lanes=None):
+        self.maxsize = WORK_QUEUE_SIZE if maxsize is None else maxsize
+        self.db_file = WORK_QUEUE_DB if db_file is None else db_file
+        if lanes is None:
+            lanes = WORK_QUEUE_LANES
+        self.lanes = {}               # uppercase env value -> lane number
+        for lane, values in enumerate(lanes.split(";")):
+            for value in values.split(","):
+                if value.strip():
+                    self.lanes[value.strip().upper()] = lane
+        self.default_lane = len(lanes.split(";"))
+        self._heap = []               # (lane, seq, key, item)
+        self._seq = 0
+        self._closed = False
+        self._drain = True
+        self._recovered = []
+        self._cond = threading.Condition()
+        self._db = None
+        if self.db_file:
+            self.openDb()
+
+    # -------------------------------------------
+    def openDb(self):
+        # opens SQLite backing, re-queues items left by an earlier process
+        db_dir = os.path.dirname(self.db_file)
+        if db_dir:
+            os.makedirs(db_dir, mode=0o700, exist_ok=True)
+        # create file owner-only before SQLite does; its -wal & -shm files get the same mode
+        os.close(os.open(self.db_file, os.O_RDWR | os.O_CREAT, 0o600))
+        os.chmod(self.db_file, 0o600)
+        self._db = sqlite3.connect(self.db_file, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA secure_delete=ON")    # finished items are overwritten, not just unlinked
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS work_items "
+                         "(key TEXT PRIMARY KEY, seq INTEGER, lane INTEGER, item TEXT)")
+        rows = self._db.execute("SELECT key, seq, lane, item FROM work_items ORDER BY seq").fetchall()
+        for key, seq, lane, item in rows:
+            item = json.loads(item)
+            self._heap.append((lane, seq, key, item))
+            self._recovered.append((key, item))
+            self._seq = max(self._seq, seq + 1)
+        heapq.heapify(self._heap)
+        if rows:
+            logging.info(f"Recovered {len(rows)} queued work item(s) from {self.db_file}")
+
+    # -------------------------------------------
+    def storedItem(self, item):
+        # returns JSON of item for db_file, w/o account secret
+        prov_req = item.get("prov_req", {})
+        account_values = prov_req.get("accountValues", None)
+        if not isinstance(account_values, dict) or not any(k.lower() == "secret" for k in account_values):
+            return json.dumps(item)
+        stored = dict(item)
+        stored["prov_req"] = dict(prov_req)
+        stored["prov_req"]["accountValues"] = {k: v for k, v in account_values.items() if k.lower() != "secret"}
+        stored["secret_withheld"] = True
+        return json.dumps(stored)
+
+    # -------------------------------------------
+    def laneOf(self, item):
+        env = str(item.get("prov_req", {}).get("env", "")).upper()
+        return self.lanes.get(env, self.default_lane)
+
+    # -------------------------------------------
+    def put(self, key, item, block=False, timeout=None):
+        self.putMany([(key, item)], block, timeout)
+
+    # -------------------------------------------
+    def putMany(self, keyed_items, block=False, timeout=None):
+        # queues all (key, item) tuples or none of them, raises QueueFull if no room
+        keyed_items = list(keyed_items)
+        if len(keyed_items) > self.maxsize:
+            raise QueueFull(f"{len(keyed_items)} items exceed queue size {self.maxsize}")
+        with self._cond:
+            room = lambda: self._closed or len(self._heap) + len(keyed_items) <= self.maxsize
+            if not room():
+                if not block or not self._cond.wait_for(room, timeout):
+                    raise QueueFull(f"Queue is full ({len(self._heap)} of {self.maxsize} queued)")
+            if self._closed:
+                raise QueueFull("Queue is closed")
+            entries = []
+            for key, item in keyed_items:
+                entries.append((self.laneOf(item), self._seq, key, item))
+                self._seq += 1
+            if self._db is not None:
+                with self._db:
+                    self._db.executemany("INSERT OR REPLACE INTO work_items (key, seq, lane, item) VALUES (?, ?, ?, ?)",
+                                         [(key, seq, lane, self.storedItem(item)) for lane, seq, key, item in entries])
+            for entry in entries:
+                heapq.heappush(self._heap, entry)
+            self._cond.notify_all()
+
+    # -------------------------------------------
+    def get(self, timeout=None):
+        # returns (key, item) of next item, or None once closed (and drained) or on timeout
+        with self._cond:
+            ready = lambda: self._heap or self._closed
+            if not self._cond.wait_for(ready, timeout):
+                return None
+            if not self._heap or (self._closed and not self._drain):
+                return None
+            lane, seq, key, item = heapq.heappop(self._heap)
+            self._cond.notify_all()
+            return key, item
+
+    # -------------------------------------------
+    def done(self, key):
+        # forgets item taken w/ get() once its work is finished
+        if self._db is not None:
+            with self._cond:
+                with self._db:
+                    self._db.execute("DELETE FROM work_items WHERE key = ?", (key,))
+
+    # -------------------------------------------
+    def recovered(self):
+        # returns (key, item) tuples re-queued from db_file when the queue was opened
+        return list(self._recovered)
+
+    # -------------------------------------------
+    def sizes(self):
+        # returns number of queued items per lane
+        with self._cond:
+            sizes = {}
+            for lane, seq, key, item in self._heap:
+                sizes[lane] = sizes.get(lane, 0) + 1
+            return sizes
+
+    # -------------------------------------------
+    def qsize(self):
+        with self._cond:
+            return len(self._heap)
+
+    # -------------------------------------------
+    def close(self, drain=True):
+        # wakes all getters; w/ drain, get() still returns the items queued so far.
+        # Items not taken stay in db_file for the next process.
+        with self._cond:
+            self._closed = True
+            self._drain = drain
+            self._cond.notify_all()
+
+    # -------------------------------------------
+    def closeDb(self):
+        # closes SQLite backing, once no worker calls done() anymore
+        if self._db is not None:
+            with self._cond:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,113 @@
+
+#############################################################################
+#############################################################################
+# platformRegistry.py
+
+import os
+import json
+import threading
+import logging
+from .artifacts import loadArtifact, writeArtifact
+
+# ====================================================
+# In-process registry of platforms compiled with compileplats.py.
+# The platform file is parsed once and re-parsed only when its mtime changes,
+# so getPlatformId(), validateRequestWithPlatform() and createAccount() share
+# one copy of it. Each platform's 'required' and 'allkeys' lists are kept as
+# frozensets for set-based validation, and the searchpair index used by
+# getPlatformId() is rebuilt together with the platforms.
+# If a valid precompiled artifact of the platform file exists (see
+# compiledArtifact.py), platforms & index are loaded from it instead.
+
+class PlatformRegistry:
+
+    def __init__(self, platform_file):
+        self.platform_file = platform_file
+        self._mtime = None
+        self._platforms = {}
+        self._index = []
+        self._lock = threading.Lock()
+
+    # -------------------------------------------
+    def refresh(self):
+        # (re)loads platform file if it changed since last load, raises OSError if unreadable
+        mtime = os.stat(self.platform_file).st_mtime_ns
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            compiled = loadArtifact(self.platform_file, "platforms")
+            if compiled is None:
+                with open(self.platform_file) as f_in:
+                    compiled = compilePlatforms(json.load(f_in))
+            self._index = compiled["index"]
+            self._platforms = compiled["platforms"]
+            self._mtime = mtime
+            logging.debug(f"Loaded {len(self._platforms)} platforms from {self.platform_file}")
+
+    # -------------------------------------------
+    def platforms(self):
+        self.refresh()
+        return self._platforms
+
+    # -------------------------------------------
+    def get(self, platform_id):
+        # returns platform dictionary, or None if platform_id is unknown
+        return self.platforms().get(platform_id, None)
+
+    # -------------------------------------------
+    def index(self):
+        # returns searchpair index built by compilePlatformIndex()
+        self.refresh()
+        return self._index
+
+
+# ====================================================
+# Compiles platforms dictionary (as in the platform file) for the registry.
+# Returns dictionary w/ platforms, w/ frozenset 'required' & 'allkeys', and index.
+# Equal strings & frozensets are shared by all platforms, which saves memory and
+# makes an artifact of thousands of platforms several times smaller & faster to load.
+
+def compilePlatforms(raw_platforms):
+    shared = {}
+    def share(value):
+        return shared.setdefault(value, value) if isinstance(value, (str, frozenset)) else value
+
+    platforms = {}
+    for pid, plat in raw_platforms.items():
+        pid = share(pid)
+        platforms[pid] = {share(k): share(v) for k, v in plat.items()}
+        platforms[pid]["searchpairs"] = {share(k): share(v) for k, v in plat["searchpairs"].items()}
+        platforms[pid]["required"] = share(frozenset(share(k) for k in plat["required"]))
+        platforms[pid]["allkeys"] = share(frozenset(share(k) for k in plat["allkeys"]))
+    return {"platforms": platforms, "index": compilePlatformIndex(raw_platforms)}
+
+
+# ====================================================
+# Writes precompiled artifact of platform_file (see compiledArtifact.py).
+# Returns path of artifact. Raises IOError/ValueError if platform_file cannot be read.
+
+def compilePlatformArtifact(platform_file=None):
+    if platform_file is None:
+        platform_file = PLATFORM_FILE
+    with open(platform_file, "rb") as f_in:
+        source_bytes = f_in.read()
+    return writeArtifact(platform_file, "platforms", compilePlatforms(json.loads(source_bytes)), source_bytes)
+
+
+_platform_registries = {}
+_platform_registries_lock = threading.Lock()
+
+# ====================================================
+# Returns process-wide PlatformRegistry for platform_file (default PLATFORM_FILE).
+
+def getPlatformRegistry(platform_file=None):
+    if platform_file is None:
+        platform_file = PLATFORM_FILE
+    with _platform_registries_lock:
+        registry = _platform_registries.get(platform_file, None)
+        if registry is None:
+            registry = PlatformRegistry(platform_file)
+            _platform_registries[platform_file] = registry
+        return registry
@@ -0,0 +1,28 @@
+#############################################################################
+#############################################################################
+# runWorkflow.py
+
+# ====================================================
+# Runs a workflow generator, e.g. onboardWorkflow() or offboardWorkflow(), on
+# the calling thread. A workflow yields each blocking step as a function w/o
+# arguments; it is called and its result sent back to the workflow, or the
+# exception it raised is thrown into it. Returns the workflow's return value.
+# See runWorkflowAsync() in asyncOnboard.py for running steps on a pool.
+
+def runWorkflow(workflow):
+    result = None
+    error = None
+    while True:
+        try:
+            if error is None:
+                call = workflow.send(result)
+            else:
+                call = workflow.throw(error)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            result = call()
+            error = None
+        except Exception as e:
+            result = None
+            error = e
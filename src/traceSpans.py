@@ -0,0 +1,422 @@
+#############################################################################
+#############################################################################
+# traceSpans.py
+
+import os
+import json
+import time
+import atexit
+import contextlib
+import threading
+import logging
+
+# ====================================================
+# Constants
+TRACE_FILE = os.environ.get("CYBR_TRACE_FILE", "")                 # JSONL, one span per line
+TRACE_METRICS_FILE = os.environ.get("CYBR_TRACE_METRICS_FILE", "") # Prometheus text format
+TRACE_OTEL_FILE = os.environ.get("CYBR_TRACE_OTEL_FILE", "")       # OTLP/JSON, one batch per line
+TRACE_METRICS_INTERVAL = 10.0     # seconds between rewrites of metrics file
+TRACE_OTEL_BATCH = 512            # spans per OTLP/JSON line
+TRACE_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+TRACE_SERVICE_NAME = "cybronboard"
+
+# collection names in API paths whose next path segment is an identifier
+TRACE_PATH_IDS = {
+    "safes": "{safeName}",
+    "members": "{memberName}",
+    "accounts": "{accountId}",
+    "secret-stores": "{storeId}",
+    "filters": "{filterId}",
+    "policies": "{policyId}",
+}
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+# ====================================================
+# Lightweight tracing of onboarding steps & HTTP calls.
+# A span times one unit of work (an onboarding request, a workflow step, an
+# HTTP call incl. its retries) and carries attributes such as status codes.
+# Spans opened while another span is open on the same thread become its
+# children. Finished spans are handed to the exporters selected w/ the
+# CYBR_TRACE_* variables; if none is set, spans are not created at all.
+#   usage: with traceSpan("step safe", step="safe") as span:
+#              ...
+#              span.set("status_code", 201)
+
+class Span:
+
+    def __init__(self, tracer, name, kind, attributes, parent):
+        self.tracer = tracer
+        self.name = name
+        self.kind = kind              # "internal" or "client" (outgoing HTTP call)
+        self.attributes = dict(attributes)
+        self.trace_id = parent.trace_id if parent is not None else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.status = "OK"
+        self.start_ns = 0
+        self.end_ns = 0
+
+    # -------------------------------------------
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    # -------------------------------------------
+    def fail(self, message=None):
+        self.status = "ERROR"
+        if message is not None:
+            self.attributes["error.message"] = message
+
+    # -------------------------------------------
+    def seconds(self):
+        return (self.end_ns - self.start_ns) / 1e9
+
+    # -------------------------------------------
+    def record(self):
+        # returns span as JSON-serializable dictionary
+        span_dict = {}
+        span_dict["trace_id"] = self.trace_id
+        span_dict["span_id"] = self.span_id
+        span_dict["parent_id"] = self.parent_id
+        span_dict["name"] = self.name
+        span_dict["kind"] = self.kind
+        span_dict["start"] = self.start_ns / 1e9
+        span_dict["seconds"] = round(self.seconds(), 6)
+        span_dict["status"] = self.status
+        span_dict["attributes"] = self.attributes
+        span_dict["thread"] = threading.current_thread().name
+        return span_dict
+
+    # -------------------------------------------
+    def __enter__(self):
+        self.tracer._stack().append(self)
+        self.start_ns = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.time_ns()
+        if exc_type is not None:
+            self.fail(f"{exc_type.__name__}: {exc}")
+        stack = self.tracer._stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        self.tracer.export(self)
+        return False
+
+    # -------------------------------------------
+    # start() & finish() time a span w/o making it the current span of the calling
+    # thread, e.g. a span that coroutines keep open while its children run on pool
+    # threads (see Tracer.attach())
+    def start(self):
+        self.start_ns = time.time_ns()
+        return self
+
+    def finish(self):
+        self.end_ns = time.time_ns()
+        self.tracer.export(self)
+
+
+# ====================================================
+# Stand-in for Span when tracing is off, so instrumented code needs no checks.
+
+class NoopSpan:
+
+    def set(self, key, value):
+        pass
+
+    def fail(self, message=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def start(self):
+        return self
+
+    def finish(self):
+        pass
+
+
+_noop_span = NoopSpan()
+
+# ====================================================
+# Creates spans and hands finished spans to its exporters.
+
+class Tracer:
+
+    def __init__(self, exporters):
+        self.exporters = exporters
+        self._local = threading.local()
+
+    # -------------------------------------------
+    def enabled(self):
+        return len(self.exporters) > 0
+
+    # -------------------------------------------
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    # -------------------------------------------
+    def current(self):
+        # returns innermost open span of calling thread, or None
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    # -------------------------------------------
+    @contextlib.contextmanager
+    def attach(self, span):
+        # makes span the parent of spans opened in the block, e.g. on a pool thread
+        if span is None or not self.exporters:
+            yield
+            return
+        stack = self._stack()
+        stack.append(span)
+        try:
+            yield
+        finally:
+            stack.remove(span)
+
+    # -------------------------------------------
+    def span(self, name, kind="internal", **attributes):
+        if not self.exporters:
+            return _noop_span
+        return Span(self, name, kind, attributes, self.current())
+
+    # -------------------------------------------
+    def export(self, span):
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception:
+                logging.exception(f"Could not export span {span.name}")
+
+    # -------------------------------------------
+    def flush(self):
+        for exporter in self.exporters:
+            try:
+                exporter.flush()
+            except Exception:
+                logging.exception(f"Could not flush {type(exporter).__name__}")
+
+
+# ====================================================
+# Appends each finished span to trace_file as one JSON line.
+
+class JsonlSpanExporter:
+
+    def __init__(self, trace_file):
+        self.trace_file = trace_file
+        self._lock = threading.Lock()
+        self._f_out = open(trace_file, "a")
+
+    def export(self, span):
+        line = json.dumps(span.record(), default=str) + "\n"
+        with self._lock:
+            self._f_out.write(line)
+
+    def flush(self):
+        with self._lock:
+            self._f_out.flush()
+
+
+# ====================================================
+# Aggregates spans into Prometheus metrics, rewritten to metrics_file (e.g. for
+# node_exporter's textfile collector) at most every TRACE_METRICS_INTERVAL seconds
+# and at exit:
+#   cybronboard_span_duration_seconds{span,status}              histogram
+#   cybronboard_http_request_duration_seconds{method,host,path,status}  histogram
+#   cybronboard_http_retries_total{method,host,path}
+#   cybronboard_http_response_bytes_total{method,host,path}
+
+class PrometheusExporter:
+
+    def __init__(self, metrics_file):
+        self.metrics_file = metrics_file
+        self._histograms = {}      # (metric, labels tuple) -> [bucket counts..., count, sum]
+        self._counters = {}        # (metric, labels tuple) -> value
+        self._written = time.monotonic()
+        self._lock = threading.Lock()
+
+    # -------------------------------------------
+    def export(self, span):
+        seconds = span.seconds()
+        attrs = span.attributes
+        with self._lock:
+            if span.kind == "client":
+                route = (("method", attrs.get("http.request.method", "")),
+                         ("host", attrs.get("server.address", "")),
+                         ("path", attrs.get("url.template", "")))
+                status = str(attrs.get("http.response.status_code", "error"))
+                self.observe("cybronboard_http_request_duration_seconds", route + (("status", status),), seconds)
+                self.count("cybronboard_http_retries_total", route, attrs.get("http.retries", 0))
+                self.count("cybronboard_http_response_bytes_total", route, attrs.get("http.response.body.size", 0))
+            else:
+                status = str(attrs.get("status_code", span.status))
+                self.observe("cybronboard_span_duration_seconds", (("span", span.name), ("status", status)), seconds)
+            due = time.monotonic() - self._written >= TRACE_METRICS_INTERVAL
+        if due:
+            self.flush()
+
+    # -------------------------------------------
+    def observe(self, metric, labels, seconds):
+        hist = self._histograms.get((metric, labels), None)
+        if hist is None:
+            hist = self._histograms[(metric, labels)] = [0] * (len(TRACE_BUCKETS) + 2)
+        for idx, bound in enumerate(TRACE_BUCKETS):
+            if seconds <= bound:
+                hist[idx] += 1
+        hist[-2] += 1
+        hist[-1] += seconds
+
+    # -------------------------------------------
+    def count(self, metric, labels, value):
+        self._counters[(metric, labels)] = self._counters.get((metric, labels), 0) + value
+
+    # -------------------------------------------
+    def render(self):
+        # returns metrics in Prometheus text exposition format
+        def labelText(labels, extra=()):
+            pairs = []
+            for k, v in labels + tuple(extra):
+                v = str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+                pairs.append(f'{k}="{v}"')
+            return "{" + ",".join(pairs) + "}"
+
+        lines = []
+        with self._lock:
+            for metric in sorted({m for m, labels in self._histograms}):
+                lines.append(f"# TYPE {metric} histogram")
+                for (m, labels), hist in sorted(self._histograms.items()):
+                    if m != metric:
+                        continue
+                    for idx, bound in enumerate(TRACE_BUCKETS):
+                        lines.append(f"{metric}_bucket{labelText(labels, [('le', bound)])} {hist[idx]}")
+                    lines.append(f"{metric}_bucket{labelText(labels, [('le', '+Inf')])} {hist[-2]}")
+                    lines.append(f"{metric}_count{labelText(labels)} {hist[-2]}")
+                    lines.append(f"{metric}_sum{labelText(labels)} {hist[-1]:.6f}")
+            for metric in sorted({m for m, labels in self._counters}):
+                lines.append(f"# TYPE {metric} counter")
+                for (m, labels), value in sorted(self._counters.items()):
+                    if m == metric:
+                        lines.append(f"{metric}{labelText(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    # -------------------------------------------
+    def flush(self):
+        text = self.render()
+        tmp_file = f"{self.metrics_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_file, "w") as f_out:
+            f_out.write(text)
+        os.replace(tmp_file, self.metrics_file)    # readers never see a partial file
+        with self._lock:
+            self._written = time.monotonic()
+
+
+# ====================================================
+# Writes spans to otel_file in OpenTelemetry OTLP/JSON format, one
+# ExportTraceServiceRequest per line of up to TRACE_OTEL_BATCH spans (the
+# layout of the OpenTelemetry Collector file exporter), for import into
+# OpenTelemetry-compatible tools.
+
+class OtelJsonExporter:
+
+    def __init__(self, otel_file):
+        self.otel_file = otel_file
+        self._spans = []
+        self._lock = threading.Lock()
+
+    # -------------------------------------------
+    def export(self, span):
+        with self._lock:
+            self._spans.append(span)
+            full = len(self._spans) >= TRACE_OTEL_BATCH
+        if full:
+            self.flush()
+
+    # -------------------------------------------
+    def flush(self):
+        def otelValue(value):
+            if isinstance(value, bool):
+                return {"boolValue": value}
+            if isinstance(value, int):
+                return {"intValue": str(value)}
+            if isinstance(value, float):
+                return {"doubleValue": value}
+            return {"stringValue": str(value)}
+
+        with self._lock:
+            spans, self._spans = self._spans, []
+            if len(spans) == 0:
+                return
+            otel_spans = []
+            for span in spans:
+                otel_span = {
+                    "traceId": span.trace_id,
+                    "spanId": span.span_id,
+                    "name": span.name,
+                    "kind": 3 if span.kind == "client" else 1,   # SPAN_KIND_CLIENT / SPAN_KIND_INTERNAL
+                    "startTimeUnixNano": str(span.start_ns),
+                    "endTimeUnixNano": str(span.end_ns),
+                    "attributes": [{"key": k, "value": otelValue(v)} for k, v in span.attributes.items()],
+                    "status": {"code": 2 if span.status == "ERROR" else 1},  # STATUS_CODE_ERROR / _OK
+                }
+                if span.parent_id is not None:
+                    otel_span["parentSpanId"] = span.parent_id
+                otel_spans.append(otel_span)
+            batch = {"resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": TRACE_SERVICE_NAME}}]},
+                "scopeSpans": [{"scope": {"name": TRACE_SERVICE_NAME}, "spans": otel_spans}],
+            }]}
+            with open(self.otel_file, "a") as f_out:
+                f_out.write(json.dumps(batch) + "\n")
+
+
+# ====================================================
+# Returns process-wide Tracer w/ the exporters selected by TRACE_FILE,
+# TRACE_METRICS_FILE and TRACE_OTEL_FILE. Exporters are flushed at exit.
+
+def getTracer():
+    global _tracer
+    if _tracer is not None:
+        return _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            exporters = []
+            if TRACE_FILE:
+                exporters.append(JsonlSpanExporter(TRACE_FILE))
+            if TRACE_METRICS_FILE:
+                exporters.append(PrometheusExporter(TRACE_METRICS_FILE))
+            if TRACE_OTEL_FILE:
+                exporters.append(OtelJsonExporter(TRACE_OTEL_FILE))
+            tracer = Tracer(exporters)
+            if tracer.enabled():
+                atexit.register(tracer.flush)
+            _tracer = tracer
+        return _tracer
+
+
+# ====================================================
+# Returns span of process-wide tracer, to use as context manager
+
+def traceSpan(name, kind="internal", **attributes):
+    return getTracer().span(name, kind, **attributes)
+
+
+# ====================================================
+# Returns API path w/ identifiers replaced by placeholders, e.g.
+# /passwordvault/api/safes/{safeName}/members, so metrics are per endpoint.
+
+def pathTemplate(path):
+    parts = path.split("/")
+    for idx in range(1, len(parts)):
+        placeholder = TRACE_PATH_IDS.get(parts[idx - 1], None)
+        if placeholder is not None and parts[idx] and parts[idx] not in TRACE_PATH_IDS:
+            parts[idx] = placeholder
+    return "/".join(parts)
@@ -2,7 +2,6 @@
 #############################################################################
 # validateRequestWithPlatform.py
 
-import json
 import logging
 
 # ====================================================
@@ -25,33 +24,38 @@ def validateRequestWithPlatform(prov_req):
             return_dict["status_code"] = 400
             return_dict["response_body"] = err_msg
 
-    # load platform dictionary from json file created with compileplats.py
-    # PLATFORM_FILE is a global constant defined in getPlatform.py
+    # get platform from registry of platforms compiled with compileplats.py
+    # PLATFORM_FILE is a global constant defined in getPlatformId.py
     try:
-        with open(PLATFORM_FILE) as f_in:
-            platforms = json.load(f_in)
-    except IOError:
+        platform = getPlatformRegistry().get(prov_req["platform_id"])
+    except (IOError, ValueError):
         err_msg = f"Could not read file: {PLATFORM_FILE}"
         logging.error(err_msg)
         return_dict = {}
         return_dict["status_code"] = 500
         return_dict["response_body"] = err_msg
         return return_dict
+    if platform is None:
+        err_msg = f"Platform {prov_req['platform_id']} not found in {PLATFORM_FILE}"
+        logging.error(err_msg)
+        return_dict = {}
+        return_dict["status_code"] = 404
+        return_dict["response_body"] = err_msg
+        return return_dict
 
     status_code = 200
     response_body = "Platform is valid"
 
     # determine if provisioning request keys map to platform properties
-    plat_id = platforms[prov_req["platform_id"]]
-    valid_request = False
-    # get list of uppercase request properties to compare with platform properties
-    prov_keys = [k.upper() for k in prov_req["accountValues"].keys()]
+    plat_id = platform["id"]
+    # get set of uppercase request properties to compare with platform properties
+    prov_keys = frozenset(k.upper() for k in prov_req["accountValues"].keys())
     # first check if request has properties that are not in platform keys
-    missing_keys = [k for k in prov_keys if k not in plat_id["allkeys"]]
+    missing_keys = sorted(prov_keys - platform["allkeys"])
     valid_request = (len(missing_keys) == 0)
     if valid_request:
         # then check if any required platform properties are not in request
-        missing_reqd_keys = [k for k in plat_id["required"] if k not in prov_keys]
+        missing_reqd_keys = sorted(platform["required"] - prov_keys)
         valid_request = (len(missing_reqd_keys) == 0)
         if valid_request:
             status_code = 200
@@ -65,7 +69,7 @@ def validateRequestWithPlatform(prov_req):
             plat_id = "Missing-Required-Keys"
     else:
         prov_keys = sorted(prov_keys)
-        all_keys = sorted(plat_id["allkeys"])
+        all_keys = sorted(platform["allkeys"])
         status_code = 400
         response_body = f"Request keys '{missing_keys}' not found in {plat_id} properties: '{all_keys}'."
         logging.error(response_body)